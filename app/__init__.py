@@ -5,6 +5,46 @@ from flask import Flask
 from app.config import Config
 
 
+# Settings of the core modules, applied by configure_core
+CORE_SETTINGS = (
+    'DOMAIN_CACHE_SIZE', 'MERKLE_WORKERS', 'MERKLE_EXECUTOR', 'MERKLE_PARALLEL_MIN_LEAVES',
+    'STORAGE_DIR', 'STORAGE_MIN_BYTES', 'FIAT_SHAMIR_MIN_QUERIES', 'TRACE_CACHE_MAX_BYTES'
+)
+
+
+def configure_core(settings):
+    """
+    Configures the process-wide state of the core modules from settings, a mapping with the
+    CORE_SETTINGS keys. Also run in the processes of the proof jobs, which do not inherit it.
+    """
+    # Size the process-wide domain registry
+    from app.core.domain import registry
+    registry.max_entries = settings['DOMAIN_CACHE_SIZE']
+    
+    # Configure the parallel Merkle tree builder
+    from app.core.merkle import configure_parallelism
+    configure_parallelism(
+        workers=settings['MERKLE_WORKERS'],
+        executor=settings['MERKLE_EXECUTOR'],
+        min_leaves=settings['MERKLE_PARALLEL_MIN_LEAVES']
+    )
+    
+    # Optionally keep the large arrays in memory-mapped files
+    from app.core.storage import configure_storage
+    configure_storage(
+        directory=settings['STORAGE_DIR'] or None,
+        min_size=settings['STORAGE_MIN_BYTES']
+    )
+    
+    # Soundness of the self-contained (Fiat-Shamir) proofs
+    from app.core.transcript import configure_fiat_shamir
+    configure_fiat_shamir(min_query_num=settings['FIAT_SHAMIR_MIN_QUERIES'])
+    
+    # Bound the trace/commitment cache
+    from app.core.proof_generator import trace_cache
+    trace_cache.max_bytes = settings['TRACE_CACHE_MAX_BYTES']
+
+
 def create_app(config_class=Config):
     """
     Application factory pattern
@@ -12,6 +52,34 @@ def create_app(config_class=Config):
     app = Flask(__name__)
     app.config.from_object(config_class)
     
+    core_settings = {key: app.config[key] for key in CORE_SETTINGS}
+    configure_core(core_settings)
+    
+    # Cache of generated proofs
+    from app.core.proof_cache import proof_cache
+    proof_cache.configure(
+        max_bytes=app.config['PROOF_CACHE_MAX_BYTES'],
+        directory=app.config['PROOF_CACHE_DIR'] or None,
+        disk_max_bytes=app.config['PROOF_CACHE_DISK_MAX_BYTES'],
+        timestamp=app.config['PROOF_TIMESTAMP']
+    )
+    
+    # Background proof jobs, limited to REQUEST_TIMEOUT seconds each
+    from app.jobs import JobManager
+    app.extensions['proof_jobs'] = JobManager(
+        max_workers=app.config['JOB_WORKERS'],
+        max_jobs=app.config['JOB_MAX_PENDING'],
+        ttl=app.config['JOB_TTL'],
+        timeout=app.config['REQUEST_TIMEOUT'],
+        initializer=configure_core,
+        initargs=(core_settings,)
+    )
+    
+    # Build the tables of the default proof shape before serving
+    from app.warmup import Warmup
+    warmup = app.extensions['warmup'] = Warmup(app.config['TRACE_LENGTH'], app.config['BLOWUP'])
+    warmup.start(app.config['WARMUP'])
+    
     # Register blueprints
     from app.routes import api_bp
     app.register_blueprint(api_bp)
@@ -19,6 +87,16 @@ def create_app(config_class=Config):
     # Health check endpoint
     @app.route('/health')
     def health_check():
+        if warmup.error is not None:
+            return {'status': 'unhealthy', 'error': f'Warm-up failed: {warmup.error}'}, 503
+        if not warmup.ready:
+            return {'status': 'warming up'}, 503
         return {'status': 'healthy'}, 200
     
+    # Prometheus metrics of this process
+    @app.route('/metrics')
+    def metrics():
+        from app.metrics import registry
+        return registry.render(), 200, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
+    
     return app
\ No newline at end of file
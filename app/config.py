@@ -10,7 +10,53 @@ class Config:
     JSON_SORT_KEYS = False
     
     MAX_QUERIES = int(os.environ.get('MAX_QUERIES', 100))
+    # Fewest queries of a proof whose challenges are derived with Fiat-Shamir, both when generating
+    # and when verifying one
+    FIAT_SHAMIR_MIN_QUERIES = int(os.environ.get('FIAT_SHAMIR_MIN_QUERIES', 20))
+    MAX_BATCH_PROOFS = int(os.environ.get('MAX_BATCH_PROOFS', 1000))
     REQUEST_TIMEOUT = int(os.environ.get('REQUEST_TIMEOUT', 360))
+    
+    # Trace length (a power of two) and blowup factor used when a request does not give them
+    TRACE_LENGTH = int(os.environ.get('TRACE_LENGTH', 1024))
+    BLOWUP = int(os.environ.get('BLOWUP', 8))
+    MAX_TRACE_LENGTH = int(os.environ.get('MAX_TRACE_LENGTH', 2**16))
+
+    # Warm-up of the tables of the default proof shape: 'sync' (in create_app, before forking the
+    # workers when the app is preloaded), 'background' (/health answers 503 until done) or 'off'.
+    # gunicorn.conf.py preloads the app and turns 'background' into 'sync', since the warm-up thread
+    # would only run in the master
+    WARMUP = os.environ.get('WARMUP', 'sync')
+
+    # Maximum number of cached domain/twiddle tables per process
+    DOMAIN_CACHE_SIZE = int(os.environ.get('DOMAIN_CACHE_SIZE', 64))
+    
+    # Parallel Merkle tree construction (1 worker = serial). Only the 'process' executor can gain
+    # anything, and only with free cores: threads are held back by the GIL
+    MERKLE_WORKERS = int(os.environ.get('MERKLE_WORKERS', 1))
+    MERKLE_EXECUTOR = os.environ.get('MERKLE_EXECUTOR', 'process')
+    MERKLE_PARALLEL_MIN_LEAVES = int(os.environ.get('MERKLE_PARALLEL_MIN_LEAVES', 4096))
+    
+    # Out-of-core storage: evaluations and Merkle nodes of at least STORAGE_MIN_BYTES bytes are kept in
+    # memory-mapped files in STORAGE_DIR instead of RAM (disabled when STORAGE_DIR is empty)
+    STORAGE_DIR = os.environ.get('STORAGE_DIR', '')
+    STORAGE_MIN_BYTES = int(os.environ.get('STORAGE_MIN_BYTES', 2**20))
+    
+    # Memory budget of the per-input trace/commitment cache
+    TRACE_CACHE_MAX_BYTES = int(os.environ.get('TRACE_CACHE_MAX_BYTES', 256 * 2**20))
+    
+    # Cache of generated proofs: an in-memory tier, and a disk tier in PROOF_CACHE_DIR if not empty
+    PROOF_CACHE_MAX_BYTES = int(os.environ.get('PROOF_CACHE_MAX_BYTES', 64 * 2**20))
+    PROOF_CACHE_DIR = os.environ.get('PROOF_CACHE_DIR', '')
+    PROOF_CACHE_DISK_MAX_BYTES = int(os.environ.get('PROOF_CACHE_DISK_MAX_BYTES', 2**30))
+    # Timestamp of the proofs: 'response' (time of generation, or of the response for cached
+    # proofs) or 'deterministic' (always 0, so that the same request always gets the same proof)
+    PROOF_TIMESTAMP = os.environ.get('PROOF_TIMESTAMP', 'response')
+    
+    # Background proof jobs. Their state is kept in the serving process, so the jobs API needs a
+    # single worker process (the default of gunicorn.conf.py) or sticky routing to the workers
+    JOB_WORKERS = int(os.environ.get('JOB_WORKERS', 2))
+    JOB_MAX_PENDING = int(os.environ.get('JOB_MAX_PENDING', 100))
+    JOB_TTL = int(os.environ.get('JOB_TTL', 3600))
 
 
 class DevelopmentConfig(Config):
@@ -29,6 +75,7 @@ class TestingConfig(Config):
     """Testing configuration"""
     DEBUG = True
     TESTING = True
+    WARMUP = 'off'
 
 
 # Configuration dictionary
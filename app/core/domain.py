@@ -0,0 +1,112 @@
+"""
+Process-wide registry of evaluation domains and NTT twiddle factors.
+
+Domains are cosets offset * H of the multiplicative subgroup H of power of two order, and are built
+once per (size, offset) with running products, then shared by the prover, the verifier and FRI.
+"""
+from collections import OrderedDict
+from functools import lru_cache
+from threading import Lock
+
+from app.core.field import FieldElement, FieldArray
+
+
+@lru_cache(maxsize=None)
+def primitive_root_of_unity(size):
+    """
+    Returns the generator of the multiplicative subgroup of order size used for all the domains.
+    * Assert that size divides the order of the multiplicative group of the field.
+    """
+    assert (FieldElement.k_modulus - 1) % size == 0, f'No subgroup of order {size} in the field.'
+    return FieldElement.generator() ** ((FieldElement.k_modulus - 1) // size)
+
+
+class DomainRegistry:
+    """
+    A bounded LRU cache of domains (as read-only FieldArrays) and twiddle tables (as lists of ints),
+    keyed by (size, coset offset).
+    """
+
+    def __init__(self, max_entries=64):
+        self.max_entries = max_entries
+        self.tables = OrderedDict()
+        self.lock = Lock()
+
+    def _get(self, key, build):
+        with self.lock:
+            if key in self.tables:
+                self.tables.move_to_end(key)
+                return self.tables[key]
+        # Building happens outside the lock; at worst two threads build the same table.
+        table = build()
+        with self.lock:
+            self.tables[key] = table
+            self.tables.move_to_end(key)
+            while len(self.tables) > self.max_entries:
+                self.tables.popitem(last=False)
+        return table
+
+    def get_domain(self, size, offset=1):
+        """
+        Returns [offset * h**i for i in range(size)] where h = primitive_root_of_unity(size).
+        """
+        offset = FieldElement.typecast(offset)
+
+        def build():
+            domain = offset * FieldArray.powers(primitive_root_of_unity(size), size)
+            domain.vals.flags.writeable = False
+            return domain
+        return self._get(('domain', size, offset.val), build)
+
+    def get_inverse_domain(self, size, offset=1):
+        """
+        Returns the elementwise inverse of get_domain(size, offset), i.e.
+        [offset**-1 * h**-i for i in range(size)].
+        """
+        offset = FieldElement.typecast(offset)
+
+        def build():
+            domain = offset.inverse() * FieldArray.powers(primitive_root_of_unity(size).inverse(), size)
+            domain.vals.flags.writeable = False
+            return domain
+        return self._get(('inverse_domain', size, offset.val), build)
+
+    def get_twiddles(self, size, inverse=False):
+        """
+        Returns the powers [h**i for i in range(size)] of h = primitive_root_of_unity(size) (or of its
+        inverse) as a list of ints, for the NTT.
+        """
+        def build():
+            if inverse:
+                return self.get_inverse_domain(size).tolist()
+            return self.get_domain(size).tolist()
+        return self._get(('twiddles', size, inverse), build)
+
+    def clear(self):
+        with self.lock:
+            self.tables.clear()
+
+
+registry = DomainRegistry()
+
+
+def get_domain(size, offset=1):
+    return registry.get_domain(size, offset)
+
+
+def get_inverse_domain(size, offset=1):
+    return registry.get_inverse_domain(size, offset)
+
+
+def get_twiddles(size, inverse=False):
+    return registry.get_twiddles(size, inverse)
+
+
+def get_domain_element(size, idx, offset=1):
+    """
+    Returns get_domain(size, offset)[idx] in O(log size) field operations, without building the
+    domain. Indices follow list semantics, so idx may be negative and out of range ones raise.
+    """
+    if not -size <= idx < size:
+        raise IndexError('list index out of range')
+    return FieldElement.typecast(offset) * primitive_root_of_unity(size) ** (idx % size)
@@ -21,6 +21,10 @@ An implementation of field elements from F_(3 * 2**30 + 1).
 
 from random import randint
 
+import numpy as np
+
+from app.core.instrumentation import FIELD_OPS, increment
+
 
 class FieldElement:
     """
@@ -146,4 +150,201 @@ class FieldElement:
         fe = FieldElement(randint(0, FieldElement.k_modulus - 1))
         while fe in exclude_elements:
             fe = FieldElement(randint(0, FieldElement.k_modulus - 1))
-        return fe
\ No newline at end of file
+        return fe
+
+
+def batch_inverse(elements):
+    """
+    Inverts a list of non-zero FieldElements with a single field inversion (Montgomery's trick):
+    the prefix products are inverted once, then unwound from the end.
+    """
+    mod = FieldElement.k_modulus
+    vals = [FieldElement.typecast(x).val for x in elements]
+    prefix = []
+    acc = 1
+    for val in vals:
+        prefix.append(acc)
+        acc = acc * val % mod
+    inv = FieldElement(acc).inverse().val
+    increment(FIELD_OPS, 3 * len(vals), op='mul')
+    increment(FIELD_OPS, op='inverse')
+    res = [None] * len(vals)
+    for i in range(len(vals) - 1, -1, -1):
+        res[i] = FieldElement(inv * prefix[i] % mod)
+        inv = inv * vals[i] % mod
+    return res
+
+
+class FieldArray:
+    """
+    Represents a vector of elements of F_(3 * 2**30 + 1), backed by a numpy uint64 array.
+    Since the modulus is below 2**32, the product of two reduced elements fits in 64 bits, so all the
+    arithmetic is done elementwise on the array without going through FieldElement objects.
+    """
+    k_modulus = FieldElement.k_modulus
+
+    def __init__(self, values):
+        if isinstance(values, FieldArray):
+            self.vals = values.vals.copy()
+        elif isinstance(values, np.ndarray):
+            if values.dtype.kind == 'i':
+                values = values % FieldArray.k_modulus
+            self.vals = values.astype(np.uint64) % np.uint64(FieldArray.k_modulus)
+        else:
+            self.vals = np.array([FieldArray._to_int(x) for x in values], dtype=np.uint64)
+
+    @staticmethod
+    def _to_int(x):
+        if isinstance(x, FieldElement):
+            return x.val
+        assert isinstance(x, int), f'Type mismatch: FieldArray and {type(x)}.'
+        return x % FieldArray.k_modulus
+
+    @staticmethod
+    def _wrap(vals):
+        # Wraps an already reduced uint64 array without copying it.
+        res = FieldArray.__new__(FieldArray)
+        res.vals = vals
+        return res
+
+    @staticmethod
+    def zeros(n):
+        return FieldArray._wrap(np.zeros(n, dtype=np.uint64))
+
+    @staticmethod
+    def powers(base, n):
+        """
+        Returns the array [base**0, base**1, ..., base**(n-1)].
+        """
+        base = FieldElement.typecast(base)
+        vals = np.ones(min(n, 1), dtype=np.uint64)
+        cur = base
+        # Doubling the known prefix: [1, .., b**(k-1)] + b**k * [1, .., b**(k-1)].
+        while len(vals) < n:
+            vals = np.concatenate((vals, vals * np.uint64(cur.val) % np.uint64(FieldArray.k_modulus)))
+            cur = cur * cur
+        return FieldArray._wrap(vals[:n])
+
+    @staticmethod
+    def concatenate(arrays):
+        return FieldArray._wrap(np.concatenate([FieldArray(a).vals if not isinstance(a, FieldArray)
+                                                else a.vals for a in arrays]))
+
+    @staticmethod
+    def from_field_elements(elements):
+        return FieldArray._wrap(np.fromiter((x.val for x in elements), dtype=np.uint64,
+                                            count=len(elements)))
+
+    def to_field_elements(self):
+        return [FieldElement(x) for x in self.vals.tolist()]
+
+    def tolist(self):
+        """
+        Returns the values as a list of python ints in [0, k_modulus).
+        """
+        return self.vals.tolist()
+
+    def signed(self):
+        """
+        Returns an int64 array of the shorter representations of the elements, matching the repr of
+        FieldElement.
+        """
+        vals = self.vals.astype(np.int64)
+        return np.where(vals > FieldArray.k_modulus // 2, vals - FieldArray.k_modulus, vals)
+
+    def __len__(self):
+        return len(self.vals)
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return FieldArray._wrap(self.vals[key])
+        return FieldElement(int(self.vals[key]))
+
+    def __iter__(self):
+        return (FieldElement(x) for x in self.vals.tolist())
+
+    def __repr__(self):
+        return f'FieldArray({self.signed().tolist()})'
+
+    def __eq__(self, other):
+        if isinstance(other, list):
+            other = FieldArray(other)
+        return isinstance(other, FieldArray) and np.array_equal(self.vals, other.vals)
+
+    __hash__ = None
+
+    @staticmethod
+    def typecast(other):
+        """
+        Returns a uint64 array or scalar that can be combined elementwise with FieldArray.vals.
+        """
+        if isinstance(other, FieldArray):
+            return other.vals
+        if isinstance(other, (int, FieldElement)):
+            return np.uint64(FieldArray._to_int(other))
+        assert isinstance(other, list), f'Type mismatch: FieldArray and {type(other)}.'
+        return FieldArray(other).vals
+
+    def __neg__(self):
+        return FieldArray._wrap((np.uint64(FieldArray.k_modulus) - self.vals) %
+                                np.uint64(FieldArray.k_modulus))
+
+    def __add__(self, other):
+        try:
+            other = FieldArray.typecast(other)
+        except AssertionError:
+            return NotImplemented
+        increment(FIELD_OPS, len(self.vals), op='add')
+        return FieldArray._wrap((self.vals + other) % np.uint64(FieldArray.k_modulus))
+
+    __radd__ = __add__
+
+    def __sub__(self, other):
+        try:
+            other = FieldArray.typecast(other)
+        except AssertionError:
+            return NotImplemented
+        increment(FIELD_OPS, len(self.vals), op='sub')
+        return FieldArray._wrap((self.vals + np.uint64(FieldArray.k_modulus) - other) %
+                                np.uint64(FieldArray.k_modulus))
+
+    def __rsub__(self, other):
+        return -(self - other)
+
+    def __mul__(self, other):
+        try:
+            other = FieldArray.typecast(other)
+        except AssertionError:
+            return NotImplemented
+        increment(FIELD_OPS, len(self.vals), op='mul')
+        return FieldArray._wrap(self.vals * other % np.uint64(FieldArray.k_modulus))
+
+    __rmul__ = __mul__
+
+    def __truediv__(self, other):
+        if isinstance(other, (int, FieldElement)):
+            return self * FieldElement.typecast(other).inverse()
+        return self * FieldArray(other).inverse()
+
+    def __rtruediv__(self, other):
+        return self.inverse() * other
+
+    def __pow__(self, n):
+        assert n >= 0
+        mod = np.uint64(FieldArray.k_modulus)
+        cur_pow = self.vals
+        res = np.ones_like(self.vals)
+        while n > 0:
+            if n % 2 != 0:
+                res = res * cur_pow % mod
+            n = n // 2
+            cur_pow = cur_pow * cur_pow % mod
+        return FieldArray._wrap(res)
+
+    def inverse(self):
+        """
+        Inverts all the elements at once, using Fermat's little theorem elementwise.
+        """
+        assert np.all(self.vals != 0), 'Cannot invert zero.'
+        increment(FIELD_OPS, len(self.vals), op='inverse')
+        return self ** (FieldArray.k_modulus - 2)
@@ -1,11 +1,22 @@
+import numpy as np
+
+from app.core.domain import get_domain, get_inverse_domain
+from app.core.field import FieldElement, FieldArray
 from app.core.merkle import MerkleTree
 from app.core.polynomial import Polynomial
+from app.core.storage import store_array
+from app.core.instrumentation import span
 
 
 def next_fri_domain(fri_domain):
+    if isinstance(fri_domain, FieldArray):
+        # Squaring the first half of offset * H gives the coset offset**2 * H**2, already
+        # tabulated in the domain registry.
+        return get_domain(len(fri_domain) // 2, fri_domain[0] ** 2)
     return [x ** 2 for x in fri_domain[:len(fri_domain) // 2]]
 
 
+@span('fri.commit')
 def commit_fri(cp, domain, cp_eval, cp_merkle,coeffs):    
     fri_on_proof={}
     fri_polys = [cp]
@@ -33,9 +44,65 @@ def commit_fri(cp, domain, cp_eval, cp_merkle,coeffs):
 
 
 
+def is_constant_layer(layer):
+    return bool(np.all(layer.vals == layer.vals[0]))
+
+
+@span('fri.commit')
+def commit_fri_evaluations(domain, cp_eval, cp_merkle, coeffs):
+    """
+    Same as commit_fri, but folds the layers in evaluation form, never building the FRI polynomials.
+    domain is the coset offset * H over which cp_eval is given, as returned by get_domain.
+    A layer whose evaluations are all equal is the evaluation of a constant polynomial (as long as
+    the degree is below the size of the layer), which ends the folding.
+    coeffs is the list of folding coefficients, or a function returning the coefficient that folds
+    a layer given the root of its Merkle tree.
+    """
+    fri_on_proof = {}
+    betas = []
+    fri_layers = [FieldArray(cp_eval) if isinstance(cp_eval, list) else cp_eval]
+    fri_merkles = [cp_merkle]
+    layer_roots = [cp_merkle.root]
+    offset = domain[0]
+    i = 0
+
+    while not is_constant_layer(fri_layers[-1]):
+        if callable(coeffs):
+            beta = coeffs(layer_roots[-1])
+        elif i < len(coeffs):
+            beta = coeffs[i]
+        else:
+            raise ValueError(f'Not enough folding coefficients: {len(coeffs)} given, more are needed')
+        betas.append(beta)
+        domain_inv = get_inverse_domain(len(fri_layers[-1]), offset)
+        next_layer = FieldArray._wrap(store_array(next_fri_layer_evaluations(fri_layers[-1], domain_inv, beta).vals))
+
+        fri_layers.append(next_layer)
+        fri_merkles.append(MerkleTree(next_layer))
+        layer_roots.append(fri_merkles[-1].root)
+        offset = offset ** 2
+        i += 1
+    fri_on_proof["layer_roots"] = layer_roots
+    fri_on_proof["folding_poly_coeffs"] = betas
+
+    fri_on_proof["final_constant"] = str(fri_layers[-1][0])
+    return fri_layers, fri_merkles, fri_on_proof
+
+
+def next_fri_layer_evaluations(layer, domain_inv, beta):
+    """
+    Folds a layer given over offset * H: for x = domain[i] and -x = domain[i + n/2], the next layer
+    at x**2 is (f(x) + f(-x)) / 2 + beta * (f(x) - f(-x)) / (2x), using the table of the x**-1.
+    """
+    half = len(layer) // 2
+    f_x, f_neg_x = layer[:half], layer[half:]
+    inv_2 = FieldElement(2).inverse()
+    return (f_x + f_neg_x) * inv_2 + (f_x - f_neg_x) * domain_inv[:half] * (inv_2 * beta)
+
+
 def next_fri_polynomial(poly,  beta):
-    odd_coefficients = poly.poly[1::2]
-    even_coefficients = poly.poly[::2]
+    odd_coefficients = poly.coefs[1::2]
+    even_coefficients = poly.coefs[::2]
     odd = beta * Polynomial(odd_coefficients)
     even = Polynomial(even_coefficients)
     return odd + even
@@ -45,6 +112,8 @@ def next_fri_layer(poly, domain, beta):
     next_poly = next_fri_polynomial(poly, beta)
     next_domain = next_fri_domain(domain)
     next_layer = [next_poly(x) for x in next_domain]
+    if isinstance(next_domain, FieldArray):
+        next_layer = FieldArray.from_field_elements(next_layer)
     return next_poly, next_domain, next_layer
 
 
@@ -69,8 +138,9 @@ def decommit_on_fri_layers(idx, fri_layers, fri_merkles):
     
     return layers,str(fri_layers[-1][0])
 
-def decommit_on_query(idx, f_eval, f_merkle:MerkleTree, fri_layers, fri_merkles):
-    assert idx + 16 < len(f_eval), f'query index: {idx} is out of range. Length of layer: {len(f_eval)}.'
+def decommit_on_query(idx, f_eval, f_merkle:MerkleTree, fri_layers, fri_merkles, blowup=8):
+    # With g = h**blowup, f(g * x) and f(g**2 * x) are blowup and 2 * blowup positions after f(x).
+    assert idx + 2 * blowup < len(f_eval), f'query index: {idx} is out of range. Length of layer: {len(f_eval)}.'
 
     query = {"idx": idx}
 
@@ -80,27 +150,103 @@ def decommit_on_query(idx, f_eval, f_merkle:MerkleTree, fri_layers, fri_merkles)
     }
 
     query["f_gx"] = {
-        "val": str(f_eval[idx + 8]),
-        "auth_path": f_merkle.get_authentication_path(idx + 8)
+        "val": str(f_eval[idx + blowup]),
+        "auth_path": f_merkle.get_authentication_path(idx + blowup)
     }
 
     query["f_ggx"] = {
-        "val": str(f_eval[idx + 16]),
-        "auth_path": f_merkle.get_authentication_path(idx + 16)
+        "val": str(f_eval[idx + 2 * blowup]),
+        "auth_path": f_merkle.get_authentication_path(idx + 2 * blowup)
     }
 
     query["fri_layers"], query["last_val"]= decommit_on_fri_layers(idx, fri_layers, fri_merkles)
     return query
 
-def decommit_fri(f_eval, f_merkle, fri_layers, fri_merkles, challenges, query_num=3):
-    queries = []
+def decommit_on_query_batched(idx, f_eval, fri_layers, blowup=8):
+    """
+    Opens the values of one query for the batched layout, without authentication paths.
+    Returns the query, the ids opened in the trace tree and, for each layer, the ids opened in it.
+    """
+    assert idx + 2 * blowup < len(f_eval), f'query index: {idx} is out of range. Length of layer: {len(f_eval)}.'
 
-    for i in range(query_num):
-        r = challenges[i]
-        queries.append(decommit_on_query(r, f_eval, f_merkle, fri_layers, fri_merkles))
+    query = {"idx": idx}
+    query["f_x"] = {"val": str(f_eval[idx])}
+    query["f_gx"] = {"val": str(f_eval[idx + blowup])}
+    query["f_ggx"] = {"val": str(f_eval[idx + 2 * blowup])}
+    f_ids = [idx, idx + blowup, idx + 2 * blowup]
 
+    layers = {}
+    layer_ids = []
+    for layer_num, layer in enumerate(fri_layers[:-1]):
+        length = len(layer)
+        idx = idx % length
+        sib_idx = (idx + length // 2) % length
+        layers[f"layer_{layer_num}"] = {
+            "idx": idx,
+            "val": str(layer[idx]),
+            "sib_val": str(layer[sib_idx])
+        }
+        layer_ids.append([idx, sib_idx])
+    query["fri_layers"] = layers
+    query["last_val"] = str(fri_layers[-1][0])
+    return query, f_ids, layer_ids
+
+def get_batched_auth_paths(f_merkle, fri_merkles, f_ids, layer_ids):
     return {
-        "query_num": query_num,
-        "queries": queries,
-        "fri_last_val": str(fri_layers[-1][0])
-    }
\ No newline at end of file
+        "interp_poly": f_merkle.get_batch_authentication_path(f_ids),
+        "fri_layers": [merkle.get_batch_authentication_path(ids)
+                       for merkle, ids in zip(fri_merkles[:-1], layer_ids)]
+    }
+
+@span('fri.decommit')
+def decommit_fri(f_eval, f_merkle, fri_layers, fri_merkles, challenges, query_num=3, batched=False, blowup=8):
+    """
+    Opens the first query_num challenges. With batched, instead of a full authentication path per
+    opened value, the proof carries one batched decommitment per tree, covering all the values
+    opened in it.
+    """
+    return collect_decommitment(
+        iter_decommit_fri(f_eval, f_merkle, fri_layers, fri_merkles, challenges, query_num, batched, blowup)
+    )
+
+def collect_decommitment(parts):
+    """
+    Assembles the parts yielded by iter_decommit_fri into the decommitment of decommit_fri.
+    """
+    queries = []
+    for kind, part in parts:
+        if kind == "query":
+            queries.append(part)
+        else:
+            end = part
+    # The queries follow query_num and the layout, the other keys keep their order.
+    decommitment = {key: end[key] for key in ("query_num", "layout") if key in end}
+    decommitment["queries"] = queries
+    decommitment.update(end)
+    return decommitment
+
+def iter_decommit_fri(f_eval, f_merkle, fri_layers, fri_merkles, challenges, query_num=3, batched=False, blowup=8):
+    """
+    Builds the decommitment of decommit_fri one query at a time: yields ("query", query) for each
+    query, then ("end", decommitment) where decommitment is the result of decommit_fri without its
+    "queries".
+    """
+    f_ids = []
+    layer_ids = [[] for _ in fri_layers[:-1]]
+
+    for i in range(query_num):
+        if batched:
+            query, query_f_ids, query_layer_ids = decommit_on_query_batched(challenges[i], f_eval, fri_layers, blowup)
+            f_ids += query_f_ids
+            for ids, query_ids in zip(layer_ids, query_layer_ids):
+                ids += query_ids
+        else:
+            query = decommit_on_query(challenges[i], f_eval, f_merkle, fri_layers, fri_merkles, blowup)
+        yield "query", query
+
+    decommitment = {"query_num": query_num}
+    if batched:
+        decommitment["layout"] = "batched"
+        decommitment["auth_paths"] = get_batched_auth_paths(f_merkle, fri_merkles, f_ids, layer_ids)
+    decommitment["fri_last_val"] = str(fri_layers[-1][0])
+    yield "end", decommitment
@@ -0,0 +1,42 @@
+"""
+Hooks through which the core modules report their metrics, without depending on how they are kept.
+
+increment counts events and span times a block (or decorates a function), as in app.metrics. Both do
+nothing until install_metrics is given the functions to forward to, which app.metrics does when it is
+imported.
+"""
+from contextlib import contextmanager, nullcontext
+
+STAGE_DURATION = 'stark_stage_duration_seconds'
+HASH_CALLS = 'stark_hash_calls_total'
+FIELD_OPS = 'stark_field_ops_total'
+PROOFS_GENERATED = 'stark_proofs_generated_total'
+PROOFS_VERIFIED = 'stark_proofs_verified_total'
+
+
+def _ignore(name, amount=1, **labels):
+    pass
+
+
+_increment = _ignore
+_span = lambda stage: nullcontext()
+
+
+def install_metrics(increment_fn, span_fn):
+    """
+    Forwards increment(name, amount, **labels) to increment_fn and span(stage) to span_fn.
+    """
+    global _increment, _span
+    _increment = increment_fn
+    _span = span_fn
+
+
+def increment(name, amount=1, **labels):
+    _increment(name, amount, **labels)
+
+
+@contextmanager
+def span(stage):
+    # The hook is looked up on entering, so functions decorated at import time use the one installed.
+    with _span(stage):
+        yield
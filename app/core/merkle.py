@@ -19,74 +19,277 @@
 ###############################################################################
 # Changes applied to this code:                                               #
 #  - Swapped from sha256 to keccak256                                         #
+#  - Iterative tree stored as a flat array of binary digests                  #
+#  - Optional parallel construction of the lower levels                       #
+#  - Optional out-of-core storage of the nodes                                #
 ###############################################################################
 
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from eth_hash.auto import keccak
 from math import log2, ceil
+from threading import Lock
+
+from app.core.field import FieldElement, FieldArray
+from app.core.storage import is_out_of_core, store_array, zero_bytes
+from app.core.instrumentation import HASH_CALLS, increment, span
+
+DIGEST_SIZE = 32
+
+# Settings of the parallel tree builder, see configure_parallelism.
+parallel_workers = 1
+parallel_executor = 'process'
+parallel_min_leaves = 2 ** 12
+_executor = None
+_executor_pid = None
+_executor_lock = Lock()
+
+# Leaves hashed at a time when the nodes of a tree are stored out of core.
+LEAF_CHUNK_SIZE = 2 ** 14
 
-from app.core.field import FieldElement
 
 def keccak256(data: bytes) -> str:
     return keccak(data).hex()
 
+
+def configure_parallelism(workers=1, executor='process', min_leaves=2 ** 12):
+    """
+    Sets how MerkleTree builds itself: with workers > 1, trees with at least min_leaves leaves are
+    split into subtrees hashed on a pool of workers threads or processes (executor is 'thread' or
+    'process'), and only the levels above the subtrees are hashed serially.
+    Hashing a subtree holds the GIL, so threads do not speed it up: 2**17 leaves took 3.6s on 4
+    threads against 3.1s serially. Processes can only help with as many free cores, which is why the
+    default stays serial.
+    """
+    global parallel_workers, parallel_executor, parallel_min_leaves, _executor
+    assert executor in ('thread', 'process'), f'Unknown executor: {executor}.'
+    with _executor_lock:
+        # The previous pool is not shut down, as trees being built may still be using it: it is
+        # released with the last of them.
+        _executor = None
+        parallel_workers = max(1, workers)
+        parallel_executor = executor
+        parallel_min_leaves = min_leaves
+
+
+def get_executor():
+    global _executor, _executor_pid
+    with _executor_lock:
+        # A pool inherited through a fork (e.g. by the gunicorn workers) has no workers in this process.
+        if _executor is None or _executor_pid != os.getpid():
+            if parallel_executor == 'process':
+                _executor = ProcessPoolExecutor(
+                    max_workers=parallel_workers, mp_context=multiprocessing.get_context('forkserver')
+                )
+            else:
+                _executor = ThreadPoolExecutor(max_workers=parallel_workers)
+            _executor_pid = os.getpid()
+        return _executor
+
+
+def build_nodes(leaves):
+    """
+    Hashes a complete tree over leaves (strings, a power of two of them), returning its nodes as a
+    flat array of digests in the layout of MerkleTree.nodes.
+    """
+    num_leaves = len(leaves)
+    nodes = bytearray(DIGEST_SIZE * 2 * num_leaves)
+    hash_leaves(nodes, leaves, num_leaves)
+    hash_internal_nodes(nodes, num_leaves)
+    return nodes
+
+
+def hash_leaves(nodes, leaves, first_node_id):
+    """
+    Writes the hashes of leaves (strings) to the consecutive nodes starting at first_node_id.
+    """
+    for i, leaf_data in enumerate(leaves, first_node_id):
+        nodes[DIGEST_SIZE * i:DIGEST_SIZE * (i + 1)] = keccak(leaf_data.encode())
+
+
+def hash_internal_nodes(nodes, num_leaves):
+    """
+    Fills in the nodes 1..num_leaves-1, from the nodes below them.
+    """
+    # The children of node i are the two consecutive digests at offset 64*i.
+    for node_id in range(num_leaves - 1, 0, -1):
+        children = nodes[2 * DIGEST_SIZE * node_id:2 * DIGEST_SIZE * (node_id + 1)]
+        nodes[DIGEST_SIZE * node_id:DIGEST_SIZE * (node_id + 1)] = keccak(children.hex().encode())
+
 class MerkleTree(object):
     """
-    A simple and naive implementation of an immutable Merkle tree.
+    An immutable Merkle tree, stored iteratively as a flat array of binary digests.
+    Node i (the root being node 1, and the children of node i being 2i and 2i+1) occupies the 32
+    bytes at offset 32*i of self.nodes, so the leaves are the nodes num_leaves..2*num_leaves-1.
+    The hashes are compatible with verify_decommitment: an internal node is the hash of the hex
+    encodings of its children concatenated, and the root is exposed in hex.
     """
 
-    def __init__(self, data):
-        assert isinstance(data, list)
+    def __init__(self, data, workers=None):
+        assert isinstance(data, (list, FieldArray))
         assert len(data) > 0, 'Cannot construct an empty Merkle Tree.'
         num_leaves = 2 ** ceil(log2(len(data)))
-        self.data = data + [FieldElement(0)] * (num_leaves - len(data))
+        if isinstance(data, FieldArray):
+            padded = FieldArray.concatenate([data, FieldArray.zeros(num_leaves - len(data))])
+            self.data = FieldArray._wrap(store_array(padded.vals))
+        else:
+            self.data = data + [FieldElement(0)] * (num_leaves - len(data))
         self.height = int(log2(num_leaves))
-        self.facts = {}
-        self.root = self.build_tree()
+        if workers is None:
+            workers = parallel_workers if num_leaves >= parallel_min_leaves else 1
+        self.build_tree(workers)
+        self.root = self.get_node(1).hex()
+
+    def get_leaves(self, start=0, stop=None):
+        """
+        Returns the leaves start..stop-1 (the strings that are hashed, i.e. the reprs of the
+        elements of self.data).
+        """
+        data = self.data[start:stop]
+        if isinstance(data, FieldArray):
+            # The reprs of a whole FieldArray are computed in one pass.
+            return [str(x) for x in data.signed().tolist()]
+        return [str(x) for x in data]
+
+    def get_node(self, node_id):
+        """
+        Returns the raw digest of the given node.
+        """
+        return bytes(self.nodes[DIGEST_SIZE * node_id:DIGEST_SIZE * (node_id + 1)])
 
     def get_authentication_path(self, leaf_id):
         assert 0 <= leaf_id < len(self.data)
         node_id = leaf_id + len(self.data)
-        cur = self.root
         decommitment = []
-        # In a Merkle Tree, the path from the root to a leaf, corresponds to the the leaf id's
-        # binary representation, starting from the second-MSB, where '0' means 'left', and '1' means
-        # 'right'.
-        # We therefore iterate over the bits of the binary representation - skipping the '0b'
-        # prefix, as well as the MSB.
-        for bit in bin(node_id)[3:]:
-            cur, auth = self.facts[cur]
-            if bit == '1':
-                auth, cur = cur, auth
-            decommitment.append(auth)
+        # Walk up from the leaf collecting the siblings; the path is given from the root down.
+        while node_id > 1:
+            decommitment.append(self.get_node(node_id ^ 1).hex())
+            node_id //= 2
+        return decommitment[::-1]
+
+    def get_batch_authentication_path(self, leaf_ids):
+        """
+        Returns the minimal list of nodes authenticating all the given leaves at once.
+        Going up one level at a time, the sibling of every known node is emitted unless it is known
+        itself (being opened, or computable from opened nodes), in increasing node id order.
+        """
+        num_leaves = len(self.data)
+        assert all(0 <= leaf_id < num_leaves for leaf_id in leaf_ids)
+        known = set(leaf_id + num_leaves for leaf_id in leaf_ids)
+        decommitment = []
+        for _ in range(self.height):
+            for node_id in sorted(known):
+                if node_id ^ 1 not in known:
+                    decommitment.append(self.get_node(node_id ^ 1).hex())
+            known = set(node_id // 2 for node_id in known)
         return decommitment
 
-    def build_tree(self):
-        return self.recursive_build_tree(1)
-
-    def recursive_build_tree(self, node_id):
-        if node_id >= len(self.data):
-            # A leaf.
-            id_in_data = node_id - len(self.data)
-            leaf_data = str(self.data[id_in_data])
-            h = keccak256(leaf_data.encode())
-            self.facts[h] = leaf_data
-            return h
-        else:
-            # An internal node.
-            left = self.recursive_build_tree(node_id * 2)
-            right = self.recursive_build_tree(node_id * 2 + 1)
-            h = keccak256((left + right).encode())
-            self.facts[h] = (left, right)
-            return h
+    @span('merkle.build')
+    def build_tree(self, workers=1):
+        num_leaves = len(self.data)
+        increment(HASH_CALLS, 2 * num_leaves - 1, operation='build')
+        num_subtrees = min(2 ** int(log2(workers)), num_leaves) if workers > 1 else 1
+        if num_subtrees == 1 and not is_out_of_core(DIGEST_SIZE * 2 * num_leaves):
+            self.nodes = build_nodes(self.get_leaves())
+            return
+        self.nodes = zero_bytes(DIGEST_SIZE * 2 * num_leaves)
+        if num_subtrees == 1:
+            # Hashing the leaves in chunks, so their strings are never all in memory at once.
+            for start in range(0, num_leaves, LEAF_CHUNK_SIZE):
+                hash_leaves(self.nodes, self.get_leaves(start, start + LEAF_CHUNK_SIZE), num_leaves + start)
+            hash_internal_nodes(self.nodes, num_leaves)
+            return
+        # Each worker builds the subtree below one of the nodes num_subtrees..2*num_subtrees-1.
+        subtree_leaves = num_leaves // num_subtrees
+        chunks = [self.get_leaves(k * subtree_leaves, (k + 1) * subtree_leaves) for k in range(num_subtrees)]
+        for k, subtree in enumerate(get_executor().map(build_nodes, chunks)):
+            # Level d of subtree k is a contiguous run of 2**d nodes, starting at (num_subtrees + k) * 2**d.
+            level_size = 1
+            while level_size <= subtree_leaves:
+                dst = (num_subtrees + k) * level_size
+                self.nodes[DIGEST_SIZE * dst:DIGEST_SIZE * (dst + level_size)] = \
+                    subtree[DIGEST_SIZE * level_size:DIGEST_SIZE * 2 * level_size]
+                level_size *= 2
+        hash_internal_nodes(self.nodes, num_subtrees)
         
-def verify_decommitment(leaf_id, leaf_data, decommitment, root):
+def verify_decommitment(leaf_id, leaf_data, decommitment, root, verified_nodes=None):
+    """
+    Checks that leaf_data is the leaf leaf_id of the tree with the given root.
+    verified_nodes, if given, is a dict shared between calls for the same root, mapping the ids of
+    the nodes authenticated so far to their hashes: a path reaching one of them is settled without
+    hashing up to the root.
+    """
     leaf_num = 2 ** len(decommitment)
     node_id = leaf_id + leaf_num
     cur = keccak256(str(leaf_data).encode())
-    for bit, auth in zip(bin(node_id)[3:][::-1], decommitment[::-1]):
-        if bit == '0':
+    if verified_nodes is None:
+        increment(HASH_CALLS, len(decommitment) + 1, operation='verify')
+        for bit, auth in zip(bin(node_id)[3:][::-1], decommitment[::-1]):
+            if bit == '0':
+                h = cur + auth
+            else:
+                h = auth + cur
+            cur = keccak256(h.encode())
+        return cur == root
+    # Bits of leaf_id above the height of the tree are ignored, as above.
+    node_id = leaf_id % leaf_num + leaf_num
+    path = []
+    for auth in decommitment[::-1]:
+        known = verified_nodes.get(node_id)
+        if known is not None:
+            break
+        path.append((node_id, cur))
+        if node_id % 2 == 0:
             h = cur + auth
         else:
             h = auth + cur
         cur = keccak256(h.encode())
-    return cur == root
\ No newline at end of file
+        node_id //= 2
+    else:
+        known = root
+    increment(HASH_CALLS, len(path) + 1, operation='verify')
+    if cur != known:
+        return False
+    verified_nodes.update(path)
+    return True
+
+
+def verify_batch_decommitment(leaf_ids, leaf_data, decommitment, root, height):
+    """
+    Verifies a decommitment produced by MerkleTree.get_batch_authentication_path, for the leaves
+    leaf_ids holding leaf_data in a tree with 2**height leaves.
+    """
+    num_leaves = 2 ** height
+    level = {}
+    for leaf_id, data in zip(leaf_ids, leaf_data):
+        if not 0 <= leaf_id < num_leaves:
+            return False
+        node_id = leaf_id + num_leaves
+        h = keccak256(str(data).encode())
+        # The same leaf may be opened more than once, but always with the same data.
+        if level.setdefault(node_id, h) != h:
+            return False
+    increment(HASH_CALLS, len(leaf_ids), operation='verify')
+    if not level:
+        return False
+    auth = iter(decommitment)
+    for _ in range(height):
+        parents = {}
+        for node_id in sorted(level):
+            if node_id // 2 in parents:
+                continue
+            sibling = level.get(node_id ^ 1)
+            if sibling is None:
+                sibling = next(auth, None)
+                if sibling is None:
+                    return False
+            if node_id % 2 == 0:
+                h = level[node_id] + sibling
+            else:
+                h = sibling + level[node_id]
+            parents[node_id // 2] = keccak256(h.encode())
+        increment(HASH_CALLS, len(parents), operation='verify')
+        level = parents
+    # All the given nodes must have been used.
+    return next(auth, None) is None and level == {1: root}
\ No newline at end of file
@@ -19,8 +19,10 @@
 A polynomial interface with the functionality required for STARK101.
 """
 
-import operator
-from functools import reduce
+from functools import lru_cache, reduce
+from itertools import zip_longest
+
+import numpy as np
 try:
     from tqdm import tqdm
 except ModuleNotFoundError:
@@ -28,15 +30,18 @@ except ModuleNotFoundError:
     # not available, simply return the iterator itself.
     tqdm = lambda x: x
 
-from app.core.field import FieldElement
-from app.utils.list_utils import remove_trailing_elements, scalar_operation, two_lists_tuple_operation
+from app.core.domain import get_domain, get_inverse_domain, get_twiddles, primitive_root_of_unity
+from app.core.field import FieldElement, FieldArray
+from app.core.instrumentation import FIELD_OPS, increment
 
 
-def trim_trailing_zeros(p):
+def trim_zeros(coefs):
     """
-    Removes zeros from the end of a list.
+    Removes zeros from the end of a list of ints, in place, and returns it.
     """
-    return remove_trailing_elements(p, FieldElement.zero())
+    while coefs and not coefs[-1]:
+        coefs.pop()
+    return coefs
 
 
 def prod(values):
@@ -69,27 +74,52 @@ def latex_monomial(exponent, coef, var):
 class Polynomial:
     """
     Represents a polynomial over FieldElement.
+    The coefficients are kept as reduced ints, FieldElements are only created when they are read
+    through `poly`, `get_nth_degree_coefficient` or `eval`.
     """
 
+    __slots__ = ('coefs', 'var')
+
     @classmethod
     def X(cls):
         """
         Returns the polynomial x.
         """
-        return cls([FieldElement.zero(), FieldElement.one()])
+        return cls._wrap([0, 1])
 
     def __init__(self, coefficients, var='x'):
-        # Internally storing the coefficients in self.poly, least-significant (i.e. free term)
-        # first, so $9 - 3x^2 + 19x^5$ is represented internally by the list  [9, 0, -3, 0, 0, 19].
+        # Internally storing the coefficients in self.coefs as ints, least-significant (i.e. free
+        # term) first, so $9 - 3x^2 + 19x^5$ is represented internally by the list
+        # [9, 0, -3, 0, 0, 19] (with -3 reduced modulo the field modulus), without trailing zeros.
         # Note that coefficients is copied, so the caller may freely modify the given argument.
-        self.poly = remove_trailing_elements(coefficients, FieldElement.zero())
+        if isinstance(coefficients, FieldArray):
+            coefs = coefficients.tolist()
+        else:
+            mod = FieldElement.k_modulus
+            coefs = [c.val if isinstance(c, FieldElement) else c % mod for c in coefficients]
+        self.coefs = trim_zeros(coefs)
         self.var = var
 
+    @classmethod
+    def _wrap(cls, coefs, var='x'):
+        # Wraps a list of reduced ints without copying it, removing its trailing zeros in place.
+        res = cls.__new__(cls)
+        res.coefs = trim_zeros(coefs)
+        res.var = var
+        return res
+
+    @property
+    def poly(self):
+        """
+        The coefficients as a list of FieldElements, free term first, without trailing zeros.
+        """
+        return [FieldElement(c) for c in self.coefs]
+
     def _repr_latex_(self):
         """
         Returns a LaTeX representation of the Polynomial, for Jupyter.
         """
-        if not self.poly:
+        if not self.coefs:
             return '$0$'
         res = ['$']
         first = True
@@ -115,7 +145,7 @@ class Polynomial:
             other = Polynomial.typecast(other)
         except AssertionError:
             return False
-        return self.poly == other.poly
+        return self.coefs == other.coefs
 
     @staticmethod
     def typecast(other):
@@ -125,37 +155,32 @@ class Polynomial:
         if isinstance(other, int):
             other = FieldElement(other)
         if isinstance(other, FieldElement):
-            other = Polynomial([other])
+            other = Polynomial._wrap([other.val])
         assert isinstance(other, Polynomial), f'Type mismatch: Polynomial and {type(other)}.'
         return other
 
     def __add__(self, other):
         other = Polynomial.typecast(other)
-        return Polynomial(two_lists_tuple_operation(
-            self.poly, other.poly, operator.add, FieldElement.zero()))
+        mod = FieldElement.k_modulus
+        return Polynomial._wrap([(a + b) % mod for a, b in zip_longest(self.coefs, other.coefs, fillvalue=0)])
 
     __radd__ = __add__  # To support <int> + <Polynomial> (as in `1 + x + x**2`).
 
     def __sub__(self, other):
         other = Polynomial.typecast(other)
-        return Polynomial(two_lists_tuple_operation(
-            self.poly, other.poly, operator.sub, FieldElement.zero()))
+        mod = FieldElement.k_modulus
+        return Polynomial._wrap([(a - b) % mod for a, b in zip_longest(self.coefs, other.coefs, fillvalue=0)])
 
     def __rsub__(self, other):  # To support <int> - <Polynomial> (as in `1 - x + x**2`).
         return -(self - other)
 
     def __neg__(self):
-        return Polynomial([]) - self
+        mod = FieldElement.k_modulus
+        return Polynomial._wrap([-c % mod for c in self.coefs])
 
     def __mul__(self, other):
         other = Polynomial.typecast(other)
-        pol1, pol2 = [[x.val for x in p.poly] for p in (self, other)]
-        res = [0] * (self.degree() + other.degree() + 1)
-        for i, c1 in enumerate(pol1):
-            for j, c2 in enumerate(pol2):
-                res[i + j] += c1 * c2
-        res = [FieldElement(x) for x in res]
-        return Polynomial(res)
+        return Polynomial._wrap(mul_coefficients(self.coefs, other.coefs))
 
     __rmul__ = __mul__  # To support <int> * <Polynomial>.
 
@@ -169,10 +194,14 @@ class Polynomial:
         True
         """
         other = Polynomial.typecast(other)
-        res = Polynomial([])
-        for coef in self.poly[::-1]:
-            res = (res * other) + Polynomial([coef])
-        return res
+        res = []
+        for coef in self.coefs[::-1]:
+            res = mul_coefficients(res, other.coefs)
+            if res:
+                res[0] = (res[0] + coef) % FieldElement.k_modulus
+            else:
+                res = [coef]
+        return Polynomial._wrap(res)
 
     def qdiv(self, other):
         """
@@ -181,27 +210,11 @@ class Polynomial:
         * Assert that g is not the zero polynomial.
         """
         other = Polynomial.typecast(other)
-        pol2 = trim_trailing_zeros(other.poly)
-        assert pol2, 'Dividing by zero polynomial.'
-        pol1 = trim_trailing_zeros(self.poly)
-        if not pol1:
+        assert other.coefs, 'Dividing by zero polynomial.'
+        if not self.coefs:
             return [], []
-        rem = pol1
-        deg_dif = len(rem) - len(pol2)
-        quotient = [FieldElement.zero()] * (deg_dif + 1)
-        g_msc_inv = pol2[-1].inverse()
-        while deg_dif >= 0:
-            tmp = rem[-1] * g_msc_inv
-            quotient[deg_dif] = quotient[deg_dif] + tmp
-            last_non_zero = deg_dif - 1
-            for i, coef in enumerate(pol2, deg_dif):
-                rem[i] = rem[i] - (tmp * coef)
-                if rem[i] != FieldElement.zero():
-                    last_non_zero = i
-            # Eliminate trailing zeroes (i.e. make r end with its last non-zero coefficient).
-            rem = rem[:last_non_zero + 1]
-            deg_dif = len(rem) - len(pol2)
-        return Polynomial(trim_trailing_zeros(quotient)), Polynomial(rem)
+        quotient, rem = div_coefficients(self.coefs, other.coefs)
+        return Polynomial._wrap(quotient), Polynomial._wrap(rem)
 
     def __truediv__(self, other):
         div, mod = self.qdiv(other)
@@ -216,22 +229,22 @@ class Polynomial:
         """
         Constructs the monomial coefficient * x**degree.
         """
-        return Polynomial([FieldElement.zero()] * degree + [coefficient])
+        return Polynomial._wrap([0] * degree + [FieldElement.typecast(coefficient).val])
 
     @staticmethod
     def gen_linear_term(point):
         """
         Generates the polynomial (x-p) for a given point p.
         """
-        return Polynomial([FieldElement.zero() - point, FieldElement.one()])
+        return Polynomial._wrap([-FieldElement.typecast(point).val % FieldElement.k_modulus, 1])
 
     def degree(self):
         """
-        The polynomials are represented by a list so the degree is the length of the list minus the
-        number of trailing zeros (if they exist) minus 1.
+        The polynomials are represented by a list without trailing zeros so the degree is the length
+        of the list minus 1.
         This implies that the degree of the zero polynomial will be -1.
         """
-        return len(trim_trailing_zeros(self.poly)) - 1
+        return len(self.coefs) - 1
 
     def get_nth_degree_coefficient(self, n):
         """
@@ -240,13 +253,15 @@ class Polynomial:
         if n > self.degree():
             return FieldElement.zero()
         else:
-            return self.poly[n]
+            return FieldElement(self.coefs[n])
 
     def scalar_mul(self, scalar):
         """
         Multiplies polynomial by a scalar
         """
-        return Polynomial(scalar_operation(self.poly, operator.mul, scalar))
+        scalar = FieldElement.typecast(scalar).val
+        mod = FieldElement.k_modulus
+        return Polynomial._wrap([c * scalar % mod for c in self.coefs])
 
     def eval(self, point):
         """
@@ -255,8 +270,8 @@ class Polynomial:
         point = FieldElement.typecast(point).val
         # Doing this with ints (as opposed to `FieldElement`s) speeds up eval significantly.
         val = 0
-        for coef in self.poly[::-1]:
-            val = (val * point + coef.val) % FieldElement.k_modulus
+        for coef in self.coefs[::-1]:
+            val = (val * point + coef) % FieldElement.k_modulus
         return FieldElement(val)
 
     def __call__(self, other):
@@ -277,7 +292,7 @@ class Polynomial:
         Calculates self**other using repeated squaring.
         """
         assert other >= 0
-        res = Polynomial([FieldElement(1)])
+        res = Polynomial._wrap([1])
         cur = self
         while True:
             if other % 2 != 0:
@@ -326,14 +341,424 @@ def interpolate_poly_lagrange(y_values, lagrange_polynomials):
     return poly
 
 
+# From this size on, the NTT runs vectorized over numpy arrays rather than over lists of ints.
+NUMPY_NTT_MIN_SIZE = 2 ** 6
+
+
+def is_power_of_two(n):
+    return n > 0 and n & (n - 1) == 0
+
+
+def count_ntt_ops(n):
+    log_n = n.bit_length() - 1
+    increment(FIELD_OPS, n // 2 * log_n, op='mul')
+    increment(FIELD_OPS, n * log_n, op='add')
+
+
+@lru_cache(maxsize=16)
+def bit_reverse_permutation(n):
+    """
+    Returns the (read-only, cached) array of the indices 0..n-1 with their log2(n) bits reversed.
+    """
+    idx = np.arange(n)
+    rev = np.zeros(n, dtype=np.int64)
+    bits = n.bit_length() - 1
+    for b in range(bits):
+        rev |= ((idx >> b) & 1) << (bits - 1 - b)
+    rev.flags.writeable = False
+    return rev
+
+
+def ntt_array(vals, root):
+    """
+    Same as ntt, over a numpy uint64 array of reduced values, returning a new array.
+    Since the modulus is below 2**32 the products of reduced values fit in 64 bits, so every stage
+    of the butterflies is a handful of vectorized operations.
+    """
+    n = len(vals)
+    assert is_power_of_two(n), 'NTT size must be a power of two.'
+    count_ntt_ops(n)
+    mod = np.uint64(FieldElement.k_modulus)
+    standard_root = primitive_root_of_unity(n).val
+    if root == standard_root:
+        root_powers = get_domain(n).vals
+    elif root * standard_root % FieldElement.k_modulus == 1:
+        root_powers = get_inverse_domain(n).vals
+    else:
+        root_powers = FieldArray.powers(root, n).vals
+    res = vals[bit_reverse_permutation(n)]
+    size = 2
+    while size <= n:
+        half = size // 2
+        # Row k holds the block [k * size, (k + 1) * size), whose two halves are combined.
+        blocks = res.reshape(-1, size)
+        u = blocks[:, :half].copy()
+        v = blocks[:, half:] * root_powers[:n // 2:n // size] % mod
+        blocks[:, :half] = (u + v) % mod
+        blocks[:, half:] = (u + mod - v) % mod
+        size *= 2
+    return res
+
+
+def ntt(values, root):
+    """
+    Number theoretic transform over the field.
+    Given the ints values[0], ..., values[n-1] (coefficients, free term first) and an int root of
+    unity of order n, returns the ints [f(root**0), f(root**1), ..., f(root**(n-1))].
+    The length of values must be a power of two.
+    """
+    n = len(values)
+    assert is_power_of_two(n), 'NTT size must be a power of two.'
+    if n >= NUMPY_NTT_MIN_SIZE:
+        return ntt_array(np.array(values, dtype=np.uint64), root).tolist()
+    count_ntt_ops(n)
+    mod = FieldElement.k_modulus
+    # Iterative Cooley-Tukey, so we start from the bit-reversed permutation of the input.
+    res = list(values)
+    j = 0
+    for i in range(1, n):
+        bit = n >> 1
+        while j & bit:
+            j ^= bit
+            bit >>= 1
+        j |= bit
+        if i < j:
+            res[i], res[j] = res[j], res[i]
+    # The twiddles of every stage are a strided slice of the powers of root, which are shared through
+    # the domain registry when root is the standard generator of the subgroup (or its inverse).
+    standard_root = primitive_root_of_unity(n).val
+    if root == standard_root:
+        root_powers = get_twiddles(n)
+    elif root * standard_root % mod == 1:
+        root_powers = get_twiddles(n, inverse=True)
+    else:
+        root_powers = [1] * n
+        for k in range(1, n):
+            root_powers[k] = root_powers[k - 1] * root % mod
+    size = 2
+    while size <= n:
+        half = size // 2
+        twiddles = root_powers[:n // 2:n // size]
+        for start in range(0, n, size):
+            for k in range(half):
+                u = res[start + k]
+                v = res[start + k + half] * twiddles[k] % mod
+                res[start + k] = (u + v) % mod
+                res[start + k + half] = (u - v) % mod
+        size *= 2
+    return res
+
+
+def intt(values, root):
+    """
+    Inverse of ntt: given the ints [f(root**0), ..., f(root**(n-1))], returns the n coefficients of
+    f (free term first).
+    """
+    mod = FieldElement.k_modulus
+    n = len(values)
+    res = ntt(values, pow(root, mod - 2, mod))
+    n_inv = pow(n, mod - 2, mod)
+    return [x * n_inv % mod for x in res]
+
+
+# Polynomial products dispatch on the number of coefficients of the shorter factor: below
+# KARATSUBA_MIN_SIZE the schoolbook product is the fastest, below NTT_MUL_MIN_SIZE Karatsuba is.
+KARATSUBA_MIN_SIZE = 2 ** 5
+NTT_MUL_MIN_SIZE = 2 ** 6
+
+
+def mul_schoolbook(pol1, pol2):
+    """
+    Product of the polynomials with the int coefficients pol1 and pol2 (free term first), as a list
+    of len(pol1) + len(pol2) - 1 ints that are not reduced.
+    """
+    if not pol1 or not pol2:
+        return []
+    res = [0] * (len(pol1) + len(pol2) - 1)
+    for i, c1 in enumerate(pol1):
+        if c1:
+            for j, c2 in enumerate(pol2, i):
+                res[j] += c1 * c2
+    return res
+
+
+def mul_karatsuba(pol1, pol2):
+    """
+    Same as mul_schoolbook, splitting both factors in halves so that a product takes three half-size
+    products instead of four. The recursion goes down to the schoolbook product.
+    """
+    if len(pol1) < len(pol2):
+        pol1, pol2 = pol2, pol1
+    if len(pol2) < KARATSUBA_MIN_SIZE:
+        return mul_schoolbook(pol1, pol2)
+    res = [0] * (len(pol1) + len(pol2) - 1)
+    half = len(pol1) // 2
+    if len(pol2) <= half:
+        # Unbalanced factors: multiply pol2 by each half of pol1 instead.
+        for shift, prod_half in ((0, mul_karatsuba(pol1[:half], pol2)),
+                                 (half, mul_karatsuba(pol1[half:], pol2))):
+            for i, c in enumerate(prod_half, shift):
+                res[i] += c
+        return res
+    low1, high1, low2, high2 = pol1[:half], pol1[half:], pol2[:half], pol2[half:]
+    low = mul_karatsuba(low1, low2)
+    high = mul_karatsuba(high1, high2)
+    mid = mul_karatsuba([a + b for a, b in zip_longest(low1, high1, fillvalue=0)],
+                        [a + b for a, b in zip_longest(low2, high2, fillvalue=0)])
+    # (l1 + h1 x^half)(l2 + h2 x^half) = l1 l2 + ((l1 + h1)(l2 + h2) - l1 l2 - h1 h2) x^half + h1 h2 x^2half
+    for i, c in enumerate(low):
+        res[i] += c
+        mid[i] -= c
+    for i, c in enumerate(high):
+        res[i + 2 * half] += c
+        mid[i] -= c
+    for i, c in enumerate(mid, half):
+        if c:
+            res[i] += c
+    return res
+
+
+def mul_ntt(pol1, pol2):
+    """
+    Product of the polynomials with the int coefficients pol1 and pol2, reduced modulo the field
+    modulus, computed by pointwise multiplication of their NTTs over a subgroup large enough to hold
+    all len(pol1) + len(pol2) - 1 coefficients of the result.
+    """
+    if not pol1 or not pol2:
+        return []
+    mod = np.uint64(FieldElement.k_modulus)
+    res_len = len(pol1) + len(pol2) - 1
+    n = 1 << (res_len - 1).bit_length()
+    root = primitive_root_of_unity(n).val
+
+    def transform(pol):
+        vals = np.zeros(n, dtype=np.uint64)
+        vals[:len(pol)] = pol
+        return ntt_array(vals, root)
+
+    evals1 = transform(pol1)
+    # Squares (as in __pow__) only need one transform.
+    evals2 = evals1 if pol2 is pol1 else transform(pol2)
+    res = ntt_array(evals1 * evals2 % mod, pow(root, FieldElement.k_modulus - 2, FieldElement.k_modulus))
+    n_inv = np.uint64(pow(n, FieldElement.k_modulus - 2, FieldElement.k_modulus))
+    return (res[:res_len] * n_inv % mod).tolist()
+
+
+def mul_coefficients(pol1, pol2):
+    """
+    Product of the polynomials with the int coefficients pol1 and pol2 (free term first, reduced),
+    as a list of len(pol1) + len(pol2) - 1 reduced ints, using the algorithm suited to their sizes.
+    """
+    short = min(len(pol1), len(pol2))
+    if short < KARATSUBA_MIN_SIZE:
+        res = mul_schoolbook(pol1, pol2)
+    elif short < NTT_MUL_MIN_SIZE:
+        res = mul_karatsuba(pol1, pol2)
+    else:
+        return mul_ntt(pol1, pol2)
+    mod = FieldElement.k_modulus
+    return [x % mod for x in res]
+
+
+# Long division costs one multiplication per non-zero coefficient of the divisor for each coefficient
+# of the quotient. From this many of both on, division by Newton iteration is faster.
+NEWTON_DIV_MIN_SIZE = 2 ** 8
+
+
+def div_linear(pol1, pol2):
+    """
+    Quotient and remainder, as lists of reduced ints, of the division of the polynomial with the int
+    coefficients pol1 by the linear polynomial pol2, by synthetic division.
+    """
+    mod = FieldElement.k_modulus
+    lead_inv = pow(pol2[1], mod - 2, mod)
+    # pol2 = lead * (x - root), so divide by x - root and then by lead.
+    root = -pol2[0] * lead_inv % mod
+    quotient = [0] * (len(pol1) - 1)
+    acc = 0
+    for i in range(len(pol1) - 1, 0, -1):
+        acc = (pol1[i] + acc * root) % mod
+        quotient[i - 1] = acc
+    rem = (pol1[0] + acc * root) % mod
+    return [x * lead_inv % mod for x in quotient], [rem]
+
+
+def div_long(pol1, pol2):
+    """
+    Quotient and remainder, as lists of reduced ints, of the division of the polynomial with the int
+    coefficients pol1 by the one with the int coefficients pol2, by long division over the non-zero
+    coefficients of pol2 only, so that dividing by x^n - c takes linear time.
+    """
+    mod = FieldElement.k_modulus
+    rem = list(pol1)
+    deg2 = len(pol2) - 1
+    lead_inv = pow(pol2[-1], mod - 2, mod)
+    terms = [(i, -c) for i, c in enumerate(pol2[:-1]) if c]
+    quotient = [0] * (len(pol1) - deg2)
+    for deg_dif in range(len(quotient) - 1, -1, -1):
+        tmp = rem[deg_dif + deg2] % mod * lead_inv % mod
+        quotient[deg_dif] = tmp
+        if tmp:
+            for i, c in terms:
+                rem[deg_dif + i] += tmp * c
+    return quotient, [x % mod for x in rem[:deg2]]
+
+
+def inverse_power_series(pol, n):
+    """
+    Returns the first n coefficients of the power series inverse of the polynomial with the int
+    coefficients pol, whose free term must not be zero, by Newton iteration: if h inverts pol
+    modulo x^k, then h * (2 - pol * h) inverts it modulo x^2k.
+    """
+    mod = FieldElement.k_modulus
+    res = [pow(pol[0], mod - 2, mod)]
+    k = 1
+    while k < n:
+        k = min(2 * k, n)
+        err = mul_coefficients(pol[:k], res)[:k]
+        err = [-x % mod for x in err]
+        err[0] = (err[0] + 2) % mod
+        res = mul_coefficients(res, err)[:k]
+    return res
+
+
+def div_newton(pol1, pol2):
+    """
+    Quotient and remainder, as lists of reduced ints, of the division of the polynomial with the int
+    coefficients pol1 by the one with the int coefficients pol2, in the time of a few products.
+    Reversing the coefficients maps f = q * g + r to rev(f) = rev(q) * rev(g) + x^(deg f - deg g + 1)
+    * rev(r), so rev(q) is rev(f) / rev(g) modulo x^(deg f - deg g + 1).
+    """
+    mod = FieldElement.k_modulus
+    quotient_len = len(pol1) - len(pol2) + 1
+    rev_inverse = inverse_power_series(pol2[::-1], quotient_len)
+    quotient = mul_coefficients(pol1[::-1][:quotient_len], rev_inverse)[:quotient_len][::-1]
+    product = mul_coefficients(quotient, pol2)
+    rem = [(a - b) % mod for a, b in zip(pol1[:len(pol2) - 1], product)]
+    return quotient, rem
+
+
+def div_coefficients(pol1, pol2):
+    """
+    Quotient and remainder, as lists of reduced ints, of the division of the polynomial with the int
+    coefficients pol1 by the one with the int coefficients pol2 (both reduced, free term first, pol2
+    without trailing zeros), using the algorithm suited to their sizes and to the sparsity of pol2.
+    """
+    if len(pol1) < len(pol2):
+        return [], list(pol1)
+    if len(pol2) == 2:
+        return div_linear(pol1, pol2)
+    quotient_len = len(pol1) - len(pol2) + 1
+    if min(quotient_len, sum(1 for c in pol2 if c)) < NEWTON_DIV_MIN_SIZE:
+        return div_long(pol1, pol2)
+    return div_newton(pol1, pol2)
+
+
+def coset_lde(poly, offset, size):
+    """
+    Low degree extension of poly over the coset offset * H, where H is the multiplicative subgroup of
+    order size. Returns the FieldArray [poly(offset * h**i) for i in range(size)] where h is
+    primitive_root_of_unity(size), computed with a single NTT instead of size Horner evaluations.
+    """
+    mod = np.uint64(FieldElement.k_modulus)
+    n = len(poly.coefs)
+    # poly(offset * x) has the coefficients c_i * offset**i.
+    coefs = (FieldArray._wrap(np.array(poly.coefs, dtype=np.uint64)) * FieldArray.powers(offset, n)).vals
+    # Since h**size = 1, coefficients beyond size wrap around.
+    coefs = np.concatenate((coefs, np.zeros(-n % size, dtype=np.uint64)))
+    coefs = coefs.reshape(-1, size).sum(axis=0, dtype=np.uint64) % mod
+    return FieldArray._wrap(ntt_array(coefs, primitive_root_of_unity(size).val))
+
+
+def coset_interpolate(values, offset):
+    """
+    Inverse of coset_lde: returns the polynomial f of degree < len(values) such that
+    f(offset * h**i) = values[i], where h is primitive_root_of_unity(len(values)).
+    """
+    mod = FieldElement.k_modulus
+    size = len(values)
+    vals = values.tolist() if isinstance(values, FieldArray) else [v.val for v in values]
+    coefs = intt(vals, primitive_root_of_unity(size).val)
+    offset_inv = FieldElement.typecast(offset).inverse().val
+    scale = 1
+    for i in range(size):
+        coefs[i] = coefs[i] * scale % mod
+        scale = scale * offset_inv % mod
+    return Polynomial._wrap(coefs)
+
+
+def interpolate_poly_subgroup(y_values, generator):
+    """
+    Interpolates over the full multiplicative subgroup generated by `generator`, i.e. returns the
+    polynomial f of degree < n such that f(generator**i) = y_values[i], where n = len(y_values) is
+    the order of generator.
+    """
+    root = FieldElement.typecast(generator).val
+    coefs = intt([FieldElement.typecast(y).val for y in y_values], root)
+    return Polynomial._wrap(coefs)
+
+
+def interpolate_poly_subgroup_minus_one(y_values, generator):
+    """
+    Interpolates over the multiplicative subgroup generated by `generator` without its last point,
+    i.e. returns the polynomial f of degree < n - 1 such that f(generator**i) = y_values[i], where
+    n = len(y_values) + 1 is the order of generator.
+    """
+    mod = FieldElement.k_modulus
+    n = len(y_values) + 1
+    root = FieldElement.typecast(generator).val
+    # Interpolating over the full subgroup, setting the missing value to 0, yields
+    # q = f - f(x_last) * L_last, where the coefficients of the Lagrange basis polynomial of the
+    # last point x_last = root**(n-1) are L_last[j] = root**j / n.
+    # Since deg(f) < n - 1, the leading coefficient of q pins down f(x_last).
+    q = intt([FieldElement.typecast(y).val for y in y_values] + [0], root)
+    f_last = -q[-1] * n * root % mod
+    scale = f_last * pow(n, mod - 2, mod) % mod
+    coefs = []
+    for c in q:
+        coefs.append((c + scale) % mod)
+        scale = scale * root % mod
+    return Polynomial._wrap(coefs)
+
+
+def get_subgroup_generator(x_values):
+    """
+    If x_values are the first len(x_values) powers of an element g, starting from g**0 = 1, and g
+    generates a subgroup of power of two order n with len(x_values) in (n - 1, n), returns g.
+    Otherwise returns None.
+    """
+    if len(x_values) < 2 or x_values[0] != FieldElement.one():
+        return None
+    mod = FieldElement.k_modulus
+    gen = x_values[1].val
+    cur = 1
+    for x in x_values:
+        if x.val != cur:
+            return None
+        cur = cur * gen % mod
+    n = len(x_values) if is_power_of_two(len(x_values)) else len(x_values) + 1
+    if not is_power_of_two(n) or pow(gen, n, mod) != 1 or pow(gen, n // 2, mod) == 1:
+        return None
+    return x_values[1]
+
+
 def interpolate_poly(x_values, y_values):
     """
     Returns a polynomial of degree < len(x_values) that evaluates to y_values[i] on x_values[i] for
     all i.
+    If x_values is a multiplicative subgroup of power of two order (possibly without its last
+    point), the interpolation is done with an NTT in O(n log n) instead of Lagrange interpolation.
     """
     assert len(x_values) == len(y_values)
     assert all(isinstance(val, FieldElement) for val in x_values),\
         'Not all x_values are FieldElement'
+    generator = get_subgroup_generator(x_values)
+    if generator is not None:
+        assert all(isinstance(val, FieldElement) for val in y_values),\
+            'Not all y_values are FieldElement'
+        if is_power_of_two(len(x_values)):
+            return interpolate_poly_subgroup(y_values, generator)
+        return interpolate_poly_subgroup_minus_one(y_values, generator)
     lp = calculate_lagrange_polynomials(x_values)
     assert all(isinstance(val, FieldElement) for val in y_values),\
         'Not all y_values are FieldElement'
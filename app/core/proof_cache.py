@@ -0,0 +1,237 @@
+"""
+Content-addressed cache of generated proofs.
+
+A proof only depends on the arguments of generate_proof, apart from its timestamp: proofs are cached
+without it, under the hash of the canonical JSON of those arguments, in the binary encoding of
+proof_encoder. The cache has an in-memory LRU tier and an optional tier of files in a local
+directory, bounded by their total size.
+"""
+import json
+import logging
+import os
+import tempfile
+import time
+from threading import Lock
+
+from eth_hash.auto import keccak
+
+from app.core.cache import LRUCache
+from app.core.proof_decoder import ProofDecodingError, decode_proof
+from app.core.proof_encoder import ProofEncodingError, encode_proof
+
+# Part of every key, to be bumped when the proofs generated for the same arguments change.
+CACHE_FORMAT_VERSION = 3
+
+TIMESTAMP_MODES = ('response', 'deterministic')
+
+logger = logging.getLogger(__name__)
+
+
+def proof_cache_key(data, query_num, ver, **kwargs):
+    """
+    Returns the hex digest identifying the proof generate_proof(data, query_num, ver, **kwargs) up to
+    its timestamp. ver is the JSON of the verifier data, canonicalized here.
+    """
+    kwargs.pop('timestamp', None)
+    request = {
+        'version': CACHE_FORMAT_VERSION,
+        'data': data,
+        'query_num': query_num,
+        'ver': json.loads(ver),
+        'kwargs': kwargs
+    }
+    return keccak(json.dumps(request, sort_keys=True, separators=(',', ':')).encode()).hex()
+
+
+class DiskCache:
+    """
+    Maps keys (hex digests) to bytes stored as files in directory, removing the least recently used
+    files once their total size exceeds max_bytes. Several processes may share the directory: files
+    are written atomically, and the total size is recomputed from the directory when evicting.
+    """
+
+    SUFFIX = '.proof'
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+        self.total_bytes = sum(size for _, _, size in self._files())
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = Lock()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + self.SUFFIX)
+
+    def _files(self):
+        """
+        Returns (last use, path, size) for every file of the cache.
+        """
+        files = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(self.SUFFIX):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            files.append((stat.st_mtime, path, stat.st_size))
+        return files
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                value = f.read()
+            # The modification time records the last use, for the eviction order.
+            os.utime(path)
+        except FileNotFoundError:
+            with self.lock:
+                self.misses += 1
+            return None
+        with self.lock:
+            self.hits += 1
+        return value
+
+    def put(self, key, value):
+        if len(value) > self.max_bytes:
+            return
+        path = self._path(key)
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(value)
+            # A rewritten key replaces its file, whose size no longer counts.
+            try:
+                old_size = os.stat(path).st_size
+            except FileNotFoundError:
+                old_size = 0
+            os.replace(tmp_path, path)
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        with self.lock:
+            self.total_bytes += len(value) - old_size
+            if self.total_bytes > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        files = sorted(self._files())
+        self.total_bytes = sum(size for _, _, size in files)
+        for _, path, size in files:
+            if self.total_bytes <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            self.total_bytes -= size
+            self.evictions += 1
+
+    def clear(self):
+        with self.lock:
+            for _, path, _ in self._files():
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+            self.total_bytes = 0
+
+    def stats(self):
+        with self.lock:
+            return {
+                'directory': self.directory,
+                'bytes': self.total_bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions
+            }
+
+
+class ProofCache:
+    """
+    Caches proofs by proof_cache_key, in memory and optionally on disk (disk is a DiskCache or None).
+    The stored proofs carry no timestamp: get stamps the proof it returns with the current time if
+    timestamp is 'response', or with 0.0 if it is 'deterministic'.
+    """
+
+    def __init__(self, max_bytes, disk=None, timestamp='response'):
+        assert timestamp in TIMESTAMP_MODES, f'Unknown timestamp mode: {timestamp}.'
+        self.memory = LRUCache(max_bytes=max_bytes)
+        self.disk = disk
+        self.timestamp = timestamp
+
+    def configure(self, max_bytes, directory=None, disk_max_bytes=2**30, timestamp='response'):
+        assert timestamp in TIMESTAMP_MODES, f'Unknown timestamp mode: {timestamp}.'
+        self.memory.clear()
+        self.memory.max_bytes = max_bytes
+        self.disk = DiskCache(directory, disk_max_bytes) if directory else None
+        self.timestamp = timestamp
+
+    @property
+    def enabled(self):
+        return self.memory.max_bytes > 0 or self.disk is not None
+
+    def stamp(self):
+        """
+        Returns the timestamp of the proofs generated or served now.
+        """
+        return 0.0 if self.timestamp == 'deterministic' else time.time()
+
+    def get(self, key):
+        """
+        Returns the cached proof for key with a timestamp, or None.
+        """
+        encoded = self.memory.get(key)
+        if encoded is None and self.disk is not None:
+            try:
+                encoded = self.disk.get(key)
+            except OSError as e:
+                logger.warning(f'Proof cache read failed: {e}')
+            if encoded is not None:
+                self.memory.put(key, encoded, len(encoded))
+        if encoded is None:
+            return None
+        try:
+            proof = decode_proof(encoded)
+        except ProofDecodingError:
+            # A damaged file of the disk tier, regenerate the proof.
+            return None
+        # The timestamp leads the proof, as in generate_proof.
+        return {"timestamp": self.stamp(), **proof}
+
+    def put(self, key, proof):
+        """
+        Caches proof (without its timestamp). Proofs that the binary encoding cannot represent are
+        not cached.
+        """
+        try:
+            encoded = encode_proof({k: v for k, v in proof.items() if k != "timestamp"})
+        except ProofEncodingError:
+            return
+        self.memory.put(key, encoded, len(encoded))
+        if self.disk is not None:
+            try:
+                self.disk.put(key, encoded)
+            except OSError as e:
+                # The proof has been generated anyway, a full or read-only disk only costs the cache.
+                logger.warning(f'Proof cache write failed: {e}')
+
+    def clear(self):
+        self.memory.clear()
+        if self.disk is not None:
+            self.disk.clear()
+
+    def stats(self):
+        stats = {'memory': self.memory.stats(), 'timestamp': self.timestamp}
+        if self.disk is not None:
+            stats['disk'] = self.disk.stats()
+        return stats
+
+
+proof_cache = ProofCache(max_bytes=64 * 2**20)
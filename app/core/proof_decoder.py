@@ -0,0 +1,127 @@
+"""
+Decoding of the binary proof format described in app.core.proof_encoder.
+
+decode_proof(encode_proof(proof)) == proof for every proof built by generate_proof, so the decoded
+dict can be passed to verify_proof unchanged.
+"""
+import struct
+
+from app.core.field import FieldElement
+from app.core.merkle import DIGEST_SIZE
+from app.core.proof_encoder import (
+    MAGIC, VERSION, FLAG_TIMESTAMP, FLAG_BATCHED, FLAG_FIAT_SHAMIR,
+    HEADER, FLOAT64, UINT64, UINT32, UINT16, UINT8
+)
+from app.core.transcript import FIAT_SHAMIR
+
+
+class ProofDecodingError(ValueError):
+    """The data is not a valid binary proof"""
+
+
+class _Reader:
+
+    def __init__(self, data):
+        self.data = memoryview(data)
+        self.pos = 0
+
+    def unpack(self, fmt):
+        try:
+            (value,) = fmt.unpack_from(self.data, self.pos)
+        except struct.error:
+            raise ProofDecodingError(f'Truncated proof at byte {self.pos}')
+        self.pos += fmt.size
+        return value
+
+    def field(self):
+        return str(FieldElement(self.unpack(UINT32)))
+
+    def field_value(self):
+        # The coefficients chosen by the verifier are held in the proofs as ints.
+        return FieldElement(self.unpack(UINT32)).val
+
+    def digest(self):
+        end = self.pos + DIGEST_SIZE
+        if end > len(self.data):
+            raise ProofDecodingError(f'Truncated proof at byte {self.pos}')
+        node = self.data[self.pos:end].hex()
+        self.pos = end
+        return node
+
+    def path(self):
+        return [self.digest() for _ in range(self.unpack(UINT16))]
+
+
+def decode_proof(data):
+    """
+    Returns the proof dict encoded in data (bytes).
+    * Raise ProofDecodingError if data is not a complete proof of a supported version.
+    """
+    src = _Reader(data)
+    try:
+        magic, version, flags = HEADER.unpack_from(src.data, 0)
+    except struct.error:
+        raise ProofDecodingError('Truncated proof header')
+    if magic != MAGIC:
+        raise ProofDecodingError('Not a binary proof')
+    if version != VERSION:
+        raise ProofDecodingError(f'Unsupported proof format version: {version}')
+    src.pos = HEADER.size
+    batched = bool(flags & FLAG_BATCHED)
+
+    proof = {}
+    if flags & FLAG_TIMESTAMP:
+        proof["timestamp"] = src.unpack(FLOAT64)
+    proof["mod"] = src.unpack(UINT64)
+    proof["dom_size"] = src.unpack(UINT32)
+    proof["interp_domain_size"] = src.unpack(UINT32)
+    proof["target"] = src.field()
+    proof["domain_gen"] = src.field()
+    proof["mul_field_gen"] = src.field()
+    if flags & FLAG_FIAT_SHAMIR:
+        proof["challenge_mode"] = FIAT_SHAMIR
+    proof["interp_poly_root"] = src.digest()
+    proof["compos_factors"] = {f"alpha_{i}": src.field_value() for i in range(src.unpack(UINT8))}
+    proof["compos_poly_root"] = src.digest()
+
+    commitment = {}
+    commitment["layer_roots"] = src.path()
+    commitment["folding_poly_coeffs"] = [src.field_value() for _ in range(src.unpack(UINT16))]
+    commitment["final_constant"] = src.field()
+    proof["fri_commitment"] = commitment
+
+    decommitments = {"query_num": src.unpack(UINT32)}
+    if batched:
+        decommitments["layout"] = "batched"
+    queries = []
+    for _ in range(src.unpack(UINT32)):
+        query = {"idx": src.unpack(UINT32)}
+        for name in ("f_x", "f_gx", "f_ggx"):
+            query[name] = {"val": src.field()}
+            if not batched:
+                query[name]["auth_path"] = src.path()
+        layers = {}
+        for j in range(src.unpack(UINT16)):
+            layer = {"idx": src.unpack(UINT32), "val": src.field()}
+            if not batched:
+                layer["auth_path"] = src.path()
+            layer["sib_val"] = src.field()
+            if not batched:
+                layer["sib_auth_path"] = src.path()
+            layers[f"layer_{j}"] = layer
+        query["fri_layers"] = layers
+        query["last_val"] = src.field()
+        queries.append(query)
+    decommitments["queries"] = queries
+    if batched:
+        interp_poly = src.path()
+        decommitments["auth_paths"] = {
+            "interp_poly": interp_poly,
+            "fri_layers": [src.path() for _ in range(src.unpack(UINT16))]
+        }
+    decommitments["fri_last_val"] = src.field()
+    proof["fri_decommitments"] = decommitments
+
+    if src.pos != len(src.data):
+        raise ProofDecodingError(f'Unexpected {len(src.data) - src.pos} trailing bytes')
+    return proof
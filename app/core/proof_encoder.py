@@ -0,0 +1,161 @@
+"""
+Compact binary encoding of the proofs built by generate_proof.
+
+All integers are little-endian. Field elements are stored as their canonical value in a uint32 and
+Merkle nodes as raw 32 byte digests, instead of decimal and hex strings. The layout is:
+
+    header          magic b'STKP', version (uint8), flags (uint8)
+    timestamp       float64, only if FLAG_TIMESTAMP is set
+    mod             uint64
+    dom_size, interp_domain_size                                uint32 each
+    target, domain_gen, mul_field_gen                           field elements
+    challenge_mode  not stored, "fiat-shamir" if FLAG_FIAT_SHAMIR is set
+    interp_poly_root                                            digest
+    compos_factors  count (uint8), then field elements
+    compos_poly_root                                            digest
+    fri_commitment  layer_roots (path), folding_poly_coeffs (uint16 count, then field elements),
+                    final_constant (field element)
+    fri_decommitments
+                    query_num, query count (uint32 each), then per query:
+                        idx (uint32), f_x, f_gx, f_ggx (field element, then path unless batched),
+                        layer count (uint16), then per layer: idx (uint32), val, [auth_path],
+                        sib_val, [sib_auth_path],
+                        last_val (field element)
+                    if FLAG_BATCHED: interp_poly path, layer count (uint16), one path per layer
+                    fri_last_val (field element)
+
+where a path is a uint16 count followed by that many digests.
+"""
+import struct
+
+from app.core.field import FieldElement
+from app.core.merkle import DIGEST_SIZE
+from app.core.transcript import FIAT_SHAMIR
+
+PROOF_MEDIA_TYPE = 'application/octet-stream'
+
+MAGIC = b'STKP'
+VERSION = 2
+
+FLAG_TIMESTAMP = 1
+FLAG_BATCHED = 2
+FLAG_FIAT_SHAMIR = 4
+
+HEADER = struct.Struct('<4sBB')
+FLOAT64 = struct.Struct('<d')
+UINT64 = struct.Struct('<Q')
+UINT32 = struct.Struct('<I')
+UINT16 = struct.Struct('<H')
+UINT8 = struct.Struct('<B')
+
+
+class ProofEncodingError(ValueError):
+    """The proof cannot be represented in the binary format"""
+
+
+class _Writer:
+
+    def __init__(self):
+        self.buf = bytearray()
+
+    def pack(self, fmt, value):
+        try:
+            self.buf += fmt.pack(value)
+        except struct.error as e:
+            raise ProofEncodingError(f'Value {value!r} out of range: {e}')
+
+    def field(self, value):
+        # Field elements are held as canonical ints or, as printed by FieldElement, as decimal strings
+        # of their shorter signed value: anything else would not decode to the same proof.
+        if isinstance(value, int) and not isinstance(value, bool):
+            valid = 0 <= value < FieldElement.k_modulus
+        elif isinstance(value, str):
+            try:
+                valid = str(FieldElement(int(value))) == value
+            except ValueError:
+                valid = False
+        else:
+            valid = False
+        if not valid:
+            raise ProofEncodingError(f'Value {value!r} is not a field element')
+        self.buf += UINT32.pack(FieldElement(int(value)).val)
+
+    def digest(self, node):
+        digest = bytes.fromhex(node)
+        if len(digest) != DIGEST_SIZE:
+            raise ProofEncodingError(f'Merkle node {node!r} is not a {DIGEST_SIZE} byte digest')
+        self.buf += digest
+
+    def path(self, nodes):
+        self.pack(UINT16, len(nodes))
+        for node in nodes:
+            self.digest(node)
+
+
+def encode_proof(proof):
+    """
+    Returns the binary encoding of proof, a dict as returned by generate_proof (either layout).
+    * Raise ProofEncodingError if a value does not fit the format.
+    """
+    decommitments = proof["fri_decommitments"]
+    batched = decommitments.get("layout") == "batched"
+    flags = (FLAG_TIMESTAMP if "timestamp" in proof else 0) | (FLAG_BATCHED if batched else 0)
+    if "challenge_mode" in proof:
+        if proof["challenge_mode"] != FIAT_SHAMIR:
+            raise ProofEncodingError(f'Unknown challenge mode: {proof["challenge_mode"]!r}')
+        flags |= FLAG_FIAT_SHAMIR
+
+    out = _Writer()
+    out.buf += HEADER.pack(MAGIC, VERSION, flags)
+    if "timestamp" in proof:
+        out.pack(FLOAT64, proof["timestamp"])
+    out.pack(UINT64, proof["mod"])
+    out.pack(UINT32, proof["dom_size"])
+    out.pack(UINT32, proof["interp_domain_size"])
+    out.field(proof["target"])
+    out.field(proof["domain_gen"])
+    out.field(proof["mul_field_gen"])
+    out.digest(proof["interp_poly_root"])
+
+    compos_factors = list(proof["compos_factors"].values())
+    out.pack(UINT8, len(compos_factors))
+    for factor in compos_factors:
+        out.field(factor)
+    out.digest(proof["compos_poly_root"])
+
+    commitment = proof["fri_commitment"]
+    out.path(commitment["layer_roots"])
+    out.pack(UINT16, len(commitment["folding_poly_coeffs"]))
+    for coeff in commitment["folding_poly_coeffs"]:
+        out.field(coeff)
+    out.field(commitment["final_constant"])
+
+    queries = decommitments["queries"]
+    out.pack(UINT32, decommitments["query_num"])
+    out.pack(UINT32, len(queries))
+    for query in queries:
+        out.pack(UINT32, query["idx"])
+        for name in ("f_x", "f_gx", "f_ggx"):
+            out.field(query[name]["val"])
+            if not batched:
+                out.path(query[name]["auth_path"])
+        layers = list(query["fri_layers"].values())
+        out.pack(UINT16, len(layers))
+        for layer in layers:
+            out.pack(UINT32, layer["idx"])
+            out.field(layer["val"])
+            if not batched:
+                out.path(layer["auth_path"])
+            out.field(layer["sib_val"])
+            if not batched:
+                out.path(layer["sib_auth_path"])
+        out.field(query["last_val"])
+
+    if batched:
+        auth_paths = decommitments["auth_paths"]
+        out.path(auth_paths["interp_poly"])
+        out.pack(UINT16, len(auth_paths["fri_layers"]))
+        for path in auth_paths["fri_layers"]:
+            out.path(path)
+    out.field(decommitments["fri_last_val"])
+    return bytes(out.buf)
@@ -1,11 +1,27 @@
 from eth_hash.auto import keccak
 
-from app.core.polynomial import interpolate_poly, Polynomial, X
+from app.core.domain import get_domain, primitive_root_of_unity
+from app.core.polynomial import interpolate_poly_subgroup_minus_one, coset_lde, is_power_of_two, X
 from app.core.merkle import MerkleTree
-from app.core.field import FieldElement
-from app.core.fri import decommit_fri, commit_fri
+from app.core.field import FieldElement, FieldArray
+from app.core.fri import decommit_fri, iter_decommit_fri, commit_fri_evaluations
+from app.core.cache import LRUCache
+from app.core.storage import store_array
+from app.core.transcript import FIAT_SHAMIR, query_index_bound, start_transcript
+from app.core.instrumentation import PROOFS_GENERATED, increment, span
 import json, time
 
+# Default trace length (the size of the interpolation domain, the trace having one step less) and
+# blowup factor (the ratio between the evaluation and interpolation domains).
+DEFAULT_TRACE_LENGTH = 1024
+DEFAULT_BLOWUP = 8
+# The multiplicative group of the field has order 3 * 2**30, so it has no larger power of two subgroups.
+TWO_ADICITY = 30
+
+# Trace polynomials, their LDE and its Merkle tree, keyed by the secret derived from the input, so
+# that requests for the same input with different challenges skip straight to the composition.
+trace_cache = LRUCache(max_bytes=256 * 2**20)
+
 def keccak256(data: bytes) -> str:
     return keccak(data  ).hex()
 
@@ -16,57 +32,159 @@ def nhash(data):
 def get_secret(data, integer_cap):
     return (nhash(str({data})) % integer_cap)
 
-def get_fibonacci_sequence(data):
-    my_secret = get_secret(data, FieldElement.k_modulus)
-    t = [FieldElement(1), FieldElement(my_secret)]
-    while len(t) < 1023:
-        t.append(t[-2] ** 2 + t[-1] ** 2)
-    return t    
+def get_fibonacci_sequence(data, length=1023):
+    mod = FieldElement.k_modulus
+    my_secret = get_secret(data, mod)
+    # Stepping over ints is several times faster than over FieldElements for long traces.
+    t = [1, my_secret]
+    a, b = t
+    while len(t) < length:
+        a, b = b, (a * a + b * b) % mod
+        t.append(b)
+    return [FieldElement(x) for x in t]
 
-def generate_proof(data, query_num, ver):
-    verifier_data = json.loads(ver)
-    proof = {}
-    p_dom_size = 1024
-    eval_dom_size = 8192
-    target_idx = 1022
 
-    proof["timestamp"] = time.time()
-    proof["mod"] = FieldElement.k_modulus
-    proof["dom_size"] = eval_dom_size
-    proof["interp_domain_size"] = p_dom_size
+def check_proof_parameters(trace_length, blowup):
+    """
+    * Raise ValueError unless trace_length and blowup are powers of two, with trace_length >= 4,
+      blowup >= 2 and an evaluation domain (of size trace_length * blowup) that exists in the field.
+    """
+    if not isinstance(trace_length, int) or not is_power_of_two(trace_length) or trace_length < 4:
+        raise ValueError(f'Trace length must be a power of two, at least 4: {trace_length}')
+    if not isinstance(blowup, int) or not is_power_of_two(blowup) or blowup < 2:
+        raise ValueError(f'Blowup factor must be a power of two, at least 2: {blowup}')
+    if trace_length * blowup > 2 ** TWO_ADICITY:
+        raise ValueError(f'Evaluation domain too large: trace length * blowup must be at most 2**{TWO_ADICITY}')
 
-    fib = get_fibonacci_sequence(data)
-    target = fib[target_idx]
-    proof["target"] = str(target)
+@span('trace')
+def get_trace(data, p_dom_size, eval_dom_size, g, w):
+    """
+    Returns the trace, its interpolation polynomial p over the subgroup generated by g, the
+    evaluations of p over w * H and their Merkle tree, going through trace_cache.
+    None of these depend on the verifier data.
+    """
+    key = (get_secret(data, FieldElement.k_modulus), p_dom_size, eval_dom_size)
+    trace = trace_cache.get(key)
+    if trace is not None:
+        return trace
 
-    g = FieldElement.generator() ** ((3 * 2**30)//p_dom_size)
-    G = [g ** i for i in range(p_dom_size)]
-    proof["domain_gen"] = str(g)
+    with span('trace.fibonacci'):
+        fib = get_fibonacci_sequence(data, p_dom_size - 1)
+    with span('trace.interpolate'):
+        # The trace is given over G without its last point, G being the subgroup generated by g.
+        p = interpolate_poly_subgroup_minus_one(fib, g)
+    with span('trace.lde'):
+        ev_points = FieldArray._wrap(store_array(coset_lde(p, w, eval_dom_size).vals))
+    # The evaluations are shared between requests from now on.
+    ev_points.vals.flags.writeable = False
+    f_merkle = MerkleTree(ev_points)
+    trace = (fib, p, ev_points, f_merkle)
 
-    w = FieldElement.generator()
-    proof["mul_field_gen"] = str(w)
-    h = w ** ((3*2 ** 30 ) // eval_dom_size)
-    H = [h ** i for i in range(eval_dom_size)]
-    domain = [w * x for x in H]
+    # Rough footprint: python objects for the trace and the coefficients, plus the raw evaluations
+    # and digests (in memory or memory-mapped).
+    size = 100 * (len(fib) + len(p.coefs)) + \
+        ev_points.vals.nbytes + f_merkle.data.vals.nbytes + len(f_merkle.nodes)
+    trace_cache.put(key, trace, size)
+    return trace
 
-    p = interpolate_poly(G[:-1], fib)
-    ev_points = [p.eval(d) for d in domain]
-    f_merkle = MerkleTree(ev_points)
-    proof["interp_poly_root"] = f_merkle.root
 
+@span('composition')
+def get_cp(p, g, target, p_dom_size, poly_factors):
+    """
+    Builds the composition polynomial in coefficient form, by long division of each constraint by
+    its vanishing polynomial.
+    """
     numer0 = p - 1
     denom0 = X - 1
     p0 = numer0 / denom0
 
     numer1 = p - target
-    denom1 = X - g**1022
+    denom1 = X - g**(p_dom_size - 2)
     p1 = numer1 / denom1
 
     numer2 = p(g**2 * X) - p(g * X)**2 - p**2
-    denom2 = (X**1024 - 1) / ((X - g**1021) * (X - g**1022) * (X - g**1023))
+    denom2 = (X**p_dom_size - 1) / (
+        (X - g**(p_dom_size - 3)) * (X - g**(p_dom_size - 2)) * (X - g**(p_dom_size - 1)))
     p2 = numer2 / denom2
 
-    poly_factors = verifier_data["poly_coeffs"]
+    return poly_factors[0]*p0 + poly_factors[1]*p1 + poly_factors[2]*p2
+
+
+@span('composition')
+def get_cp_evaluations(ev_points, w, g, target, p_dom_size, poly_factors):
+    """
+    Evaluates the composition polynomial over the evaluation domain w * H directly from the
+    evaluations of the trace polynomial, without going through coefficient form.
+    With blowup = len(ev_points) // p_dom_size we have g = h**blowup, so f(g * x) and f(g**2 * x)
+    are the evaluations shifted by blowup and 2 * blowup positions.
+    """
+    eval_dom_size = len(ev_points)
+    blowup = eval_dom_size // p_dom_size
+    h = primitive_root_of_unity(eval_dom_size)
+    f = FieldArray(ev_points)
+    f_gx = FieldArray.concatenate([f[blowup:], f[:blowup]])
+    f_ggx = FieldArray.concatenate([f[2 * blowup:], f[:2 * blowup]])
+    x = get_domain(eval_dom_size, w)
+
+    # x**p_dom_size - 1 only takes blowup distinct values over the domain, since h**p_dom_size has
+    # order blowup.
+    zerofier = (w ** p_dom_size) * FieldArray.powers(h ** p_dom_size, blowup) - 1
+    zerofier = FieldArray.concatenate([zerofier] * p_dom_size)
+
+    # All the denominators are inverted in a single batch.
+    denoms_inv = FieldArray.concatenate([x - 1, x - g**(p_dom_size - 2), zerofier]).inverse()
+    denom0_inv = denoms_inv[:eval_dom_size]
+    denom1_inv = denoms_inv[eval_dom_size:2 * eval_dom_size]
+    zerofier_inv = denoms_inv[2 * eval_dom_size:]
+
+    p0 = (f - 1) * denom0_inv
+    p1 = (f - target) * denom1_inv
+    p2 = (f_ggx - f_gx * f_gx - f * f) * zerofier_inv * \
+        (x - g**(p_dom_size - 3)) * (x - g**(p_dom_size - 2)) * (x - g**(p_dom_size - 1))
+
+    return poly_factors[0]*p0 + poly_factors[1]*p1 + poly_factors[2]*p2
+
+
+def commit_proof(data, query_num, ver, eval_composition=True, trace_length=DEFAULT_TRACE_LENGTH, blowup=DEFAULT_BLOWUP,
+                 timestamp=None, fiat_shamir=False):
+    """
+    Runs the commitment phase of generate_proof. Returns the proof without "fri_decommitments",
+    and the arguments of decommit_fri (before query_num) that open it.
+    With fiat_shamir, ver is ignored and the challenges are drawn from the transcript of the
+    commitments, see app.core.transcript.
+    """
+    check_proof_parameters(trace_length, blowup)
+    verifier_data = None if fiat_shamir else json.loads(ver)
+    proof = {}
+    p_dom_size = trace_length
+    eval_dom_size = trace_length * blowup
+    target_idx = trace_length - 2
+
+    proof["timestamp"] = time.time() if timestamp is None else timestamp
+    proof["mod"] = FieldElement.k_modulus
+    proof["dom_size"] = eval_dom_size
+    proof["interp_domain_size"] = p_dom_size
+
+    g = FieldElement.generator() ** ((3 * 2**30)//p_dom_size)
+    w = FieldElement.generator()
+    fib, p, ev_points, f_merkle = get_trace(data, p_dom_size, eval_dom_size, g, w)
+
+    target = fib[target_idx]
+    proof["target"] = str(target)
+    proof["domain_gen"] = str(g)
+    proof["mul_field_gen"] = str(w)
+    if fiat_shamir:
+        proof["challenge_mode"] = FIAT_SHAMIR
+    domain = get_domain(eval_dom_size, w)
+    proof["interp_poly_root"] = f_merkle.root
+
+    if fiat_shamir:
+        transcript = start_transcript(proof)
+        transcript.absorb(f_merkle.root)
+        poly_factors = transcript.field_elements(3)
+    else:
+        # The coefficients are recorded reduced, as the binary encoding stores them.
+        poly_factors = [FieldElement(c).val for c in verifier_data["poly_coeffs"]]
     factor0, factor1, factor2 = poly_factors[0], poly_factors[1], poly_factors[2]
     proof["compos_factors"] = {
         "alpha_0": factor0,
@@ -74,14 +192,75 @@ def generate_proof(data, query_num, ver):
         "alpha_2": factor2
     }
 
-    cp: Polynomial = factor0*p0 + factor1*p1 + factor2*p2
-    cp_eval = [cp.eval(d) for d in domain]
+    if eval_composition:
+        cp_eval = get_cp_evaluations(ev_points, w, g, target, p_dom_size, poly_factors)
+    else:
+        cp = get_cp(p, g, target, p_dom_size, poly_factors)
+        with span('composition.lde'):
+            cp_eval = coset_lde(cp, w, eval_dom_size)
+    cp_eval = FieldArray._wrap(store_array(cp_eval.vals))
     cp_merkle = MerkleTree(cp_eval)
     proof["compos_poly_root"] = cp_merkle.root
 
-    fri_polys, fri_domains, fri_layers, fri_merkles, fri_on_proof = commit_fri(cp, domain, cp_eval, cp_merkle, verifier_data["folding_coeffs"])
+    if fiat_shamir:
+        def folding_coeffs(root):
+            transcript.absorb(root)
+            return transcript.field_elements(1)[0]
+    else:
+        folding_coeffs = [FieldElement(c).val for c in verifier_data["folding_coeffs"]]
+    fri_layers, fri_merkles, fri_on_proof = commit_fri_evaluations(domain, cp_eval, cp_merkle, folding_coeffs)
     proof["fri_commitment"] = fri_on_proof
-    challenges = verifier_data["challenges"]
-    proof["fri_decommitments"] = decommit_fri(ev_points, f_merkle, fri_layers, fri_merkles, challenges, query_num)
+    if fiat_shamir:
+        transcript.absorb(fri_on_proof["layer_roots"][-1], fri_on_proof["final_constant"], query_num)
+        challenges = transcript.indices(query_num, query_index_bound(eval_dom_size, blowup))
+    else:
+        challenges = verifier_data["challenges"]
+    return proof, (ev_points, f_merkle, fri_layers, fri_merkles, challenges)
+
+
+@span('generate_proof')
+def generate_proof(data, query_num, ver, eval_composition=True, batched=False,
+                   trace_length=DEFAULT_TRACE_LENGTH, blowup=DEFAULT_BLOWUP, timestamp=None, fiat_shamir=False):
+    """
+    Proves the trace of trace_length - 1 steps derived from data, committing to its evaluations
+    over a domain blowup times larger. Both sizes are recorded in the proof as interp_domain_size
+    and dom_size.
+    The proof records timestamp, or the current time if it is None; everything else in it only
+    depends on the arguments.
+    The challenges come from ver, the JSON of the verifier data, or with fiat_shamir from the
+    commitments themselves, in which case the proof is marked with "challenge_mode".
+    """
+    proof, openings = commit_proof(data, query_num, ver, eval_composition, trace_length, blowup, timestamp, fiat_shamir)
+    proof["fri_decommitments"] = decommit_fri(*openings, query_num, batched, blowup)
+    increment(PROOFS_GENERATED)
     return proof
 
+
+def generate_proof_stream(data, query_num, ver, eval_composition=True, batched=False,
+                          trace_length=DEFAULT_TRACE_LENGTH, blowup=DEFAULT_BLOWUP, timestamp=None,
+                          fiat_shamir=False):
+    """
+    Same as generate_proof, but yields the proof in parts, so that it never has to be held in full:
+    {"type": "header", "proof": <proof without "fri_decommitments">}, then
+    {"type": "query", "query": <query>} for each query and finally
+    {"type": "decommitments", "fri_decommitments": <decommitments without "queries">}.
+    """
+    proof, openings = commit_proof(data, query_num, ver, eval_composition, trace_length, blowup, timestamp, fiat_shamir)
+    yield {"type": "header", "proof": proof}
+    for kind, part in iter_decommit_fri(*openings, query_num, batched, blowup):
+        if kind == "query":
+            yield {"type": "query", "query": part}
+        else:
+            yield {"type": "decommitments", "fri_decommitments": part}
+    increment(PROOFS_GENERATED)
+
+
+def iter_proof_parts(proof):
+    """
+    Yields the parts of generate_proof_stream from a proof returned by generate_proof.
+    """
+    decommitments = proof["fri_decommitments"]
+    yield {"type": "header", "proof": {k: v for k, v in proof.items() if k != "fri_decommitments"}}
+    for query in decommitments["queries"]:
+        yield {"type": "query", "query": query}
+    yield {"type": "decommitments", "fri_decommitments": {k: v for k, v in decommitments.items() if k != "queries"}}
@@ -1,74 +1,262 @@
 """
 STARK Proof Verifier
 """
-from app.core.merkle import verify_decommitment
-from app.core.field import FieldElement
+from collections import OrderedDict
+from functools import lru_cache
 
+from app.core.domain import get_domain_element
+from app.core.merkle import verify_decommitment, verify_batch_decommitment
+from app.core.field import FieldElement, batch_inverse
+from app.core import transcript
+from app.core.instrumentation import PROOFS_VERIFIED, increment, span
 
-def get_cp_value(domain, idx, compos_factors, fx, fgx, fggx, target):
-    """Calcola il valore del polinomio di composizione."""
-    domain_element = domain[idx]
-    g = FieldElement.generator() ** ((3 * 2**30) // 1024)
+INV_2 = FieldElement(2).inverse()
+
+# Numero massimo di alberi di cui si ricordano i nodi autenticati durante una verifica batch
+MAX_VERIFIED_ROOTS = 64
+
+
+# La dimensione arriva dalla proof, quindi la cache e' limitata
+@lru_cache(maxsize=16)
+def get_constraint_points(p_dom_size):
+    """Restituisce g**(n-3), g**(n-2), g**(n-1), calcolati una sola volta per dimensione."""
+    g = FieldElement.generator() ** ((3 * 2**30) // p_dom_size)
+    return g**(p_dom_size - 3), g**(p_dom_size - 2), g**(p_dom_size - 1)
+
+
+def get_cp_denominators(domain_element, p_dom_size=1024):
+    """Denominatori del polinomio di composizione in un punto del dominio."""
+    _, g_n2, _ = get_constraint_points(p_dom_size)
+    return [domain_element - 1, domain_element - g_n2, domain_element**p_dom_size - 1]
+
+
+def get_cp_value_from_inverses(domain_element, compos_factors, fx, fgx, fggx, target, denominators_inv, p_dom_size=1024):
+    """Calcola il valore del polinomio di composizione, dati gli inversi di get_cp_denominators."""
+    g_n3, g_n2, g_n1 = get_constraint_points(p_dom_size)
     
     # Calcolo dei tre componenti del polinomio di composizione
-    f1 = compos_factors[0] * (fx - 1) / (domain_element - 1)
-    f2 = compos_factors[1] * (fx - target) / (domain_element - g**1022)
+    f1 = compos_factors[0] * (fx - 1) * denominators_inv[0]
+    f2 = compos_factors[1] * (fx - target) * denominators_inv[1]
     
-    vanishing_poly = (domain_element**1024 - 1) / (
-        (domain_element - g**1021) *
-        (domain_element - g**1022) *
-        (domain_element - g**1023)
+    # 1 / vanishing_poly = (x - g**(n-3))(x - g**(n-2))(x - g**(n-1)) / (x**n - 1), con n = p_dom_size
+    vanishing_poly_inv = denominators_inv[2] * (
+        (domain_element - g_n3) *
+        (domain_element - g_n2) *
+        (domain_element - g_n1)
     )
-    f3 = compos_factors[2] * (fggx - fgx**2 - fx**2) / vanishing_poly
+    f3 = compos_factors[2] * (fggx - fgx**2 - fx**2) * vanishing_poly_inv
     
     return f1 + f2 + f3
 
 
-def verify_proof(proof):
-    """Verifica la validità di una proof utilizzando il protocollo FRI."""
-    verification_errors = []
-    
-    try:
-        # Estrazione dei parametri dalla proof
-        mod = proof["mod"]
-        target = FieldElement(int(proof["target"]))
-        interp_poly_root = proof["interp_poly_root"]
-        compos_factors = [
+def get_cp_value(domain, idx, compos_factors, fx, fgx, fggx, target, p_dom_size=1024):
+    """Calcola il valore del polinomio di composizione, per una traccia di lunghezza p_dom_size."""
+    domain_element = domain[idx]
+    denominators_inv = [d.inverse() for d in get_cp_denominators(domain_element, p_dom_size)]
+    return get_cp_value_from_inverses(domain_element, compos_factors, fx, fgx, fggx, target, denominators_inv, p_dom_size)
+
+
+def parse_proof(proof):
+    """Estrae dalla proof i parametri necessari alla verifica."""
+    params = {
+        "mod": proof["mod"],
+        "target": FieldElement(int(proof["target"])),
+        "interp_poly_root": proof["interp_poly_root"],
+        "compos_factors": [
             proof["compos_factors"]["alpha_0"],
             proof["compos_factors"]["alpha_1"],
             proof["compos_factors"]["alpha_2"]
-        ]
-        folding_poly_coeffs = proof["fri_commitment"]["folding_poly_coeffs"]
-        n_layers = len(folding_poly_coeffs)
-        layer_roots = proof["fri_commitment"]["layer_roots"]
-        final_constant = proof["fri_commitment"]["final_constant"]
-        query_num = proof["fri_decommitments"]["query_num"]
-        queries = proof["fri_decommitments"]["queries"]
-        dom_size = proof["dom_size"]
-        
-    except KeyError as e:
-        verification_errors.append(f"Missing required field in proof: {e}")
-        return False, verification_errors
-    except Exception as e:
-        verification_errors.append(f"Error parsing proof data: {e}")
-        return False, verification_errors
+        ],
+        "folding_poly_coeffs": proof["fri_commitment"]["folding_poly_coeffs"],
+        "layer_roots": proof["fri_commitment"]["layer_roots"],
+        "final_constant": proof["fri_commitment"]["final_constant"],
+        "query_num": proof["fri_decommitments"]["query_num"],
+        "queries": proof["fri_decommitments"]["queries"],
+        "dom_size": proof["dom_size"],
+        "interp_domain_size": proof["interp_domain_size"],
+        "batched": proof["fri_decommitments"].get("layout") == "batched",
+        "fiat_shamir": "challenge_mode" in proof
+    }
+    params["n_layers"] = len(params["folding_poly_coeffs"])
+    
+    # Lunghezza della traccia e fattore di blowup: f(gx) e f(ggx) stanno blowup e 2 * blowup
+    # posizioni dopo f(x) nel dominio di valutazione
+    interp_domain_size = params["interp_domain_size"]
+    if not isinstance(interp_domain_size, int) or interp_domain_size < 4 or interp_domain_size & (interp_domain_size - 1):
+        raise ValueError(f"invalid interp_domain_size: {interp_domain_size}")
+    if not isinstance(params["dom_size"], int) or params["dom_size"] % interp_domain_size:
+        raise ValueError(f"dom_size is not a multiple of interp_domain_size: {params['dom_size']}")
+    params["blowup"] = params["dom_size"] // interp_domain_size
+    if params["batched"]:
+        params["auth_paths"] = proof["fri_decommitments"]["auth_paths"]
+    
+    # In modalita' Fiat-Shamir le sfide vanno ricavate dal transcript dei commitment della proof
+    if params["fiat_shamir"]:
+        if proof["challenge_mode"] != transcript.FIAT_SHAMIR:
+            raise ValueError(f"unknown challenge_mode: {proof['challenge_mode']}")
+        # Senza un verifier che scelga le sfide, il numero di query deve essere sufficiente
+        if params["query_num"] < transcript.min_queries:
+            raise ValueError(f"query_num is below the minimum of {transcript.min_queries} for fiat-shamir proofs: {params['query_num']}")
+        params["challenges"] = transcript.derive_challenges(proof, params["blowup"])
     
     # Calcolo delle dimensioni dei domini per ogni layer
-    layer_domain_sizes = [dom_size // (2**i) for i in range(n_layers)]
+    params["layer_domain_sizes"] = [params["dom_size"] // (2**i) for i in range(params["n_layers"])]
     
-    # Costruzione del dominio di valutazione iniziale
+    # Il dominio del layer i e' il coset w**(2**i) * H**(2**i): i suoi elementi vengono calcolati
+    # solo per gli indici interrogati, senza costruire i domini
     w = FieldElement.generator()
-    h = w ** ((3 * 2**30) // dom_size)
-    H = [h**i for i in range(dom_size)]
-    domain = [w * x for x in H]
+    params["layer_offsets"] = [w ** (2**i) for i in range(params["n_layers"])]
+    return params
+
+
+def get_denominators(params):
+    """
+    Elenca, nell'ordine in cui verranno usati da check_proof, tutti i denominatori della verifica:
+    per ogni query quelli del polinomio di composizione e 2x per il folding di ogni layer.
+    Un denominatore che non si puo' calcolare o invertire e' sostituito dall'eccezione relativa.
+    """
+    denominators = []
+    for i in range(params["query_num"]):
+        query = params["queries"][i]
+        domain_element = get_domain_element(params["dom_size"], query["idx"], FieldElement.generator())
+        for d in get_cp_denominators(domain_element, params["interp_domain_size"]):
+            if d == 0:
+                raise ZeroDivisionError(f"Query {i}: composition polynomial denominator is zero")
+            denominators.append(d)
+        for j in range(params["n_layers"]):
+            try:
+                layer_idx = query["fri_layers"][f"layer_{j}"]["idx"]
+                d = FieldElement(2) * get_domain_element(
+                    params["layer_domain_sizes"][j], layer_idx, params["layer_offsets"][j]
+                )
+                if d == 0:
+                    raise ZeroDivisionError("zero folding denominator")
+                denominators.append(d)
+            except Exception as e:
+                denominators.append(e)
+    return denominators
+
+
+def get_verified_nodes(verified_nodes, root):
+    """
+    Restituisce il dizionario dei nodi gia' autenticati sotto root, tenendo in memoria solo le
+    MAX_VERIFIED_ROOTS radici usate piu' di recente.
+    """
+    nodes = verified_nodes.pop(root, None)
+    if nodes is None:
+        nodes = {}
+    verified_nodes[root] = nodes
+    while len(verified_nodes) > MAX_VERIFIED_ROOTS:
+        verified_nodes.popitem(last=False)
+    return nodes
+
+
+def verify_proof(proof):
+    """Verifica la validità di una proof utilizzando il protocollo FRI."""
+    return verify_proofs([proof])[0]
+
+
+@span('verify_proofs')
+def verify_proofs(proofs):
+    """
+    Verifica un insieme di proof, restituendo (is_valid, errors) per ciascuna.
+    Domini e costanti sono condivisi fra le proof e tutti i denominatori del batch vengono invertiti
+    con una sola inversione nel campo (trucco di Montgomery).
+    """
+    results = [None] * len(proofs)
+    pending = []
+    denominators = []
+    
+    with span('verify.parse'):
+        for k, proof in enumerate(proofs):
+            try:
+                # Estrazione dei parametri dalla proof
+                params = parse_proof(proof)
+                proof_denominators = get_denominators(params)
+            except KeyError as e:
+                results[k] = (False, [f"Missing required field in proof: {e}"])
+                continue
+            except Exception as e:
+                results[k] = (False, [f"Error parsing proof data: {e}"])
+                continue
+            pending.append((k, params, len(denominators)))
+            denominators += proof_denominators
+    
+    with span('verify.invert'):
+        # Le eccezioni registrate restano al loro posto, tutti gli altri denominatori vengono invertiti
+        invertible = [d for d in denominators if isinstance(d, FieldElement)]
+        inverses = iter(batch_inverse(invertible))
+        denominators_inv = [next(inverses) if isinstance(d, FieldElement) else d for d in denominators]
     
-    # Costruzione dei domini per ogni layer FRI
-    layer_domains = []
-    current_domain = domain
+    with span('verify.check'):
+        # Nodi Merkle gia' autenticati per radice, condivisi fra tutte le query e le proof del batch
+        verified_nodes = OrderedDict()
+        for k, params, start in pending:
+            try:
+                results[k] = check_proof(params, denominators_inv, start, verified_nodes)
+            except KeyError as e:
+                results[k] = (False, [f"Missing required field in proof: {e}"])
+            except Exception as e:
+                results[k] = (False, [f"Error verifying proof: {e}"])
+    
+    valid = sum(1 for is_valid, _ in results if is_valid)
+    increment(PROOFS_VERIFIED, valid, result='valid')
+    increment(PROOFS_VERIFIED, len(results) - valid, result='invalid')
+    return results
+
+
+def check_challenges(params):
+    """
+    Confronta i fattori di composizione, i coefficienti di folding e gli indici delle query della
+    proof con quelli ricavati dal transcript, restituendo gli errori trovati.
+    """
+    errors = []
+    compos_factors, folding_coeffs, indices = params["challenges"]
+    if list(params["compos_factors"]) != compos_factors:
+        errors.append(f"Composition factors do not match the transcript. Expected: {compos_factors}, Got: {params['compos_factors']}")
+    if list(params["folding_poly_coeffs"]) != folding_coeffs:
+        errors.append(f"Folding coefficients do not match the transcript. Expected: {folding_coeffs}, Got: {params['folding_poly_coeffs']}")
+    for i in range(params["query_num"]):
+        idx = params["queries"][i]["idx"]
+        if idx != indices[i]:
+            errors.append(f"Query {i}: Index does not match the transcript. Expected: {indices[i]}, Got: {idx}")
+    return errors
+
+
+def check_proof(params, denominators_inv, start, verified_nodes=None):
+    """
+    Esegue i controlli di una proof, dati gli inversi dei denominatori a partire da start.
+    verified_nodes raccoglie i nodi Merkle autenticati, per non ripetere gli hash comuni ai cammini.
+    """
+    if verified_nodes is None:
+        verified_nodes = OrderedDict()
+    verification_errors = []
     
-    for i in range(n_layers):
-        layer_domains.append(current_domain)
-        current_domain = [d**2 for d in current_domain[:len(current_domain)//2]]
+    target = params["target"]
+    interp_poly_root = params["interp_poly_root"]
+    compos_factors = params["compos_factors"]
+    folding_poly_coeffs = params["folding_poly_coeffs"]
+    n_layers = params["n_layers"]
+    layer_roots = params["layer_roots"]
+    final_constant = params["final_constant"]
+    query_num = params["query_num"]
+    queries = params["queries"]
+    dom_size = params["dom_size"]
+    batched = params["batched"]
+    interp_domain_size = params["interp_domain_size"]
+    blowup = params["blowup"]
+    auth_paths = params.get("auth_paths")
+    layer_domain_sizes = params["layer_domain_sizes"]
+    w = FieldElement.generator()
+    inverses = iter(denominators_inv[start:])
+
+    # Le sfide di una proof Fiat-Shamir devono essere quelle del transcript
+    if params["fiat_shamir"]:
+        verification_errors += check_challenges(params)
+
+    # Con il layout batched i valori aperti vengono raccolti per albero e verificati alla fine
+    f_opened = []
+    layers_opened = [[] for _ in range(n_layers)]
     
     # Verifica di ogni query
     for i in range(query_num):
@@ -82,19 +270,23 @@ def verify_proof(proof):
         f_x_val = FieldElement(int(query["f_x"]["val"]))
         f_gx_val = FieldElement(int(query["f_gx"]["val"]))
         f_ggx_val = FieldElement(int(query["f_ggx"]["val"]))
+        cp_denominators_inv = [next(inverses) for _ in range(3)]
         
         # Verifica dei decommitment per i valori del polinomio
-        decommitment_f_x_valid = verify_decommitment(idx, f_x_val, f_x["auth_path"], interp_poly_root)
-        if not decommitment_f_x_valid:
-            verification_errors.append(f"Query {i}: Decommitment verification failed for f(x) at index {idx}")
-            
-        decommitment_f_gx_valid = verify_decommitment(idx + 8, f_gx_val, f_gx["auth_path"], interp_poly_root)
-        if not decommitment_f_gx_valid:
-            verification_errors.append(f"Query {i}: Decommitment verification failed for f(gx) at index {idx + 8}")
-            
-        decommitment_f_ggx_valid = verify_decommitment(idx + 16, f_ggx_val, f_ggx["auth_path"], interp_poly_root)
-        if not decommitment_f_ggx_valid:
-            verification_errors.append(f"Query {i}: Decommitment verification failed for f(ggx) at index {idx + 16}")
+        if batched:
+            f_opened += [(idx, f_x_val), (idx + blowup, f_gx_val), (idx + 2 * blowup, f_ggx_val)]
+        else:
+            decommitment_f_x_valid = verify_decommitment(idx, f_x_val, f_x["auth_path"], interp_poly_root, get_verified_nodes(verified_nodes, interp_poly_root))
+            if not decommitment_f_x_valid:
+                verification_errors.append(f"Query {i}: Decommitment verification failed for f(x) at index {idx}")
+                
+            decommitment_f_gx_valid = verify_decommitment(idx + blowup, f_gx_val, f_gx["auth_path"], interp_poly_root, get_verified_nodes(verified_nodes, interp_poly_root))
+            if not decommitment_f_gx_valid:
+                verification_errors.append(f"Query {i}: Decommitment verification failed for f(gx) at index {idx + blowup}")
+                
+            decommitment_f_ggx_valid = verify_decommitment(idx + 2 * blowup, f_ggx_val, f_ggx["auth_path"], interp_poly_root, get_verified_nodes(verified_nodes, interp_poly_root))
+            if not decommitment_f_ggx_valid:
+                verification_errors.append(f"Query {i}: Decommitment verification failed for f(ggx) at index {idx + 2 * blowup}")
         
         # Verifica che l'ultimo valore corrisponda alla costante finale
         final_constant_valid = (query["last_val"] == final_constant)
@@ -107,8 +299,9 @@ def verify_proof(proof):
             
             # Per il primo layer, il valore deve corrispondere al composition polynomial
             if j == 0:
-                expected_cp_value = get_cp_value(
-                    domain, idx, compos_factors, f_x_val, f_gx_val, f_ggx_val, target
+                expected_cp_value = get_cp_value_from_inverses(
+                    get_domain_element(dom_size, idx, w), compos_factors, f_x_val, f_gx_val, f_ggx_val, target, cp_denominators_inv,
+                    interp_domain_size
                 )
                 composition_poly_valid = (expected_cp_value == int(cur_layer["val"]))
                 if not composition_poly_valid:
@@ -118,28 +311,36 @@ def verify_proof(proof):
             cur_layer_val, sib_layer_val = FieldElement(int(cur_layer["val"])), FieldElement(int(cur_layer["sib_val"]))
             layer_idx, sib_idx = cur_layer["idx"], cur_layer["idx"] + layer_domain_sizes[j] // 2
             
-            layer_decommitment_valid = verify_decommitment(
-                layer_idx, cur_layer_val, cur_layer["auth_path"], layer_roots[j]
-            )
-            if not layer_decommitment_valid:
-                verification_errors.append(f"Query {i}, Layer {j}: Layer decommitment verification failed at index {layer_idx}")
-                
-            sib_decommitment_valid = verify_decommitment(
-                sib_idx, sib_layer_val, cur_layer["sib_auth_path"], layer_roots[j]
-            )
-            if not sib_decommitment_valid:
-                verification_errors.append(f"Query {i}, Layer {j}: Sibling decommitment verification failed at index {sib_idx}")
+            if batched:
+                layers_opened[j] += [(layer_idx, cur_layer_val), (sib_idx % layer_domain_sizes[j], sib_layer_val)]
+            else:
+                layer_decommitment_valid = verify_decommitment(
+                    layer_idx, cur_layer_val, cur_layer["auth_path"], layer_roots[j],
+                    get_verified_nodes(verified_nodes, layer_roots[j])
+                )
+                if not layer_decommitment_valid:
+                    verification_errors.append(f"Query {i}, Layer {j}: Layer decommitment verification failed at index {layer_idx}")
+                    
+                sib_decommitment_valid = verify_decommitment(
+                    sib_idx, sib_layer_val, cur_layer["sib_auth_path"], layer_roots[j],
+                    get_verified_nodes(verified_nodes, layer_roots[j])
+                )
+                if not sib_decommitment_valid:
+                    verification_errors.append(f"Query {i}, Layer {j}: Sibling decommitment verification failed at index {sib_idx}")
             
             # Verifica del FRI folding
+            folding_denominator_inv = next(inverses)
             try:
                 beta = FieldElement(folding_poly_coeffs[j])
                     
-                domain_element = layer_domains[j][layer_idx]
+                # Inverso di 2 * x, con x l'elemento del dominio del layer
+                if isinstance(folding_denominator_inv, Exception):
+                    raise folding_denominator_inv
                     
                 p_d = cur_layer_val
                 p_neg_d = sib_layer_val
                     
-                folded_value = (p_d + p_neg_d) / FieldElement(2) + beta * (p_d - p_neg_d) / (FieldElement(2) * domain_element)
+                folded_value = (p_d + p_neg_d) * INV_2 + beta * (p_d - p_neg_d) * folding_denominator_inv
                 
                 if j + 1 < n_layers:
                     next_layer = layers[f"layer_{j+1}"]
@@ -155,5 +356,19 @@ def verify_proof(proof):
             except Exception as e:
                 verification_errors.append(f"Query {i}, Layer {j}: Error in FRI folding calculation: {e}")
     
+    # Verifica dei decommitment batched: un solo controllo per albero
+    if batched:
+        if not verify_batch_decommitment(
+            [k for k, _ in f_opened], [v for _, v in f_opened],
+            auth_paths["interp_poly"], interp_poly_root, dom_size.bit_length() - 1
+        ):
+            verification_errors.append("Batched decommitment verification failed for the interpolation polynomial")
+        for j in range(n_layers):
+            if not verify_batch_decommitment(
+                [k for k, _ in layers_opened[j]], [v for _, v in layers_opened[j]],
+                auth_paths["fri_layers"][j], layer_roots[j], layer_domain_sizes[j].bit_length() - 1
+            ):
+                verification_errors.append(f"Layer {j}: Batched layer decommitment verification failed")
+    
     is_valid = len(verification_errors) == 0
     return is_valid, verification_errors
\ No newline at end of file
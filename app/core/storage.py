@@ -0,0 +1,73 @@
+"""
+Optional out-of-core storage for the large arrays of a proof.
+
+When enabled with configure_storage, the evaluation vectors (the LDE of the trace, the composition
+polynomial and the FRI layers) and the nodes of the Merkle trees built over them are kept in
+memory-mapped temporary files instead of the heap: only the pages being written, or read when
+opening queries, are resident, and the kernel can drop them under memory pressure.
+The files are unlinked as soon as they are created, so they disappear with the last reference to
+their array.
+"""
+import mmap
+import tempfile
+
+import numpy as np
+
+# Directory of the memory-mapped files (None keeps everything in memory), and the size in bytes from
+# which an array goes to disk, see configure_storage.
+storage_dir = None
+min_bytes = 2 ** 20
+
+
+def configure_storage(directory=None, min_size=2 ** 20):
+    """
+    Sets where the arrays of at least min_size bytes are stored: in memory-mapped files in directory,
+    or in memory if directory is None.
+    """
+    global storage_dir, min_bytes
+    storage_dir = directory
+    min_bytes = min_size
+
+
+def is_out_of_core(nbytes):
+    return storage_dir is not None and nbytes >= min_bytes
+
+
+def _temporary_file(nbytes):
+    f = tempfile.TemporaryFile(dir=storage_dir)
+    f.truncate(nbytes)
+    return f
+
+
+def empty_array(shape, dtype):
+    """
+    Returns an uninitialized numpy array, memory-mapped if it is large enough.
+    """
+    nbytes = int(np.prod(shape)) * np.dtype(dtype).itemsize
+    if not is_out_of_core(nbytes):
+        return np.empty(shape, dtype=dtype)
+    # The mapping keeps its own descriptor, the file can be closed right away.
+    with _temporary_file(nbytes) as f:
+        return np.memmap(f, dtype=dtype, mode='r+', shape=shape)
+
+
+def store_array(vals):
+    """
+    Returns vals itself, or a memory-mapped copy of it if it is large enough.
+    """
+    if isinstance(vals, np.memmap) or not is_out_of_core(vals.nbytes):
+        return vals
+    res = empty_array(vals.shape, vals.dtype)
+    res[...] = vals
+    return res
+
+
+def zero_bytes(nbytes):
+    """
+    Returns a zeroed buffer of nbytes bytes supporting the slicing of a bytearray: a bytearray, or an
+    mmap of a temporary file if it is large enough.
+    """
+    if not is_out_of_core(nbytes):
+        return bytearray(nbytes)
+    with _temporary_file(nbytes) as f:
+        return mmap.mmap(f.fileno(), nbytes)
@@ -0,0 +1,99 @@
+"""
+Fiat-Shamir transcript of a proof.
+
+In the "fiat-shamir" challenge mode the verifier data is not supplied by the client but derived from
+the commitments, by hashing them into a keccak chain in the order the prover makes them:
+
+    statement       mod, dom_size, interp_domain_size, target, domain_gen, mul_field_gen
+    interp_poly_root            -> alpha_0, alpha_1, alpha_2
+    layer_roots[i] for each folded layer (layer_roots[0] being compos_poly_root)
+                                -> beta_i
+    layer_roots[-1], final_constant, query_num
+                                -> the query indices
+
+Every challenge is drawn from the state reached after absorbing the commitments it follows, so that
+the prover cannot pick a commitment knowing the challenges that it determines. As the proof is
+self-contained, the verifier also requires it to open at least min_queries queries.
+"""
+from app.core.field import FieldElement
+from app.core.merkle import keccak256
+
+FIAT_SHAMIR = "fiat-shamir"
+
+STATEMENT_FIELDS = ("mod", "dom_size", "interp_domain_size", "target", "domain_gen", "mul_field_gen")
+
+# Fewest queries a proof in fiat-shamir mode may open, see configure_fiat_shamir.
+min_queries = 20
+
+
+def configure_fiat_shamir(min_query_num=20):
+    """
+    Sets the number of queries below which the verifier rejects proofs in fiat-shamir mode.
+    """
+    global min_queries
+    min_queries = min_query_num
+
+
+def draw(state, i):
+    return int(keccak256(f'{state}#{i}'.encode()), 16)
+
+
+class Transcript:
+    """
+    A keccak hash chain: absorb replaces the state with the hash of the state and the data, and the
+    i-th challenge drawn from a state is the hash of the state and i.
+    """
+
+    def __init__(self):
+        self.state = keccak256(b'')
+
+    def absorb(self, *items):
+        for item in items:
+            self.state = keccak256(f'{self.state}:{item}'.encode())
+
+    def field_elements(self, n):
+        """
+        Returns the values of n field elements drawn from the current state.
+        """
+        return [draw(self.state, i) % FieldElement.k_modulus for i in range(n)]
+
+    def indices(self, n, bound):
+        """
+        Returns n indices below bound drawn from the current state.
+        """
+        return [draw(self.state, i) % bound for i in range(n)]
+
+
+def start_transcript(proof):
+    """
+    Returns a transcript that has absorbed the public statement of proof.
+    """
+    transcript = Transcript()
+    transcript.absorb(*(proof[key] for key in STATEMENT_FIELDS))
+    return transcript
+
+
+def query_index_bound(dom_size, blowup):
+    # f(ggx) is opened 2 * blowup positions after f(x).
+    return dom_size - 2 * blowup
+
+
+def derive_challenges(proof, blowup):
+    """
+    Re-derives the challenges of a proof in fiat-shamir mode from its commitments. Returns the
+    composition factors, the folding coefficients (one per layer root but the last) and the query
+    indices.
+    """
+    commitment = proof["fri_commitment"]
+    layer_roots = commitment["layer_roots"]
+    transcript = start_transcript(proof)
+    transcript.absorb(proof["interp_poly_root"])
+    compos_factors = transcript.field_elements(3)
+    folding_coeffs = []
+    for root in layer_roots[:-1]:
+        transcript.absorb(root)
+        folding_coeffs += transcript.field_elements(1)
+    query_num = proof["fri_decommitments"]["query_num"]
+    transcript.absorb(layer_roots[-1], commitment["final_constant"], query_num)
+    indices = transcript.indices(query_num, query_index_bound(proof["dom_size"], blowup))
+    return compos_factors, folding_coeffs, indices
@@ -0,0 +1,152 @@
+"""
+Background proof jobs, run on a bounded process pool
+"""
+import multiprocessing
+import signal
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+
+from app.core.proof_generator import generate_proof
+
+
+class JobTimeoutError(Exception):
+    """Raised inside a worker when a job exceeds its time limit"""
+
+
+def _raise_timeout(signum, frame):
+    raise JobTimeoutError()
+
+
+def run_with_timeout(timeout, fn, *args, **kwargs):
+    """
+    Runs fn in the worker process, interrupting it with SIGALRM after timeout seconds.
+    """
+    previous = signal.signal(signal.SIGALRM, _raise_timeout)
+    signal.alarm(timeout)
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        signal.alarm(0)
+        signal.signal(signal.SIGALRM, previous)
+
+
+def _set_finished_at(job, future):
+    if job['finished_at'] is None:
+        job['finished_at'] = time.time()
+
+
+class JobManager:
+    """
+    Keeps track of proof jobs submitted to a ProcessPoolExecutor.
+
+    Jobs go through 'pending' -> 'running' -> 'done' | 'failed' | 'timeout' and are forgotten
+    ttl seconds after they finish. The worker processes are started by a forkserver, as forking the
+    threaded server could copy locks held by its other threads, and run initializer(*initargs) first.
+    """
+
+    def __init__(self, max_workers=2, max_jobs=100, ttl=3600, timeout=360, initializer=None, initargs=()):
+        self.max_workers = max_workers
+        self.max_jobs = max_jobs
+        self.ttl = ttl
+        self.timeout = timeout
+        self.initializer = initializer
+        self.initargs = initargs
+        self.jobs = {}
+        self.lock = threading.Lock()
+        self.executor = None
+
+    def _get_executor(self):
+        # The pool is created on first use, so that importing the app does not start processes
+        if self.executor is None:
+            self.executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context('forkserver'),
+                initializer=self.initializer,
+                initargs=self.initargs
+            )
+        return self.executor
+
+    def _submit(self, *args, **kwargs):
+        try:
+            return self._get_executor().submit(*args, **kwargs)
+        except BrokenProcessPool:
+            # A worker died (e.g. killed for its memory) and took the pool with it: the futures of
+            # the jobs it held have failed, the new jobs go to a new pool.
+            self.executor.shutdown(wait=False)
+            self.executor = None
+            return self._get_executor().submit(*args, **kwargs)
+
+    def submit(self, *args, **kwargs):
+        """
+        Queues generate_proof(*args, **kwargs) and returns the job id, or None if too many jobs
+        are already queued or running.
+        """
+        with self.lock:
+            self._expire()
+            active = sum(1 for job in self.jobs.values() if job['finished_at'] is None)
+            if active >= self.max_jobs:
+                return None
+            job_id = uuid.uuid4().hex
+            future = self._submit(run_with_timeout, self.timeout, generate_proof, *args, **kwargs)
+            job = self.jobs[job_id] = {
+                'future': future,
+                'status': 'pending',
+                'submitted_at': time.time(),
+                'finished_at': None,
+                'result': None,
+                'error': None
+            }
+            # Called as soon as the job ends, so that ttl counts from then and not from the next poll
+            future.add_done_callback(partial(_set_finished_at, job))
+            return job_id
+
+    def get(self, job_id):
+        """
+        Returns the up to date job record, or None if the job is unknown or expired.
+        """
+        with self.lock:
+            self._expire()
+            job = self.jobs.get(job_id)
+            if job is not None:
+                self._refresh(job)
+            return job
+
+    def _refresh(self, job):
+        future = job['future']
+        if future is None:
+            return
+        if not future.done():
+            job['status'] = 'running' if future.running() else 'pending'
+            return
+        # The callback may not have run yet
+        _set_finished_at(job, future)
+        try:
+            job['result'] = future.result()
+            job['status'] = 'done'
+        except JobTimeoutError:
+            job['status'] = 'timeout'
+            job['error'] = f'Proof generation exceeded {self.timeout} seconds'
+        except BrokenProcessPool:
+            job['status'] = 'failed'
+            job['error'] = 'The proof worker process exited unexpectedly'
+        except Exception as e:
+            job['status'] = 'failed'
+            job['error'] = str(e)
+        # The future holds a reference to the result as well
+        job['future'] = None
+
+    def _expire(self):
+        now = time.time()
+        for job_id, job in list(self.jobs.items()):
+            self._refresh(job)
+            if job['finished_at'] is not None and now - job['finished_at'] > self.ttl:
+                del self.jobs[job_id]
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
@@ -0,0 +1,199 @@
+"""
+Lightweight in-process metrics: counters, histograms of the time spent in each stage of proof
+generation and verification, and their rendering in the Prometheus text format.
+
+    with span('fri.commit'):
+        ...
+
+records the duration of the block in the stark_stage_duration_seconds histogram, and in the
+timings collected by collect_timings() if any. span can decorate functions as well.
+Metrics are kept per process: with several workers each one exposes its own.
+The core modules report through the hooks of app.core.instrumentation, installed here.
+"""
+import time
+import weakref
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from itertools import count
+from threading import RLock, local
+
+from app.core import instrumentation
+from app.core.instrumentation import (
+    STAGE_DURATION, HASH_CALLS, FIELD_OPS, PROOFS_GENERATED, PROOFS_VERIFIED
+)
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+PROOF_CACHE_REQUESTS = 'stark_proof_cache_requests_total'
+
+
+class MetricsRegistry:
+    """
+    Counters and histograms, identified by name and a tuple of (label, value) pairs.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.help = {}
+        # Counters are kept per thread, merged when rendered. Those of a thread that has exited are
+        # folded into retired_counters.
+        self.thread_counters = {}
+        self.retired_counters = {}
+        self.thread_ids = count()
+        self.local = local()
+        self.histograms = {}
+        # Reentrant, as a thread's counters may be retired by the garbage collector at any point.
+        self.lock = RLock()
+
+    def describe(self, name, help_text):
+        self.help[name] = help_text
+
+    def _counters(self):
+        try:
+            return self.local.counters
+        except AttributeError:
+            counters = self.local.counters = {}
+            thread_id = next(self.thread_ids)
+            with self.lock:
+                self.thread_counters[thread_id] = counters
+            # The thread-local storage of a thread is released when it exits.
+            self.local.owner = owner = _ThreadOwner()
+            weakref.finalize(owner, self._retire, thread_id)
+            return counters
+
+    def _retire(self, thread_id):
+        with self.lock:
+            counters = self.thread_counters.pop(thread_id, {})
+            for key, value in counters.items():
+                self.retired_counters[key] = self.retired_counters.get(key, 0) + value
+
+    def increment(self, name, amount=1, **labels):
+        # No lock: only this thread writes to its counters, and the array operations and hashes of
+        # the core count on every call.
+        counters = self._counters()
+        key = (name, tuple(sorted(labels.items())))
+        counters[key] = counters.get(key, 0) + amount
+
+    def counters(self):
+        """
+        Returns the counters summed over all threads.
+        """
+        with self.lock:
+            totals = dict(self.retired_counters)
+            for counters in list(self.thread_counters.values()):
+                for key, value in counters.copy().items():
+                    totals[key] = totals.get(key, 0) + value
+        return totals
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                # One count per bucket (not cumulative) plus the +Inf bucket, then sum and count.
+                histogram = self.histograms[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            histogram[0][bisect_left(self.buckets, value)] += 1
+            histogram[1] += value
+            histogram[2] += 1
+
+    def clear(self):
+        with self.lock:
+            for counters in list(self.thread_counters.values()):
+                counters.clear()
+            self.retired_counters.clear()
+            self.histograms.clear()
+
+    def render(self):
+        """
+        Returns all the metrics in the Prometheus text exposition format.
+        """
+        counters = sorted(self.counters().items())
+        with self.lock:
+            histograms = sorted((key, (list(buckets), total, count))
+                                for key, (buckets, total, count) in self.histograms.items())
+        lines = []
+        described = set()
+
+        def header(name, kind):
+            if name not in described:
+                described.add(name)
+                if name in self.help:
+                    lines.append(f'# HELP {name} {self.help[name]}')
+                lines.append(f'# TYPE {name} {kind}')
+
+        for (name, labels), value in counters:
+            header(name, 'counter')
+            lines.append(f'{name}{format_labels(labels)} {value}')
+        for (name, labels), (buckets, total, count) in histograms:
+            header(name, 'histogram')
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), buckets):
+                cumulative += bucket_count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append(f'{name}_bucket{format_labels(labels + (("le", le),))} {cumulative}')
+            lines.append(f'{name}_sum{format_labels(labels)} {total}')
+            lines.append(f'{name}_count{format_labels(labels)} {count}')
+        return '\n'.join(lines) + '\n'
+
+
+class _ThreadOwner:
+    """Held in a thread's local storage only, to learn when the thread exits."""
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+               for _, value in labels)
+    return '{' + ','.join(f'{label}="{value}"' for (label, _), value in zip(labels, escaped)) + '}'
+
+
+registry = MetricsRegistry()
+registry.describe(STAGE_DURATION, 'Time spent in each stage of proof generation and verification.')
+registry.describe(HASH_CALLS, 'Keccak calls, by Merkle operation.')
+registry.describe(FIELD_OPS, 'Field operations done on arrays of elements, by operation.')
+registry.describe(PROOFS_GENERATED, 'Proofs generated.')
+registry.describe(PROOFS_VERIFIED, 'Proofs verified, by result.')
+registry.describe(PROOF_CACHE_REQUESTS, 'Proof generation requests looked up in the proof cache, by result.')
+
+# Durations of the spans closed in the current context, when collected by collect_timings.
+_timings = ContextVar('timings', default=None)
+
+
+def increment(name, amount=1, **labels):
+    registry.increment(name, amount, **labels)
+
+
+@contextmanager
+def span(stage):
+    """
+    Times the enclosed block as the given stage. Nested spans are timed independently, so the
+    duration of a stage includes the ones of the stages nested in it.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        registry.observe(STAGE_DURATION, elapsed, stage=stage)
+        timings = _timings.get()
+        if timings is not None:
+            timings[stage] = timings.get(stage, 0.0) + elapsed
+
+
+@contextmanager
+def collect_timings():
+    """
+    Yields a dict that receives the total duration in seconds of each stage timed by the spans
+    closed in the enclosed block (in the same thread).
+    """
+    timings = {}
+    token = _timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _timings.reset(token)
+
+
+instrumentation.install_metrics(increment, span)
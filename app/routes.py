@@ -1,73 +1,298 @@
 """
 API routes for STARK proof generation
 """
-from flask import Blueprint, request, jsonify, current_app
+from flask import Blueprint, Response, request, jsonify, current_app, stream_with_context
+import itertools
 import json
-from app.core.proof_generator import generate_proof
+from app.core.proof_generator import (
+    generate_proof, generate_proof_stream, iter_proof_parts, check_proof_parameters, trace_cache
+)
+from app.core.proof_cache import proof_cache, proof_cache_key
+from app.core.proof_encoder import PROOF_MEDIA_TYPE, encode_proof
+from app.core.proof_decoder import ProofDecodingError, decode_proof
+from app.core.transcript import FIAT_SHAMIR
+from app.metrics import PROOF_CACHE_REQUESTS, collect_timings, increment
 
 api_bp = Blueprint('api', __name__, url_prefix='/api')
 
+STREAM_MEDIA_TYPE = 'application/x-ndjson'
 
-@api_bp.route('/generate-proof', methods=['POST'])
-def run_proof_generation():
+
+class RequestError(Exception):
+    """Invalid request, reported to the client with a 400"""
+
+
+def parse_proof_request():
     """
-    Generate a STARK proof from input data
+    Validate a proof generation request and extract the arguments of generate_proof
     
     Expected JSON payload:
     {
         "input": <input_data>,
         "queries": <number_of_queries>,
-        "challenges": <challenges_data>
+        "challenges": <challenges_data>  (not used with "fiat-shamir"),
+        "challenge_mode": "interactive" | "fiat-shamir"  (optional),
+        "proof_layout": "default" | "batched"  (optional),
+        "trace_length": <power_of_two>  (optional),
+        "blowup": <power_of_two>  (optional),
+        "timings": true | false  (optional, JSON responses only)
+    }
+    """
+    # Validate request
+    if not request.is_json:
+        raise RequestError('Content-Type must be application/json')
+    
+    data = request.get_json()
+    
+    # With "fiat-shamir" the challenges are derived from the commitments of the proof
+    challenge_mode = data.get('challenge_mode', 'interactive')
+    if challenge_mode not in ('interactive', FIAT_SHAMIR):
+        raise RequestError(f'Unknown challenge mode: {challenge_mode}')
+    fiat_shamir = challenge_mode == FIAT_SHAMIR
+    
+    # Validate required fields
+    required_fields = ['input', 'queries'] if fiat_shamir else ['input', 'queries', 'challenges']
+    missing_fields = [field for field in required_fields if field not in data]
+    if missing_fields:
+        raise RequestError(f'Missing required fields: {", ".join(missing_fields)}')
+    
+    # Extract and validate parameters
+    input_data = data['input']
+    queries = int(data['queries'])
+    
+    # Check queries limit
+    max_queries = current_app.config.get('MAX_QUERIES', 100)
+    if queries > max_queries:
+        raise RequestError(f'Number of queries exceeds maximum allowed: {max_queries}')
+    min_queries = current_app.config.get('FIAT_SHAMIR_MIN_QUERIES', 20)
+    if fiat_shamir and queries < min_queries:
+        raise RequestError(f'Number of queries is below the minimum for fiat-shamir proofs: {min_queries}')
+    
+    challenges = 'null' if fiat_shamir else json.dumps(data['challenges'])
+    
+    proof_layout = data.get('proof_layout', 'default')
+    if proof_layout not in ('default', 'batched'):
+        raise RequestError(f'Unknown proof layout: {proof_layout}')
+    
+    trace_length = int(data.get('trace_length', current_app.config.get('TRACE_LENGTH', 1024)))
+    blowup = int(data.get('blowup', current_app.config.get('BLOWUP', 8)))
+    max_trace_length = current_app.config.get('MAX_TRACE_LENGTH', 2**16)
+    if trace_length > max_trace_length:
+        raise RequestError(f'Trace length exceeds maximum allowed: {max_trace_length}')
+    check_proof_parameters(trace_length, blowup)
+    
+    return (str(input_data), queries, challenges), {
+        'batched': proof_layout == 'batched',
+        'trace_length': trace_length,
+        'blowup': blowup,
+        'fiat_shamir': fiat_shamir,
+        # None stamps the proof with the time of its generation
+        'timestamp': 0.0 if proof_cache.timestamp == 'deterministic' else None
     }
+
+
+def proof_media_type(streaming=False):
+    """
+    The proof encoding asked for through the Accept header: JSON by default, binary, or NDJSON
+    where streaming is supported
+    """
+    offered = ['application/json', PROOF_MEDIA_TYPE]
+    if streaming:
+        offered.append(STREAM_MEDIA_TYPE)
+    return request.accept_mimetypes.best_match(offered) or 'application/json'
+
+
+def proof_response(proof_data, timings=None):
+    """
+    Build the response carrying a generated proof, as binary if the client accepts it and as JSON
+    otherwise, with the time spent in each stage if timings is given
+    """
+    if proof_media_type() == PROOF_MEDIA_TYPE:
+        return Response(encode_proof(proof_data), mimetype=PROOF_MEDIA_TYPE), 200
+    body = {
+        'success': True,
+        'proof': proof_data
+    }
+    if timings is not None:
+        body['timings'] = timings
+    return jsonify(body), 200
+
+
+def proof_stream_response(parts):
+    """
+    Build a streaming NDJSON response, one line per part yielded by generate_proof_stream.
+    
+    The header has already been taken from parts, so that errors in the commitment phase are
+    reported with a proper status code; an error while opening the queries can only be reported
+    as a last {"type": "error"} line.
+    """
+    def generate():
+        try:
+            for part in parts:
+                yield json.dumps(part) + '\n'
+        except Exception as e:
+            current_app.logger.error(f'Error streaming proof: {str(e)}')
+            yield json.dumps({
+                'type': 'error',
+                'error': 'Internal server error',
+                'message': str(e)
+            }) + '\n'
+    return Response(stream_with_context(generate()), mimetype=STREAM_MEDIA_TYPE), 200
+
+
+@api_bp.route('/generate-proof', methods=['POST'])
+def run_proof_generation():
+    """
+    Generate a STARK proof from input data
+    
+    Expects the JSON payload described in parse_proof_request. The proof is returned in the
+    binary encoding when the request has "Accept: application/octet-stream", and streamed as
+    NDJSON (see generate_proof_stream) with "Accept: application/x-ndjson".
+    
+    Proofs are served from proof_cache when the same arguments were proven before, which the
+    X-Proof-Cache response header reports as "hit" (or "miss"). Streamed proofs are not cached,
+    but a cached proof is streamed.
     """
     try:
-        # Validate request
-        if not request.is_json:
-            return jsonify({'error': 'Content-Type must be application/json'}), 400
+        args, kwargs = parse_proof_request()
+        want_timings = bool(request.get_json().get('timings'))
+        streaming = proof_media_type(streaming=True) == STREAM_MEDIA_TYPE
         
-        data = request.get_json()
+        cache_key = proof_cache_key(*args, **kwargs) if proof_cache.enabled else None
+        proof_data = proof_cache.get(cache_key) if cache_key is not None else None
+        if cache_key is not None:
+            increment(PROOF_CACHE_REQUESTS, result='miss' if proof_data is None else 'hit')
         
-        # Validate required fields
-        required_fields = ['input', 'queries', 'challenges']
-        missing_fields = [field for field in required_fields if field not in data]
-        if missing_fields:
-            return jsonify({
-                'error': f'Missing required fields: {", ".join(missing_fields)}'
-            }), 400
+        if proof_data is not None:
+            if streaming:
+                response, status = proof_stream_response(iter_proof_parts(proof_data))
+            else:
+                response, status = proof_response(proof_data, {} if want_timings else None)
+            response.headers['X-Proof-Cache'] = 'hit'
+            return response, status
         
-        # Extract and validate parameters
-        input_data = data['input']
-        queries = int(data['queries'])
-        
-        # Check queries limit
-        max_queries = current_app.config.get('MAX_QUERIES', 100)
-        if queries > max_queries:
-            return jsonify({
-                'error': f'Number of queries exceeds maximum allowed: {max_queries}'
-            }), 400
+        if streaming:
+            parts = generate_proof_stream(*args, **kwargs)
+            header = next(parts)
+            response, status = proof_stream_response(itertools.chain([header], parts))
+        else:
+            # Generate proof
+            with collect_timings() as timings:
+                proof_data = generate_proof(*args, **kwargs)
+            if cache_key is not None:
+                proof_cache.put(cache_key, proof_data)
+            response, status = proof_response(proof_data, timings if want_timings else None)
+        if cache_key is not None:
+            response.headers['X-Proof-Cache'] = 'miss'
+        return response, status
         
-        challenges = json.dumps(data['challenges'])
+    except RequestError as e:
+        return jsonify({'error': str(e)}), 400
+    except ValueError as e:
+        return jsonify({
+            'error': f'Invalid input: {str(e)}'
+        }), 400
+    except Exception as e:
+        current_app.logger.error(f'Error generating proof: {str(e)}')
+        return jsonify({
+            'error': 'Internal server error',
+            'message': str(e)
+        }), 500
+
+
+@api_bp.route('/jobs', methods=['POST'])
+def submit_proof_job():
+    """
+    Queue a STARK proof generation in the background
+    
+    Expects the same JSON payload as /generate-proof and returns the job id
+    """
+    try:
+        args, kwargs = parse_proof_request()
         
-        # Generate proof
-        proof_data = generate_proof(str(input_data), queries, challenges)
+        job_id = current_app.extensions['proof_jobs'].submit(*args, **kwargs)
+        if job_id is None:
+            return jsonify({'error': 'Too many proof jobs in progress, retry later'}), 503
         
         return jsonify({
-            'success': True,
-            'proof': proof_data
-        }), 200
+            'job_id': job_id,
+            'status': 'pending'
+        }), 202
         
+    except RequestError as e:
+        return jsonify({'error': str(e)}), 400
     except ValueError as e:
         return jsonify({
             'error': f'Invalid input: {str(e)}'
         }), 400
     except Exception as e:
-        current_app.logger.error(f'Error generating proof: {str(e)}')
+        current_app.logger.error(f'Error submitting proof job: {str(e)}')
         return jsonify({
             'error': 'Internal server error',
             'message': str(e)
         }), 500
 
 
+@api_bp.route('/jobs/<job_id>', methods=['GET'])
+def get_proof_job_status(job_id):
+    """
+    Get the status of a proof job
+    """
+    job = current_app.extensions['proof_jobs'].get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    
+    return jsonify({
+        'job_id': job_id,
+        'status': job['status'],
+        'submitted_at': job['submitted_at'],
+        'finished_at': job['finished_at'],
+        'error': job['error']
+    }), 200
+
+
+@api_bp.route('/jobs/<job_id>/result', methods=['GET'])
+def get_proof_job_result(job_id):
+    """
+    Get the proof computed by a job, in the binary encoding if the client accepts it
+    """
+    job = current_app.extensions['proof_jobs'].get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    
+    if job['status'] in ('pending', 'running'):
+        return jsonify({
+            'job_id': job_id,
+            'status': job['status']
+        }), 202
+    if job['status'] == 'timeout':
+        return jsonify({
+            'job_id': job_id,
+            'status': job['status'],
+            'error': job['error']
+        }), 504
+    if job['status'] == 'failed':
+        return jsonify({
+            'job_id': job_id,
+            'status': job['status'],
+            'error': 'Internal server error',
+            'message': job['error']
+        }), 500
+    
+    return proof_response(job['result'])
+
+
+@api_bp.route('/cache/stats', methods=['GET'])
+def get_cache_stats():
+    """
+    Report the hit/miss counters and memory usage of the proof caches
+    """
+    return jsonify({
+        'trace_cache': trace_cache.stats(),
+        'proof_cache': proof_cache.stats()
+    }), 200
+
+
 @api_bp.errorhandler(404)
 def not_found(error):
     """Handle 404 errors"""
@@ -80,6 +305,31 @@ def method_not_allowed(error):
     return jsonify({'error': 'Method not allowed'}), 405
 
 
+def verification_result(proof_data, is_valid, errors):
+    """
+    Build the response body describing the verification of one proof
+    """
+    details = {
+        'total_queries': proof_data['fri_decommitments']['query_num'],
+        'total_layers': len(proof_data['fri_commitment']['folding_poly_coeffs']),
+        'domain_size': proof_data['dom_size']
+    }
+    if is_valid:
+        return {
+            'valid': True,
+            'message': 'Proof verified: accept claims',
+            'errors': [],
+            'verification_details': details
+        }
+    return {
+        'valid': False,
+        'message': 'Proof not valid: reject claims',
+        'errors': errors,
+        'error_count': len(errors),
+        'verification_details': details
+    }
+
+
 @api_bp.route('/verify-proof', methods=['POST'])
 def run_proof_verification():
     """
@@ -87,7 +337,65 @@ def run_proof_verification():
     
     Expected JSON payload:
     {
-        "proof": <proof_data_object>
+        "proof": <proof_data_object>,
+        "timings": true | false  (optional)
+    }
+    
+    or a binary encoded proof with "Content-Type: application/octet-stream" (then the timings are
+    asked for with ?timings=1)
+    """
+    try:
+        # Validate request
+        if request.mimetype == PROOF_MEDIA_TYPE:
+            try:
+                proof_data = decode_proof(request.get_data())
+            except ProofDecodingError as e:
+                return jsonify({'error': f'Invalid binary proof: {str(e)}'}), 400
+        else:
+            if not request.is_json:
+                return jsonify({'error': f'Content-Type must be application/json or {PROOF_MEDIA_TYPE}'}), 400
+            
+            data = request.get_json()
+            
+            # Validate required fields
+            if 'proof' not in data:
+                return jsonify({
+                    'error': 'Missing required field: proof'
+                }), 400
+            
+            proof_data = data['proof']
+        
+        # Verify proof
+        from app.core.proof_verifier import verify_proof
+        with collect_timings() as timings:
+            is_valid, errors = verify_proof(proof_data)
+        
+        result = verification_result(proof_data, is_valid, errors)
+        if request.args.get('timings') or (request.is_json and data.get('timings')):
+            result['timings'] = timings
+        return jsonify(result), 200
+        
+    except KeyError as e:
+        return jsonify({
+            'error': f'Invalid proof format: missing field {str(e)}'
+        }), 400
+    except Exception as e:
+        current_app.logger.error(f'Error verifying proof: {str(e)}')
+        return jsonify({
+            'valid': False,
+            'error': 'Internal server error',
+            'message': str(e)
+        }), 500
+
+
+@api_bp.route('/verify-proofs', methods=['POST'])
+def run_batch_proof_verification():
+    """
+    Verify a batch of STARK proofs, sharing the verifier setup across them
+    
+    Expected JSON payload:
+    {
+        "proofs": [<proof_data_object>, ...]
     }
     """
     try:
@@ -98,49 +406,42 @@ def run_proof_verification():
         data = request.get_json()
         
         # Validate required fields
-        if 'proof' not in data:
+        if 'proofs' not in data or not isinstance(data['proofs'], list):
             return jsonify({
-                'error': 'Missing required field: proof'
+                'error': 'Missing required field: proofs (list)'
             }), 400
         
-        proof_data = data['proof']
-        
-        # Verify proof
-        from app.core.proof_verifier import verify_proof
-        is_valid, errors = verify_proof(proof_data)
-        
-        if is_valid:
-            return jsonify({
-                'valid': True,
-                'message': 'Proof verified: accept claims',
-                'errors': [],
-                'verification_details': {
-                    'total_queries': proof_data['fri_decommitments']['query_num'],
-                    'total_layers': len(proof_data['fri_commitment']['folding_poly_coeffs']),
-                    'domain_size': proof_data['dom_size']
-                }
-            }), 200
-        else:
+        proofs = data['proofs']
+        max_proofs = current_app.config.get('MAX_BATCH_PROOFS', 1000)
+        if len(proofs) > max_proofs:
             return jsonify({
-                'valid': False,
-                'message': 'Proof not valid: reject claims',
-                'errors': errors,
-                'error_count': len(errors),
-                'verification_details': {
-                    'total_queries': proof_data['fri_decommitments']['query_num'],
-                    'total_layers': len(proof_data['fri_commitment']['folding_poly_coeffs']),
-                    'domain_size': proof_data['dom_size']
-                }
-            }), 200
+                'error': f'Number of proofs exceeds maximum allowed: {max_proofs}'
+            }), 400
+        
+        # Verify proofs
+        from app.core.proof_verifier import verify_proofs
+        results = []
+        for proof_data, (is_valid, errors) in zip(proofs, verify_proofs(proofs)):
+            try:
+                results.append(verification_result(proof_data, is_valid, errors))
+            except (KeyError, TypeError) as e:
+                # Malformed proofs are rejected without failing the whole batch
+                results.append({
+                    'valid': False,
+                    'message': 'Proof not valid: reject claims',
+                    'errors': errors or [f'Invalid proof format: missing field {str(e)}'],
+                    'error_count': len(errors) or 1
+                })
         
-    except KeyError as e:
         return jsonify({
-            'error': f'Invalid proof format: missing field {str(e)}'
-        }), 400
+            'results': results,
+            'total_proofs': len(results),
+            'valid_count': sum(1 for result in results if result['valid'])
+        }), 200
+        
     except Exception as e:
-        current_app.logger.error(f'Error verifying proof: {str(e)}')
+        current_app.logger.error(f'Error verifying proofs: {str(e)}')
         return jsonify({
-            'valid': False,
             'error': 'Internal server error',
             'message': str(e)
         }), 500
\ No newline at end of file
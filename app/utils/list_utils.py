@@ -15,16 +15,8 @@
 ###############################################################################
 
 
-from itertools import dropwhile, starmap, zip_longest
+from itertools import dropwhile
 
 
 def remove_trailing_elements(list_of_elements, element_to_remove):
     return list(dropwhile(lambda x: x == element_to_remove, list_of_elements[::-1]))[::-1]
-
-
-def two_lists_tuple_operation(f, g, operation, fill_value):
-    return list(starmap(operation, zip_longest(f, g, fillvalue=fill_value)))
-
-
-def scalar_operation(list_of_elements, operation, scalar):
-    return [operation(c, scalar) for c in list_of_elements]
\ No newline at end of file
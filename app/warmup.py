@@ -0,0 +1,87 @@
+"""
+Warm-up of the tables every proof of the configured shape needs
+"""
+import logging
+import threading
+
+from app.core.domain import get_domain, get_inverse_domain, get_twiddles
+from app.core.field import FieldElement
+from app.core.merkle import keccak256
+from app.core.polynomial import NUMPY_NTT_MIN_SIZE, bit_reverse_permutation
+from app.core.proof_generator import check_proof_parameters
+from app.metrics import span
+
+logger = logging.getLogger(__name__)
+
+
+@span('warmup')
+def warm_up(trace_length, blowup):
+    """
+    Builds the domain, twiddle and permutation tables used to generate proofs with the given trace
+    length and blowup factor, so that the first request does not pay for them.
+    """
+    check_proof_parameters(trace_length, blowup)
+    eval_dom_size = trace_length * blowup
+    w = FieldElement.generator()
+
+    # Interpolation of the trace over the subgroup of order trace_length (an inverse NTT).
+    if trace_length >= NUMPY_NTT_MIN_SIZE:
+        get_inverse_domain(trace_length)
+        bit_reverse_permutation(trace_length)
+    else:
+        get_twiddles(trace_length, inverse=True)
+    # Low degree extension (an NTT of size eval_dom_size) and the evaluation domain w * H.
+    get_domain(eval_dom_size)
+    bit_reverse_permutation(eval_dom_size)
+    get_domain(eval_dom_size, w)
+    # Inverses of the domains of the FRI layers, folded until they are constant.
+    size, offset = eval_dom_size, w
+    while size > blowup:
+        get_inverse_domain(size, offset)
+        size, offset = size // 2, offset ** 2
+    # The keccak backend is loaded on first use.
+    keccak256(b'')
+
+
+class Warmup:
+    """
+    Runs warm_up once, either in the calling thread or in a background thread, and tells whether it
+    is done.
+    """
+
+    def __init__(self, trace_length, blowup):
+        self.trace_length = trace_length
+        self.blowup = blowup
+        self.error = None
+        self.done = threading.Event()
+
+    @property
+    def ready(self):
+        return self.done.is_set() and self.error is None
+
+    def run(self):
+        try:
+            warm_up(self.trace_length, self.blowup)
+        except Exception as e:
+            self.error = str(e)
+            raise
+        finally:
+            self.done.set()
+
+    def _run_logged(self):
+        try:
+            self.run()
+        except Exception:
+            logger.exception('Warm-up failed')
+
+    def start(self, mode='sync'):
+        """
+        mode is 'sync' (warm up before returning), 'background' (in a daemon thread) or 'off'.
+        """
+        assert mode in ('sync', 'background', 'off'), f'Unknown warm-up mode: {mode}.'
+        if mode == 'off':
+            self.done.set()
+        elif mode == 'sync':
+            self.run()
+        else:
+            threading.Thread(target=self._run_logged, name='warmup', daemon=True).start()
@@ -0,0 +1,12 @@
+"""
+Microbenchmarks of the field, polynomial, Merkle, FRI and proof modules.
+
+Run them from the repository root with
+
+    python -m benchmarks [--sizes 256 1024 8192] [--filter polynomial] [--no-memory]
+                         [--output results.json] [--compare baseline.json] [--threshold 0.2]
+
+Each benchmark runs at every size it supports and reports the time per call, the operations per
+second and the peak memory traced during one call. With --compare, results slower than the
+baseline by more than the threshold are flagged as regressions and the exit status is 1.
+"""
@@ -0,0 +1,49 @@
+"""
+Command line entry point: python -m benchmarks --help
+"""
+import argparse
+import sys
+
+from benchmarks import cases  # noqa: F401 (registers the benchmarks)
+from benchmarks.harness import run_benchmarks, save_results, load_results, compare_results
+
+DEFAULT_SIZES = [256, 1024, 8192]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description='Run the microbenchmarks.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES,
+                        help=f'input sizes (default: {" ".join(map(str, DEFAULT_SIZES))})')
+    parser.add_argument('--filter', nargs='+', metavar='NAME',
+                        help='only run the benchmarks whose name contains one of these')
+    parser.add_argument('--min-time', type=float, default=0.2,
+                        help='minimum duration of a timing round, in seconds (default: 0.2)')
+    parser.add_argument('--rounds', type=int, default=3,
+                        help='timing rounds, the best one is kept (default: 3)')
+    parser.add_argument('--no-memory', action='store_true',
+                        help='do not measure the peak memory (a traced call is much slower)')
+    parser.add_argument('--output', help='save the results to this JSON file')
+    parser.add_argument('--compare', metavar='BASELINE',
+                        help='compare the results with a JSON file saved by --output')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='slowdown flagged as a regression by --compare (default: 0.2 = 20%%)')
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args.sizes, args.filter, args.min_time, args.rounds, not args.no_memory)
+    if args.output:
+        save_results(args.output, results)
+    if not args.compare:
+        return 0
+
+    regressions = 0
+    print(f'\nCompared with {args.compare} (threshold {args.threshold:.0%}):')
+    for name, size, old, new, ratio, regressed in compare_results(results, load_results(args.compare), args.threshold):
+        regressions += regressed
+        flag = 'REGRESSION' if regressed else ''
+        print(f'{name:<36} {size:>6}  {old * 1e3:>12.4f} ms -> {new * 1e3:>12.4f} ms  x{ratio:>6.2f}  {flag}')
+    print(f'{regressions} regression(s)')
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,181 @@
+"""
+The benchmarks. Inputs are drawn from a seeded generator, so that every run times the same work.
+"""
+import json
+import random
+
+from app.core.domain import get_domain
+from app.core.field import FieldElement, FieldArray, batch_inverse
+from app.core.fri import commit_fri, commit_fri_evaluations
+from app.core.merkle import MerkleTree
+from app.core.polynomial import Polynomial, X, coset_lde, interpolate_poly
+from app.core.proof_generator import generate_proof, trace_cache
+from app.core.proof_verifier import verify_proof
+
+from benchmarks.harness import benchmark
+
+# The proofs are generated with the default blowup, the size being the trace length.
+PROOF_BLOWUP = 8
+PROOF_QUERIES = 10
+
+
+def random_elements(n, seed=0):
+    rng = random.Random(seed)
+    return [FieldElement(rng.randrange(FieldElement.k_modulus)) for _ in range(n)]
+
+
+def random_polynomial(n, seed=0):
+    return Polynomial(random_elements(n, seed))
+
+
+def verifier_data(dom_size, seed=0):
+    rng = random.Random(seed)
+    return json.dumps({
+        "poly_coeffs": [rng.randrange(1, FieldElement.k_modulus) for _ in range(3)],
+        "folding_coeffs": [rng.randrange(1, FieldElement.k_modulus) for _ in range(20)],
+        "challenges": [rng.randrange(0, dom_size - 16) for _ in range(PROOF_QUERIES)]
+    })
+
+
+@benchmark('field.add', ops=lambda n: n)
+def field_add(n):
+    a, b = random_elements(n, 1), random_elements(n, 2)
+    return lambda: [x + y for x, y in zip(a, b)]
+
+
+@benchmark('field.mul', ops=lambda n: n)
+def field_mul(n):
+    a, b = random_elements(n, 1), random_elements(n, 2)
+    return lambda: [x * y for x, y in zip(a, b)]
+
+
+@benchmark('field.inverse', ops=lambda n: n)
+def field_inverse(n):
+    a = random_elements(n)
+    return lambda: [x.inverse() for x in a]
+
+
+@benchmark('field.batch_inverse', ops=lambda n: n)
+def field_batch_inverse(n):
+    a = random_elements(n)
+    return lambda: batch_inverse(a)
+
+
+@benchmark('field_array.mul', ops=lambda n: n)
+def field_array_mul(n):
+    a, b = FieldArray(random_elements(n, 1)), FieldArray(random_elements(n, 2))
+    return lambda: a * b
+
+
+@benchmark('polynomial.mul')
+def polynomial_mul(n):
+    f, g = random_polynomial(n, 1), random_polynomial(n, 2)
+    return lambda: f * g
+
+
+@benchmark('polynomial.qdiv')
+def polynomial_qdiv(n):
+    # A dividend of degree 2n - 2 by a divisor of degree n - 1, as in the composition polynomial.
+    f = random_polynomial(n, 1) * random_polynomial(n, 2)
+    g = random_polynomial(n, 3)
+    return lambda: f.qdiv(g)
+
+
+@benchmark('polynomial.qdiv_linear')
+def polynomial_qdiv_linear(n):
+    f = random_polynomial(n)
+    g = X - random_elements(1, 1)[0]
+    return lambda: f.qdiv(g)
+
+
+@benchmark('polynomial.qdiv_vanishing')
+def polynomial_qdiv_vanishing(n):
+    f = random_polynomial(2 * n)
+    g = X**n - 1
+    return lambda: f.qdiv(g)
+
+
+@benchmark('polynomial.interpolate_subgroup')
+def polynomial_interpolate_subgroup(n):
+    x = get_domain(n).to_field_elements()
+    y = random_elements(n)
+    return lambda: interpolate_poly(x, y)
+
+
+@benchmark('polynomial.eval', ops=lambda n: n)
+def polynomial_eval(n):
+    # n evaluations of a polynomial of degree n - 1.
+    f = random_polynomial(n, 1)
+    points = random_elements(n, 2)
+    return lambda: [f(x) for x in points]
+
+
+@benchmark('polynomial.coset_lde')
+def polynomial_coset_lde(n):
+    # Blowup 8, as in generate_proof.
+    f = random_polynomial(n)
+    return lambda: coset_lde(f, FieldElement.generator(), 8 * n)
+
+
+@benchmark('merkle.build', ops=lambda n: n)
+def merkle_build(n):
+    data = FieldArray(random_elements(n))
+    return lambda: MerkleTree(data)
+
+
+@benchmark('merkle.authentication_path', ops=lambda n: n)
+def merkle_authentication_path(n):
+    tree = MerkleTree(FieldArray(random_elements(n)))
+    return lambda: [tree.get_authentication_path(i) for i in range(n)]
+
+
+def fri_inputs(n):
+    # The evaluations over w * H of a polynomial of degree n / 8, as cp_eval in generate_proof.
+    w = FieldElement.generator()
+    cp = random_polynomial(n // 8)
+    cp_eval = coset_lde(cp, w, n)
+    coeffs = [x.val for x in random_elements(20, 1)]
+    return cp, get_domain(n, w), cp_eval, MerkleTree(cp_eval), coeffs
+
+
+@benchmark('fri.commit_fri', max_size=2048)
+def fri_commit_fri(n):
+    cp, domain, cp_eval, cp_merkle, coeffs = fri_inputs(n)
+    domain = domain.to_field_elements()
+    cp_eval = cp_eval.to_field_elements()
+    return lambda: commit_fri(cp, domain, cp_eval, cp_merkle, coeffs)
+
+
+@benchmark('fri.commit_fri_evaluations')
+def fri_commit_fri_evaluations(n):
+    _, domain, cp_eval, cp_merkle, coeffs = fri_inputs(n)
+    return lambda: commit_fri_evaluations(domain, cp_eval, cp_merkle, coeffs)
+
+
+def proof_generator(n):
+    ver = verifier_data(PROOF_BLOWUP * n)
+    return lambda: generate_proof('benchmark', PROOF_QUERIES, ver, trace_length=n, blowup=PROOF_BLOWUP)
+
+
+@benchmark('proof.generate')
+def proof_generate(n):
+    generate = proof_generator(n)
+
+    def run():
+        # Time the whole proof, not a trace_cache hit.
+        trace_cache.clear()
+        return generate()
+    return run
+
+
+@benchmark('proof.generate_cached_trace')
+def proof_generate_cached_trace(n):
+    generate = proof_generator(n)
+    generate()
+    return generate
+
+
+@benchmark('proof.verify')
+def proof_verify(n):
+    proof = proof_generator(n)()
+    return lambda: verify_proof(proof)
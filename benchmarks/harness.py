@@ -0,0 +1,142 @@
+"""
+Registry, timing and comparison of the benchmarks.
+"""
+import gc
+import json
+import platform
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+BENCHMARKS = []
+
+
+def benchmark(name, sizes=None, max_size=None, ops=None):
+    """
+    Registers a benchmark. The decorated function takes a size and returns a callable with no
+    arguments, the operation being timed; setup done before returning it is not timed.
+    * sizes: the sizes the benchmark runs at, instead of the ones asked for on the command line.
+    * max_size: sizes above it are skipped (for the quadratic algorithms).
+    * ops: the number of operations one call performs, as a function of the size (default 1).
+    """
+    def register(setup):
+        BENCHMARKS.append({
+            'name': name,
+            'setup': setup,
+            'sizes': sizes,
+            'max_size': max_size,
+            'ops': ops or (lambda size: 1)
+        })
+        return setup
+    return register
+
+
+def time_calls(fn, min_time, rounds):
+    """
+    Returns (best time per call, calls per round), running rounds rounds of as many calls as needed
+    to last at least min_time.
+    """
+    calls = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(calls):
+            fn()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            break
+        calls *= 2 if elapsed == 0 else max(2, min(10, int(min_time / elapsed) + 1))
+    best = elapsed / calls
+    for _ in range(rounds - 1):
+        start = time.perf_counter()
+        for _ in range(calls):
+            fn()
+        best = min(best, (time.perf_counter() - start) / calls)
+    return best, calls
+
+
+def peak_memory(fn):
+    """
+    Returns the peak memory in bytes allocated (as traced by tracemalloc) during one call of fn.
+    """
+    gc.collect()
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def run_benchmarks(sizes, name_filter=None, min_time=0.2, rounds=3, memory=True, log=print):
+    results = []
+    for bench in BENCHMARKS:
+        if name_filter and not any(f in bench['name'] for f in name_filter):
+            continue
+        for size in bench['sizes'] or sizes:
+            if bench['max_size'] is not None and size > bench['max_size']:
+                log(f"{bench['name']:<36} {size:>6}  skipped (max size {bench['max_size']})")
+                continue
+            fn = bench['setup'](size)
+            time_per_call, calls = time_calls(fn, min_time, rounds)
+            result = {
+                'name': bench['name'],
+                'size': size,
+                'calls': calls,
+                'rounds': rounds,
+                'time_per_call': time_per_call,
+                'ops_per_sec': bench['ops'](size) / time_per_call,
+                # Tracing allocations slows the quadratic algorithms down by an order of magnitude.
+                'peak_memory': peak_memory(fn) if memory else None
+            }
+            results.append(result)
+            log(format_result(result))
+    return results
+
+
+def format_result(result):
+    line = (f"{result['name']:<36} {result['size']:>6}  {result['time_per_call'] * 1e3:>12.4f} ms"
+            f"  {result['ops_per_sec']:>14.1f} ops/s")
+    if result['peak_memory'] is not None:
+        line += f"  {result['peak_memory'] / 2**20:>9.2f} MiB"
+    return line
+
+
+def environment():
+    return {
+        'python': sys.version.split()[0],
+        'implementation': platform.python_implementation(),
+        'numpy': np.__version__,
+        'machine': platform.machine(),
+        'system': platform.system(),
+        'timestamp': time.time()
+    }
+
+
+def save_results(path, results):
+    with open(path, 'w') as f:
+        json.dump({'environment': environment(), 'results': results}, f, indent=2)
+
+
+def load_results(path):
+    with open(path) as f:
+        return json.load(f)['results']
+
+
+def compare_results(results, baseline, threshold):
+    """
+    Matches results with the baseline by (name, size). Returns a list of
+    (name, size, baseline time, time, ratio, regressed), regressed being whether the time per call
+    grew by more than threshold (0.2 = 20%).
+    """
+    previous = {(r['name'], r['size']): r for r in baseline}
+    comparison = []
+    for result in results:
+        old = previous.get((result['name'], result['size']))
+        if old is None:
+            continue
+        ratio = result['time_per_call'] / old['time_per_call']
+        comparison.append((result['name'], result['size'], old['time_per_call'],
+                           result['time_per_call'], ratio, ratio > 1 + threshold))
+    return comparison
@@ -0,0 +1,29 @@
+"""
+Production server configuration: gunicorn -c gunicorn.conf.py run:app
+"""
+import gc
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 8080)}"
+# A single worker by default: the proof jobs, the trace cache, the memory tier of the proof cache and
+# /metrics all live in the worker process, so with several workers a job could only be polled on the
+# worker that queued it. More workers need the jobs API kept behind sticky routing.
+workers = int(os.environ.get('WEB_CONCURRENCY', 1))
+threads = int(os.environ.get('GUNICORN_THREADS', 8))
+timeout = int(os.environ.get('REQUEST_TIMEOUT', 360))
+
+# The app is created, and warmed up, in the master before the workers are forked, so the domain and
+# twiddle tables are built once and their pages shared copy-on-write.
+preload_app = True
+
+# A warm-up thread started in the master does not survive the fork: a worker forked before it ends
+# would never see it done (and answer 503 on /health for good), and could inherit the locks it holds.
+# With the app preloaded the warm-up is therefore always run before forking.
+if os.environ.get('WARMUP') == 'background':
+    os.environ['WARMUP'] = 'sync'
+
+
+def pre_fork(server, worker):
+    # Keep the collector from touching the headers of the preloaded objects, which would copy their
+    # pages into every worker.
+    gc.freeze()
@@ -0,0 +1,51 @@
+import pytest
+
+from app.core.domain import DomainRegistry, get_domain_element, primitive_root_of_unity, registry
+from app.core.field import FieldElement
+
+
+@pytest.mark.parametrize('size, offset', [(1, 1), (8, 1), (64, 1), (256, FieldElement.generator()), (32, 7)])
+def test_domains(size, offset):
+    h = primitive_root_of_unity(size)
+    domain = registry.get_domain(size, offset)
+    assert domain.to_field_elements() == [FieldElement.typecast(offset) * h ** i for i in range(size)]
+    inverse = registry.get_inverse_domain(size, offset)
+    assert inverse.to_field_elements() == [x.inverse() for x in domain]
+    assert (domain * inverse).tolist() == [1] * size
+    assert [get_domain_element(size, i, offset) for i in range(-size, size)] == \
+        domain.to_field_elements() * 2
+
+
+@pytest.mark.parametrize('size', [2, 16, 128])
+def test_twiddles(size):
+    assert registry.get_twiddles(size) == registry.get_domain(size).tolist()
+    assert registry.get_twiddles(size, inverse=True) == registry.get_inverse_domain(size).tolist()
+
+
+def test_tables_are_shared_and_read_only():
+    tables = DomainRegistry()
+    domain = tables.get_domain(16)
+    assert tables.get_domain(16) is domain
+    with pytest.raises(ValueError):
+        domain.vals[0] = 0
+
+
+def test_eviction():
+    tables = DomainRegistry()
+    assert tables.max_entries == registry.max_entries == 64
+    tables.max_entries = 4
+    first = tables.get_domain(2)
+    for size in (4, 8, 16):
+        tables.get_domain(size)
+    # Using the domain of size 2 makes the one of size 4 the least recently used.
+    assert tables.get_domain(2) is first
+    tables.get_domain(32)
+    assert len(tables.tables) == 4
+    assert ('domain', 4, 1) not in tables.tables
+    assert tables.get_domain(2) is first
+    assert tables.get_domain(4).to_field_elements() == [primitive_root_of_unity(4) ** i for i in range(4)]
+
+
+def test_no_subgroup():
+    with pytest.raises(AssertionError):
+        primitive_root_of_unity(3 * 2**31)
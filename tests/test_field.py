@@ -0,0 +1,84 @@
+import random
+
+import numpy as np
+import pytest
+
+from app.core.field import FieldArray, FieldElement, batch_inverse
+
+MOD = FieldElement.k_modulus
+
+# Values near the modulus, whose uint64 products would overflow without the reductions.
+EDGE_VALUES = [0, 1, 2, MOD // 2, MOD // 2 + 1, MOD - 2, MOD - 1, 2**32 - 1 - MOD, 2**30]
+
+
+def random_values(n, seed):
+    rng = random.Random(seed)
+    return [rng.randrange(MOD) for _ in range(n)]
+
+
+def pairs():
+    # Every pair of edge values, then random values.
+    xs = [x for x in EDGE_VALUES for _ in EDGE_VALUES] + random_values(200, 1)
+    ys = [y for _ in EDGE_VALUES for y in EDGE_VALUES] + random_values(200, 2)
+    return xs, ys
+
+
+@pytest.mark.parametrize('op', [
+    lambda a, b: a + b, lambda a, b: a - b, lambda a, b: a * b, lambda a, b: a / b if b != 0 else a
+])
+def test_arithmetic_matches_field_element(op):
+    xs, ys = pairs()
+    nonzero = [y or 1 for y in ys]
+    expected = [op(FieldElement(x), FieldElement(y)) for x, y in zip(xs, nonzero)]
+    assert op(FieldArray(xs), FieldArray(nonzero)).to_field_elements() == expected
+
+
+def test_scalar_operands():
+    xs = EDGE_VALUES + random_values(50, 3)
+    for scalar in (MOD - 1, FieldElement(MOD // 2 + 1), 7):
+        s = FieldElement.typecast(scalar)
+        assert (FieldArray(xs) * scalar).to_field_elements() == [FieldElement(x) * s for x in xs]
+        assert (scalar - FieldArray(xs)).to_field_elements() == [s - FieldElement(x) for x in xs]
+        assert (FieldArray(xs) + scalar).to_field_elements() == [FieldElement(x) + s for x in xs]
+    assert (-FieldArray(xs)).to_field_elements() == [-FieldElement(x) for x in xs]
+
+
+def test_reduction_of_inputs():
+    assert FieldArray([-1, MOD, 2**64 + 3]).tolist() == [MOD - 1, 0, (2**64 + 3) % MOD]
+    assert FieldArray(np.array([-1, MOD + 2], dtype=np.int64)).tolist() == [MOD - 1, 2]
+
+
+@pytest.mark.parametrize('base, n', [(FieldElement.generator(), 100), (MOD - 1, 7), (0, 3), (5, 1), (5, 0)])
+def test_powers(base, n):
+    expected = [FieldElement.typecast(base) ** i for i in range(n)]
+    assert FieldArray.powers(base, n).to_field_elements() == expected
+
+
+def test_pow():
+    xs = EDGE_VALUES + random_values(50, 4)
+    for n in (0, 1, 2, 3, MOD - 2, MOD - 1):
+        assert (FieldArray(xs) ** n).to_field_elements() == [FieldElement(x) ** n for x in xs]
+
+
+def test_inverse():
+    xs = [x for x in EDGE_VALUES if x != 0] + random_values(100, 5)
+    inverse = FieldArray(xs).inverse()
+    assert inverse.to_field_elements() == [FieldElement(x).inverse() for x in xs]
+    assert inverse.to_field_elements() == batch_inverse([FieldElement(x) for x in xs])
+    assert (FieldArray(xs) * inverse).tolist() == [1] * len(xs)
+
+
+def test_inverse_of_zero():
+    # As for FieldElement.
+    with pytest.raises(AssertionError):
+        FieldElement(0).inverse()
+    with pytest.raises(AssertionError):
+        FieldArray([1, 0, 2]).inverse()
+    with pytest.raises(AssertionError):
+        FieldArray([3, 5]) / FieldArray([1, 0])
+
+
+def test_signed_matches_repr():
+    xs = EDGE_VALUES + random_values(50, 6)
+    assert FieldArray(xs).signed().tolist() == [int(repr(FieldElement(x))) for x in xs]
+    assert repr(FieldArray(xs)) == f'FieldArray({[FieldElement(x) for x in xs]})'
@@ -0,0 +1,84 @@
+import json
+import os
+import signal
+import time
+
+import pytest
+
+from app.core.proof_verifier import verify_proof
+from app.jobs import JobManager, JobTimeoutError, run_with_timeout
+
+VERIFIER_DATA = json.dumps({
+    "poly_coeffs": [3, 5, 7],
+    "folding_coeffs": list(range(11, 31)),
+    "challenges": [0, 5, 17, 40]
+})
+
+
+def wait(manager, job_id, limit=60):
+    deadline = time.time() + limit
+    while time.time() < deadline:
+        job = manager.get(job_id)
+        if job['finished_at'] is not None:
+            return job
+        time.sleep(0.05)
+    raise AssertionError(f'Job {job_id} did not finish in {limit} seconds')
+
+
+def test_run_with_timeout():
+    assert run_with_timeout(5, sum, [1, 2, 3]) == 6
+    start = time.time()
+    with pytest.raises(JobTimeoutError):
+        run_with_timeout(1, time.sleep, 10)
+    assert time.time() - start < 5
+
+
+@pytest.fixture
+def manager():
+    manager = JobManager(max_workers=1, max_jobs=2, timeout=1)
+    yield manager
+    manager.shutdown()
+
+
+def test_job_done(manager):
+    job_id = manager.submit('job', 4, VERIFIER_DATA, trace_length=64, blowup=4)
+    job = wait(manager, job_id)
+    assert job['status'] == 'done'
+    assert verify_proof(job['result']) == (True, [])
+
+
+def test_job_timeout(manager):
+    # A proof far longer than the one second limit.
+    job_id = manager.submit('job', 4, VERIFIER_DATA, trace_length=2**16, blowup=8)
+    job = wait(manager, job_id)
+    assert job['status'] == 'timeout'
+    assert job['result'] is None and '1 seconds' in job['error']
+
+
+def test_job_failed_and_unknown(manager):
+    job = wait(manager, manager.submit('job', 4, '{}', trace_length=64, blowup=4))
+    assert job['status'] == 'failed'
+    assert manager.get('unknown') is None
+
+
+def test_finished_at_is_the_end_of_the_job(manager):
+    job_id = manager.submit('job', 4, VERIFIER_DATA, trace_length=64, blowup=4)
+    future = manager.jobs[job_id]['future']
+    future.result(timeout=60)
+    time.sleep(0.5)
+    job = manager.get(job_id)
+    assert job['status'] == 'done'
+    assert time.time() - job['finished_at'] >= 0.5
+
+
+def test_worker_killed(manager):
+    job_id = manager.submit('job', 4, VERIFIER_DATA, trace_length=2**16, blowup=8)
+    while manager.get(job_id)['status'] != 'running':
+        time.sleep(0.05)
+    for pid in manager.executor._processes:
+        os.kill(pid, signal.SIGKILL)
+    job = wait(manager, job_id)
+    assert job['status'] == 'failed' and 'exited unexpectedly' in job['error']
+    # The broken pool is replaced by a new one.
+    job = wait(manager, manager.submit('job', 4, VERIFIER_DATA, trace_length=64, blowup=4))
+    assert job['status'] == 'done'
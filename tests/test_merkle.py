@@ -0,0 +1,97 @@
+import random
+import threading
+
+import pytest
+
+from app.core.field import FieldArray, FieldElement
+from app.core.merkle import (
+    MerkleTree, configure_parallelism, get_executor, keccak256, verify_batch_decommitment, verify_decommitment
+)
+
+
+def random_data(n, seed=0):
+    rng = random.Random(seed)
+    return [FieldElement(rng.randrange(FieldElement.k_modulus)) for _ in range(n)]
+
+
+def reference_root(data):
+    # Hash the leaves one by one, then pair the hex digests level by level.
+    level = [keccak256(str(x).encode()) for x in data]
+    while len(level) > 1:
+        level = [keccak256((level[i] + level[i + 1]).encode()) for i in range(0, len(level), 2)]
+    return level[0]
+
+
+@pytest.mark.parametrize('n', [1, 2, 16, 100])
+def test_root_matches_reference(n):
+    data = random_data(n)
+    padded = data + [FieldElement(0)] * (len(MerkleTree(data).data) - n)
+    assert MerkleTree(data).root == reference_root(padded)
+    assert MerkleTree(FieldArray(data)).root == reference_root(padded)
+
+
+@pytest.fixture
+def restore_parallelism():
+    yield
+    configure_parallelism()
+
+
+@pytest.mark.parametrize('executor', ['thread', 'process'])
+def test_parallel_build(executor, restore_parallelism):
+    data = random_data(64)
+    configure_parallelism(workers=4, executor=executor, min_leaves=16)
+    assert MerkleTree(data).root == MerkleTree(data, workers=1).root == reference_root(data)
+
+
+def test_reconfigure_during_build(restore_parallelism):
+    # Trees being built keep the pool they started with, while the new ones get a new pool.
+    configure_parallelism(workers=2, executor='thread', min_leaves=16)
+    data = random_data(2**12)
+    expected = MerkleTree(data, workers=1).root
+    roots = []
+    builders = [threading.Thread(target=lambda: roots.append(MerkleTree(data).root)) for _ in range(4)]
+    for builder in builders:
+        builder.start()
+    pool = get_executor()
+    configure_parallelism(workers=2, executor='thread', min_leaves=16)
+    assert get_executor() is not pool
+    for builder in builders:
+        builder.join()
+    assert roots == [expected] * 4
+
+
+def test_authentication_paths():
+    data = random_data(64)
+    tree = MerkleTree(data)
+    for leaf_id in range(64):
+        path = tree.get_authentication_path(leaf_id)
+        assert verify_decommitment(leaf_id, data[leaf_id], path, tree.root)
+        assert not verify_decommitment(leaf_id, data[leaf_id] + 1, path, tree.root)
+
+
+@pytest.mark.parametrize('leaf_ids', [[0], [5, 5], [0, 1, 2, 3], [3, 60, 17, 18, 40], list(range(64))])
+def test_batch_decommitment(leaf_ids):
+    data = random_data(64, 1)
+    tree = MerkleTree(data)
+    leaf_data = [data[i] for i in leaf_ids]
+    batch = tree.get_batch_authentication_path(leaf_ids)
+    assert verify_batch_decommitment(leaf_ids, leaf_data, batch, tree.root, tree.height)
+
+    # The batch only holds nodes of the per-leaf paths, each once.
+    per_leaf = set()
+    for leaf_id in leaf_ids:
+        per_leaf.update(tree.get_authentication_path(leaf_id))
+    assert len(batch) == len(set(batch)) and set(batch) <= per_leaf
+
+
+def test_batch_decommitment_rejects_tampering():
+    data = random_data(64, 2)
+    tree = MerkleTree(data)
+    leaf_ids = [3, 17, 40]
+    leaf_data = [data[i] for i in leaf_ids]
+    batch = tree.get_batch_authentication_path(leaf_ids)
+    assert not verify_batch_decommitment(leaf_ids, [leaf_data[0] + 1] + leaf_data[1:], batch, tree.root, tree.height)
+    assert not verify_batch_decommitment([3, 17, 41], leaf_data, batch, tree.root, tree.height)
+    assert not verify_batch_decommitment(leaf_ids, leaf_data, batch[:-1], tree.root, tree.height)
+    assert not verify_batch_decommitment(leaf_ids, leaf_data, batch + batch[:1], tree.root, tree.height)
+    assert not verify_batch_decommitment([], [], [], tree.root, tree.height)
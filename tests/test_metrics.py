@@ -0,0 +1,33 @@
+import threading
+
+from app.metrics import MetricsRegistry
+
+
+def test_counters_of_exited_threads():
+    registry = MetricsRegistry()
+
+    def work():
+        for _ in range(10):
+            registry.increment('requests', route='prove')
+
+    threads = [threading.Thread(target=work) for _ in range(50)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    registry.increment('requests', route='prove')
+
+    # Only the counters of the live threads are kept apart, the others are folded into one total.
+    assert len(registry.thread_counters) == 1
+    assert registry.counters() == {('requests', (('route', 'prove'),)): 501}
+    assert 'requests{route="prove"} 501' in registry.render()
+
+
+def test_clear():
+    registry = MetricsRegistry()
+    thread = threading.Thread(target=registry.increment, args=('requests',))
+    thread.start()
+    thread.join()
+    registry.increment('requests')
+    registry.clear()
+    assert registry.counters() == {}
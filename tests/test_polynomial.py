@@ -0,0 +1,192 @@
+import random
+
+import pytest
+
+from app.core.domain import primitive_root_of_unity
+from app.core.field import FieldElement
+from app.core.polynomial import (
+    KARATSUBA_MIN_SIZE, NEWTON_DIV_MIN_SIZE, NTT_MUL_MIN_SIZE, NUMPY_NTT_MIN_SIZE, Polynomial, X,
+    calculate_lagrange_polynomials, coset_interpolate, coset_lde, div_coefficients, div_linear, div_long,
+    div_newton, interpolate_poly, interpolate_poly_lagrange, interpolate_poly_subgroup,
+    interpolate_poly_subgroup_minus_one, inverse_power_series, mul_coefficients, mul_karatsuba, mul_ntt,
+    mul_schoolbook
+)
+
+MOD = FieldElement.k_modulus
+
+
+def random_coefs(n, seed):
+    rng = random.Random(seed)
+    return [rng.randrange(MOD) for _ in range(n)]
+
+
+def reduced(coefs):
+    return [c % MOD for c in coefs]
+
+
+# Sizes around the thresholds of mul_coefficients, with balanced and unbalanced factors.
+MUL_SIZES = [
+    (1, 1), (1, 7), (5, 3), (KARATSUBA_MIN_SIZE - 1, KARATSUBA_MIN_SIZE),
+    (KARATSUBA_MIN_SIZE, KARATSUBA_MIN_SIZE), (KARATSUBA_MIN_SIZE + 3, 2 * KARATSUBA_MIN_SIZE + 1),
+    (NTT_MUL_MIN_SIZE - 1, 200), (NTT_MUL_MIN_SIZE, NTT_MUL_MIN_SIZE), (100, 257), (300, 1000)
+]
+
+
+@pytest.mark.parametrize('n1, n2', MUL_SIZES)
+def test_karatsuba_matches_schoolbook(n1, n2):
+    f, g = random_coefs(n1, 1), random_coefs(n2, 2)
+    assert reduced(mul_karatsuba(f, g)) == reduced(mul_schoolbook(f, g))
+
+
+@pytest.mark.parametrize('n1, n2', MUL_SIZES)
+def test_ntt_matches_schoolbook(n1, n2):
+    f, g = random_coefs(n1, 1), random_coefs(n2, 2)
+    assert mul_ntt(f, g) == reduced(mul_schoolbook(f, g))
+
+
+def test_ntt_square():
+    f = random_coefs(150, 3)
+    assert mul_ntt(f, f) == reduced(mul_schoolbook(f, f))
+
+
+@pytest.mark.parametrize('n1, n2', MUL_SIZES)
+def test_mul_coefficients_matches_schoolbook(n1, n2):
+    f, g = random_coefs(n1, 1), random_coefs(n2, 2)
+    assert mul_coefficients(f, g) == reduced(mul_schoolbook(f, g))
+
+
+def test_mul_empty():
+    assert mul_schoolbook([], [1, 2]) == []
+    assert mul_ntt([1, 2], []) == []
+
+
+def test_polynomial_mul_sparse_and_zero():
+    f = Polynomial([FieldElement(c) for c in random_coefs(200, 4)])
+    assert (f * 0).degree() == -1
+    assert f * (X ** 100) == Polynomial([FieldElement(0)] * 100 + f.poly)
+    assert (f * f)(FieldElement(7)) == f(FieldElement(7)) ** 2
+
+
+def add_coefficients(f, g):
+    n = max(len(f), len(g))
+    return [(a + b) % MOD for a, b in zip(f + [0] * (n - len(f)), g + [0] * (n - len(g)))]
+
+
+def strip(coefs):
+    coefs = list(coefs)
+    while coefs and not coefs[-1]:
+        coefs.pop()
+    return coefs
+
+
+def assert_division(f, g, quotient, rem):
+    assert len(rem) < len(g)
+    assert strip(add_coefficients(mul_schoolbook(quotient, g), rem)) == strip(reduced(f))
+
+
+@pytest.mark.parametrize('n', [1, 2, 17, 300])
+def test_inverse_power_series(n):
+    g = random_coefs(n + 5, 5)
+    g[0] = g[0] or 1
+    inverse = inverse_power_series(g, n)
+    assert len(inverse) == n
+    assert reduced(mul_schoolbook(g, inverse))[:n] == [1] + [0] * (n - 1)
+
+
+@pytest.mark.parametrize('n1, n2', [(10, 3), (300, 40), (600, 300), (2 * NEWTON_DIV_MIN_SIZE + 5, NEWTON_DIV_MIN_SIZE + 1)])
+def test_div_newton_matches_long_division(n1, n2):
+    f, g = random_coefs(n1, 6), random_coefs(n2, 7)
+    g[-1] = g[-1] or 1
+    quotient, rem = div_newton(f, g)
+    assert (quotient, strip(rem)) == (div_long(f, g)[0], strip(div_long(f, g)[1]))
+    assert_division(f, g, quotient, rem)
+
+
+def test_div_newton_vanishing_polynomial():
+    # A divisor with a zero free term, and x^n - 1 as in the composition polynomial.
+    f = random_coefs(1100, 8)
+    for g in ([0] * 3 + random_coefs(400, 9), [MOD - 1] + [0] * 511 + [1]):
+        quotient, rem = div_newton(f, g)
+        assert quotient == div_long(f, g)[0]
+        assert_division(f, g, quotient, rem)
+
+
+@pytest.mark.parametrize('n', [1, 2, 50])
+def test_div_linear_matches_long_division(n):
+    f, g = random_coefs(n, 10), random_coefs(2, 11)
+    g[1] = g[1] or 1
+    assert div_linear(f, g) == div_long(f, g)
+
+
+@pytest.mark.parametrize('n1, n2', [(5, 9), (40, 2), (300, 12), (700, 300), (1024, NEWTON_DIV_MIN_SIZE)])
+def test_div_coefficients(n1, n2):
+    f, g = random_coefs(n1, 12), random_coefs(n2, 13)
+    g[-1] = g[-1] or 1
+    quotient, rem = div_coefficients(f, g)
+    assert_division(f, g, quotient, rem)
+
+
+def test_polynomial_qdiv_exact():
+    f = Polynomial([FieldElement(c) for c in random_coefs(300, 14)])
+    g = Polynomial([FieldElement(c) for c in random_coefs(280, 15)])
+    quotient, rem = (f * g).qdiv(g)
+    assert quotient == f
+    assert rem.degree() == -1
+    assert (f * g) / g == f
+
+
+@pytest.mark.parametrize('n, size', [(1, 4), (8, 8), (30, 64), (100, 512), (70, 32)])
+def test_coset_lde_matches_evaluation(n, size):
+    # Including polynomials of degree beyond the size of the coset.
+    f = Polynomial([FieldElement(c) for c in random_coefs(n, 16)])
+    offset = FieldElement.generator()
+    h = primitive_root_of_unity(size)
+    expected = [f(offset * h ** i) for i in range(size)]
+    assert coset_lde(f, offset, size).to_field_elements() == expected
+
+
+@pytest.mark.parametrize('size', [4, 64, 256])
+def test_coset_interpolate_inverts_coset_lde(size):
+    f = Polynomial([FieldElement(c) for c in random_coefs(size - 1, 17)])
+    offset = FieldElement(3)
+    values = coset_lde(f, offset, size)
+    assert coset_interpolate(values, offset) == f
+    assert coset_interpolate(values.to_field_elements(), offset) == f
+
+
+def lagrange(x_values, y_values):
+    return interpolate_poly_lagrange(y_values, calculate_lagrange_polynomials(x_values))
+
+
+# Subgroup orders on both sides of the size from which the NTT runs on numpy arrays.
+SUBGROUP_SIZES = [2, 4, NUMPY_NTT_MIN_SIZE // 2, NUMPY_NTT_MIN_SIZE, 2 * NUMPY_NTT_MIN_SIZE]
+
+
+@pytest.mark.parametrize('n', SUBGROUP_SIZES)
+def test_interpolate_subgroup_matches_lagrange(n):
+    g = primitive_root_of_unity(n)
+    x_values = [g ** i for i in range(n)]
+    y_values = [FieldElement(c) for c in random_coefs(n, 18)]
+    expected = lagrange(x_values, y_values)
+    assert interpolate_poly_subgroup(y_values, g) == expected
+    assert interpolate_poly(x_values, y_values) == expected
+
+
+@pytest.mark.parametrize('n', SUBGROUP_SIZES)
+def test_interpolate_subgroup_minus_one_matches_lagrange(n):
+    # The subgroup of order n without its last point.
+    g = primitive_root_of_unity(n)
+    x_values = [g ** i for i in range(n - 1)]
+    y_values = [FieldElement(c) for c in random_coefs(n - 1, 19)]
+    expected = lagrange(x_values, y_values)
+    assert interpolate_poly_subgroup_minus_one(y_values, g) == expected
+    assert interpolate_poly(x_values, y_values) == expected
+    assert [expected(x) for x in x_values] == y_values
+
+
+def test_interpolate_other_points():
+    # Points that are not a subgroup go through Lagrange interpolation.
+    x_values = [FieldElement(x) for x in (1, 2, 3, 5, 8)]
+    y_values = [FieldElement(c) for c in random_coefs(5, 20)]
+    f = interpolate_poly(x_values, y_values)
+    assert [f(x) for x in x_values] == y_values
@@ -0,0 +1,90 @@
+import copy
+import json
+import random
+
+import pytest
+
+from app.core.field import FieldElement
+from app.core.proof_generator import generate_proof, generate_proof_stream, iter_proof_parts, trace_cache
+from app.core.proof_verifier import verify_proof, verify_proofs
+
+TRACE_LENGTH = 64
+BLOWUP = 4
+QUERIES = 8
+
+
+def verifier_data(seed=0):
+    rng = random.Random(seed)
+    dom_size = TRACE_LENGTH * BLOWUP
+    return json.dumps({
+        "poly_coeffs": [rng.randrange(1, FieldElement.k_modulus) for _ in range(3)],
+        "folding_coeffs": [rng.randrange(1, FieldElement.k_modulus) for _ in range(20)],
+        "challenges": [rng.randrange(0, dom_size - 2 * BLOWUP) for _ in range(QUERIES)]
+    })
+
+
+def make_proof(batched, **kwargs):
+    return generate_proof('test', QUERIES, verifier_data(), batched=batched,
+                          trace_length=TRACE_LENGTH, blowup=BLOWUP, timestamp=0.0, **kwargs)
+
+
+@pytest.mark.parametrize('batched', [False, True])
+def test_generate_verify(batched):
+    proof = make_proof(batched)
+    assert verify_proof(proof) == (True, [])
+    if batched:
+        assert proof["fri_decommitments"]["layout"] == "batched"
+
+
+@pytest.mark.parametrize('batched', [False, True])
+def test_coefficient_composition_gives_the_same_proof(batched):
+    assert make_proof(batched, eval_composition=False) == make_proof(batched)
+
+
+@pytest.mark.parametrize('batched', [False, True])
+def test_tampered_proof_fails(batched):
+    proof = make_proof(batched)
+    tampered = copy.deepcopy(proof)
+    query = tampered["fri_decommitments"]["queries"][1]
+    query["f_x"]["val"] = str(int(query["f_x"]["val"]) + 1)
+    other = copy.deepcopy(proof)
+    other["compos_factors"]["alpha_0"] += 1
+    results = verify_proofs([proof, tampered, other])
+    assert [is_valid for is_valid, _ in results] == [True, False, False]
+
+@pytest.mark.parametrize('batched', [False, True])
+def test_stream_matches_proof(batched):
+    proof = make_proof(batched)
+    parts = list(generate_proof_stream('test', QUERIES, verifier_data(), batched=batched,
+                                       trace_length=TRACE_LENGTH, blowup=BLOWUP, timestamp=0.0))
+    assert parts == list(iter_proof_parts(proof))
+
+
+@pytest.fixture
+def empty_trace_cache():
+    trace_cache.clear()
+    yield trace_cache
+    trace_cache.clear()
+
+
+def test_trace_cache(empty_trace_cache):
+    start = trace_cache.stats()
+    proof = make_proof(False)
+    assert trace_cache.stats()['misses'] == start['misses'] + 1
+    # The same input is served from the cache, whatever the verifier data.
+    assert make_proof(False) == proof
+    assert make_proof(True) == make_proof(True, eval_composition=False)
+    stats = trace_cache.stats()
+    assert stats['hits'] == start['hits'] + 3 and stats['misses'] == start['misses'] + 1
+    assert stats['entries'] == 1
+
+
+@pytest.mark.parametrize('kwargs', [{'trace_length': 2 * TRACE_LENGTH}, {'blowup': 2 * BLOWUP}, {'data': 'other'}])
+def test_trace_cache_miss(kwargs, empty_trace_cache):
+    make_proof(False)
+    misses = trace_cache.stats()['misses']
+    args = {'data': 'test', 'trace_length': TRACE_LENGTH, 'blowup': BLOWUP, **kwargs}
+    proof = generate_proof(args.pop('data'), QUERIES, verifier_data(), timestamp=0.0, **args)
+    assert verify_proof(proof) == (True, [])
+    assert trace_cache.stats()['misses'] == misses + 1
+    assert trace_cache.stats()['entries'] == 2
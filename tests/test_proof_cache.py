@@ -0,0 +1,104 @@
+import json
+import os
+import time
+
+import pytest
+
+from app import create_app
+from app.config import TestingConfig
+from app.core.proof_cache import DiskCache, ProofCache, proof_cache_key
+from app.core.proof_generator import generate_proof
+
+VERIFIER_DATA = {
+    "poly_coeffs": [3, 5, 7],
+    "folding_coeffs": list(range(11, 31)),
+    "challenges": [0, 5, 17, 40]
+}
+KWARGS = {'trace_length': 64, 'blowup': 4}
+
+
+def make_proof():
+    return generate_proof('cache', 4, json.dumps(VERIFIER_DATA), timestamp=0.0, **KWARGS)
+
+
+def test_key():
+    key = proof_cache_key('cache', 4, json.dumps(VERIFIER_DATA), timestamp=None, **KWARGS)
+    # The key ignores the timestamp and the formatting of the verifier data.
+    reordered = json.dumps(dict(reversed(list(VERIFIER_DATA.items()))), indent=2)
+    assert proof_cache_key('cache', 4, reordered, timestamp=123.0, **KWARGS) == key
+    assert proof_cache_key('cache', 5, json.dumps(VERIFIER_DATA), **KWARGS) != key
+    assert proof_cache_key('cache', 4, json.dumps(VERIFIER_DATA), batched=True, **KWARGS) != key
+
+
+def test_memory_tier():
+    cache = ProofCache(max_bytes=2**20, timestamp='deterministic')
+    proof = make_proof()
+    assert cache.get('k') is None
+    cache.put('k', proof)
+    assert cache.get('k') == proof
+    assert list(cache.get('k'))[0] == "timestamp"
+
+
+def test_response_timestamp():
+    cache = ProofCache(max_bytes=2**20)
+    cache.put('k', make_proof())
+    assert abs(cache.get('k')["timestamp"] - time.time()) < 60
+
+
+def test_disk_tier(tmp_path):
+    proof = make_proof()
+    ProofCache(max_bytes=0, disk=DiskCache(str(tmp_path), 2**20), timestamp='deterministic').put('k', proof)
+    # Another process sharing the directory.
+    other = ProofCache(max_bytes=2**20, disk=DiskCache(str(tmp_path), 2**20), timestamp='deterministic')
+    assert other.get('k') == proof
+    assert other.disk.stats()['hits'] == 1
+
+
+def test_damaged_file_is_a_miss(tmp_path):
+    cache = ProofCache(max_bytes=0, disk=DiskCache(str(tmp_path), 2**20))
+    cache.put('k', make_proof())
+    with open(os.path.join(tmp_path, 'k' + DiskCache.SUFFIX), 'wb') as f:
+        f.write(b'STKP')
+    assert cache.get('k') is None
+
+
+def test_disk_eviction(tmp_path):
+    disk = DiskCache(str(tmp_path), 1000)
+    for i, key in enumerate(['a', 'b', 'c']):
+        disk.put(key, b'x' * 400)
+        os.utime(disk._path(key), (i, i))
+    assert disk.get('a') is None
+    assert disk.get('b') is not None and disk.get('c') is not None
+    assert disk.stats()['evictions'] == 1
+
+
+def test_disk_rewrite(tmp_path):
+    disk = DiskCache(str(tmp_path), 1000)
+    for _ in range(5):
+        disk.put('a', b'x' * 300)
+    assert disk.total_bytes == 300
+    assert disk.stats()['evictions'] == 0
+
+
+class DeterministicConfig(TestingConfig):
+    PROOF_TIMESTAMP = 'deterministic'
+
+
+@pytest.fixture
+def client():
+    return create_app(DeterministicConfig).test_client()
+
+
+def test_route(client):
+    body = {'input': 'cache', 'queries': 4, 'challenges': VERIFIER_DATA, **KWARGS}
+    first = client.post('/api/generate-proof', json=body)
+    second = client.post('/api/generate-proof', json=body)
+    assert first.headers['X-Proof-Cache'] == 'miss'
+    assert second.headers['X-Proof-Cache'] == 'hit'
+    assert first.data == second.data
+    binary = client.post('/api/generate-proof', json=body, headers={'Accept': 'application/octet-stream'})
+    assert binary.headers['X-Proof-Cache'] == 'hit'
+    stream = client.post('/api/generate-proof', json=body, headers={'Accept': 'application/x-ndjson'})
+    lines = [json.loads(line) for line in stream.data.decode().splitlines()]
+    assert lines[0]['proof']['interp_poly_root'] == first.get_json()['proof']['interp_poly_root']
+    assert lines[-1]['type'] == 'decommitments'
@@ -0,0 +1,82 @@
+import json
+
+import pytest
+
+from app.core.field import FieldElement
+from app.core.proof_decoder import ProofDecodingError, decode_proof
+from app.core.proof_encoder import HEADER, MAGIC, ProofEncodingError, encode_proof
+from app.core.proof_generator import generate_proof
+from app.core.proof_verifier import verify_proof
+
+VERIFIER_DATA = json.dumps({
+    "poly_coeffs": [3, 5, 7],
+    "folding_coeffs": list(range(11, 31)),
+    "challenges": [0, 5, 17, 40, 200]
+})
+
+
+def make_proof(batched=False, ver=VERIFIER_DATA):
+    return generate_proof('encoding', 5, ver, batched=batched, trace_length=64, blowup=4, timestamp=1.5)
+
+
+@pytest.mark.parametrize('batched', [False, True])
+def test_round_trip(batched):
+    proof = make_proof(batched)
+    encoded = encode_proof(proof)
+    assert decode_proof(encoded) == proof
+    assert verify_proof(decode_proof(encoded)) == (True, [])
+    assert len(encoded) < len(json.dumps(proof)) / 2
+
+
+def test_round_trip_without_timestamp():
+    proof = make_proof()
+    del proof["timestamp"]
+    assert decode_proof(encode_proof(proof)) == proof
+
+
+def test_coefficients_beyond_int64():
+    # Out of range coefficients are recorded reduced, and encoded as field elements.
+    ver = json.loads(VERIFIER_DATA)
+    ver["poly_coeffs"] = [2**64 + 3, -5, 7]
+    ver["folding_coeffs"] = [2**70 + i for i in range(20)]
+    proof = make_proof(ver=json.dumps(ver))
+    assert proof["compos_factors"]["alpha_1"] == FieldElement.k_modulus - 5
+    assert decode_proof(encode_proof(proof)) == proof
+
+
+def test_invalid_values():
+    proof = make_proof()
+    proof["interp_poly_root"] = "abcd"
+    with pytest.raises(ProofEncodingError):
+        encode_proof(proof)
+
+
+@pytest.mark.parametrize('value', [FieldElement.k_modulus, -1, 2**64, 1.5, None, "abc", "007", str(FieldElement.k_modulus - 1)])
+def test_invalid_field_elements(value):
+    # Values that a proof does not hold as field elements are rejected rather than reduced.
+    proof = make_proof()
+    proof["compos_factors"]["alpha_0"] = value
+    with pytest.raises(ProofEncodingError):
+        encode_proof(proof)
+    proof = make_proof()
+    proof["fri_commitment"]["final_constant"] = value
+    with pytest.raises(ProofEncodingError):
+        encode_proof(proof)
+
+
+def test_negative_field_elements():
+    proof = make_proof()
+    proof["target"] = "-5"
+    assert decode_proof(encode_proof(proof)) == proof
+
+
+def test_invalid_data():
+    encoded = encode_proof(make_proof())
+    with pytest.raises(ProofDecodingError):
+        decode_proof(encoded[:len(encoded) // 2])
+    with pytest.raises(ProofDecodingError):
+        decode_proof(b'JUNK' + encoded[4:])
+    with pytest.raises(ProofDecodingError):
+        decode_proof(HEADER.pack(MAGIC, 255, 0) + encoded[HEADER.size:])
+    with pytest.raises(ProofDecodingError):
+        decode_proof(encoded + b'\0')
@@ -0,0 +1,64 @@
+import json
+
+import pytest
+
+from app import create_app
+from app.config import TestingConfig
+from app.core.proof_verifier import verify_proof
+
+VERIFIER_DATA = {
+    "poly_coeffs": [3, 5, 7],
+    "folding_coeffs": list(range(11, 31)),
+    "challenges": [0, 5, 17, 40]
+}
+
+
+class SmallConfig(TestingConfig):
+    MAX_TRACE_LENGTH = 128
+    MAX_QUERIES = 10
+    PROOF_CACHE_MAX_BYTES = 0
+
+
+@pytest.fixture
+def client():
+    app = create_app(SmallConfig)
+    yield app.test_client()
+    app.extensions['proof_jobs'].shutdown()
+
+
+def request_body(**fields):
+    return {'input': 'routes', 'queries': 4, 'challenges': VERIFIER_DATA, 'trace_length': 64, 'blowup': 4, **fields}
+
+
+@pytest.mark.parametrize('fields, message', [
+    ({'trace_length': 256}, 'Trace length exceeds maximum allowed: 128'),
+    ({'trace_length': 48}, 'Trace length must be a power of two'),
+    ({'trace_length': 2}, 'Trace length must be a power of two'),
+    ({'trace_length': 0}, 'Trace length must be a power of two'),
+    ({'trace_length': -64}, 'Trace length must be a power of two'),
+    ({'trace_length': 'long'}, 'invalid literal'),
+    ({'blowup': 1}, 'Blowup factor must be a power of two'),
+    ({'blowup': 6}, 'Blowup factor must be a power of two'),
+    ({'blowup': 2**25}, 'Evaluation domain too large'),
+    ({'queries': 11}, 'Number of queries exceeds maximum allowed: 10'),
+    ({'queries': 'many'}, 'invalid literal'),
+])
+@pytest.mark.parametrize('route', ['/api/generate-proof', '/api/jobs'])
+def test_invalid_parameters(client, route, fields, message):
+    response = client.post(route, json=request_body(**fields))
+    assert response.status_code == 400
+    assert message in response.get_json()['error']
+
+
+def test_largest_trace_length(client):
+    response = client.post('/api/generate-proof', json=request_body(trace_length=128))
+    assert response.status_code == 200
+    proof = response.get_json()['proof']
+    assert proof['interp_domain_size'] == 128
+    assert verify_proof(proof) == (True, [])
+
+
+def test_missing_fields(client):
+    response = client.post('/api/generate-proof', json={'input': 'routes'})
+    assert response.status_code == 400
+    assert response.get_json()['error'] == 'Missing required fields: queries, challenges'
@@ -0,0 +1,73 @@
+import gc
+import json
+import os
+
+import numpy as np
+import pytest
+
+from app.core import storage
+from app.core.proof_generator import generate_proof, trace_cache
+from app.core.proof_verifier import verify_proof
+
+VERIFIER_DATA = json.dumps({
+    "poly_coeffs": [3, 5, 7],
+    "folding_coeffs": list(range(11, 31)),
+    "challenges": [0, 5, 17, 40, 200]
+})
+
+
+@pytest.fixture
+def out_of_core(tmp_path, monkeypatch):
+    # Counts the memory-mapped files created.
+    created = []
+    temporary_file = storage._temporary_file
+
+    def counted_temporary_file(nbytes):
+        created.append(nbytes)
+        return temporary_file(nbytes)
+    monkeypatch.setattr(storage, '_temporary_file', counted_temporary_file)
+    trace_cache.clear()
+    storage.configure_storage(directory=str(tmp_path), min_size=1024)
+    yield created
+    storage.configure_storage()
+    trace_cache.clear()
+
+
+def mapped_files(directory):
+    with open('/proc/self/maps') as f:
+        return [line for line in f if str(directory) in line]
+
+
+def make_proof(batched):
+    return generate_proof('storage', 5, VERIFIER_DATA, batched=batched, trace_length=64, blowup=4, timestamp=0.0)
+
+
+@pytest.mark.parametrize('batched', [False, True])
+def test_same_proof_out_of_core(batched, out_of_core, tmp_path):
+    storage.configure_storage()
+    in_memory = make_proof(batched)
+    trace_cache.clear()
+    storage.configure_storage(directory=str(tmp_path), min_size=1024)
+    proof = make_proof(batched)
+    assert out_of_core
+    assert proof == in_memory
+    assert verify_proof(proof) == (True, [])
+    # The files are unlinked as soon as they are created, and unmapped with the last reference.
+    assert os.listdir(tmp_path) == []
+    if os.path.exists('/proc/self/maps'):
+        assert mapped_files(tmp_path)
+        trace_cache.clear()
+        gc.collect()
+        assert mapped_files(tmp_path) == []
+
+
+def test_arrays(out_of_core):
+    small = np.arange(10, dtype=np.uint64)
+    assert storage.store_array(small) is small
+    large = np.arange(1024, dtype=np.uint64)
+    stored = storage.store_array(large)
+    assert isinstance(stored, np.memmap) and np.array_equal(stored, large)
+    assert storage.store_array(stored) is stored
+    buf = storage.zero_bytes(4096)
+    assert not isinstance(buf, bytearray) and buf[:] == bytes(4096)
+    assert out_of_core == [large.nbytes, 4096]
@@ -0,0 +1,106 @@
+import copy
+
+import pytest
+
+from app import create_app
+from app.config import TestingConfig
+from app.core import transcript
+from app.core.field import FieldElement
+from app.core.proof_decoder import decode_proof
+from app.core.proof_encoder import encode_proof
+from app.core.proof_generator import generate_proof
+from app.core.proof_verifier import verify_proof
+from app.core.transcript import FIAT_SHAMIR, Transcript, derive_challenges
+
+TRACE_LENGTH = 64
+BLOWUP = 4
+QUERIES = 20
+
+
+def make_proof(batched=False, query_num=QUERIES):
+    return generate_proof('fiat-shamir', query_num, None, batched=batched, trace_length=TRACE_LENGTH,
+                          blowup=BLOWUP, timestamp=0.0, fiat_shamir=True)
+
+
+def test_transcript_draws():
+    t1, t2 = Transcript(), Transcript()
+    t1.absorb('root', 1)
+    t2.absorb('root', 1)
+    assert t1.field_elements(3) == t2.field_elements(3)
+    assert all(0 <= x < FieldElement.k_modulus for x in t1.field_elements(50))
+    assert all(0 <= i < 10 for i in t1.indices(50, 10))
+    # Every absorbed item changes the challenges that follow.
+    t2.absorb('layer')
+    assert t1.field_elements(3) != t2.field_elements(3)
+    assert len(set(t1.field_elements(3))) == 3
+
+
+@pytest.mark.parametrize('batched', [False, True])
+def test_generate_verify(batched):
+    proof = make_proof(batched)
+    assert proof["challenge_mode"] == FIAT_SHAMIR
+    assert verify_proof(proof) == (True, [])
+    compos_factors, folding_coeffs, indices = derive_challenges(proof, BLOWUP)
+    assert list(proof["compos_factors"].values()) == compos_factors
+    assert proof["fri_commitment"]["folding_poly_coeffs"] == folding_coeffs
+    assert [query["idx"] for query in proof["fri_decommitments"]["queries"]] == indices
+
+
+@pytest.mark.parametrize('batched', [False, True])
+def test_binary_round_trip(batched):
+    proof = make_proof(batched)
+    assert decode_proof(encode_proof(proof)) == proof
+
+
+def tamper(proof, edit):
+    proof = copy.deepcopy(proof)
+    edit(proof)
+    return verify_proof(proof)[0]
+
+
+def set_query_num(proof, query_num):
+    decommitments = proof["fri_decommitments"]
+    decommitments["query_num"] = query_num
+    decommitments["queries"] = decommitments["queries"][:query_num]
+
+
+def test_tampered_challenges_fail():
+    proof = make_proof()
+    assert not tamper(proof, lambda p: p["compos_factors"].update(alpha_1=p["compos_factors"]["alpha_1"] + 1))
+    assert not tamper(proof, lambda p: p["fri_commitment"]["folding_poly_coeffs"].__setitem__(0, 5))
+    assert not tamper(proof, lambda p: p["fri_commitment"]["folding_poly_coeffs"].pop())
+    assert not tamper(proof, lambda p: p["fri_decommitments"]["queries"][2].update(idx=3))
+    assert not tamper(proof, lambda p: p.update(interp_poly_root='00' * 32))
+    assert not tamper(proof, lambda p: p.update(challenge_mode='other'))
+
+
+def test_query_num_is_bound():
+    proof = make_proof(query_num=QUERIES + 4)
+    assert verify_proof(proof)[0]
+    # Dropping queries changes the indices, and below the minimum the proof is rejected outright.
+    assert not tamper(proof, lambda p: set_query_num(p, QUERIES))
+    assert not tamper(proof, lambda p: set_query_num(p, 0))
+
+
+def test_minimum_queries():
+    proof = make_proof(query_num=5)
+    is_valid, errors = verify_proof(proof)
+    assert not is_valid and 'minimum' in errors[0]
+    transcript.configure_fiat_shamir(min_query_num=5)
+    try:
+        assert verify_proof(proof) == (True, [])
+    finally:
+        transcript.configure_fiat_shamir()
+
+
+def test_route():
+    client = create_app(TestingConfig).test_client()
+    body = {'input': 'fiat-shamir', 'queries': QUERIES, 'challenge_mode': FIAT_SHAMIR,
+            'trace_length': TRACE_LENGTH, 'blowup': BLOWUP}
+    response = client.post('/api/generate-proof', json=body)
+    assert response.status_code == 200
+    assert verify_proof(response.get_json()['proof']) == (True, [])
+    assert client.post('/api/generate-proof', json={**body, 'queries': 5}).status_code == 400
+    assert client.post('/api/generate-proof', json={**body, 'challenge_mode': 'other'}).status_code == 400
+    del body['challenge_mode']
+    assert client.post('/api/generate-proof', json=body).status_code == 400
@@ -0,0 +1,90 @@
+import threading
+
+import pytest
+
+from app import create_app, warmup as warmup_module
+from app.config import TestingConfig
+from app.core.domain import registry
+from app.core.field import FieldElement
+from app.warmup import Warmup
+
+
+@pytest.fixture
+def blocked_warm_up(monkeypatch):
+    # warm_up waits for the event to be set.
+    release = threading.Event()
+    real_warm_up = warmup_module.warm_up
+
+    def warm_up(trace_length, blowup):
+        assert release.wait(10)
+        real_warm_up(trace_length, blowup)
+    monkeypatch.setattr(warmup_module, 'warm_up', warm_up)
+    yield release
+    release.set()
+
+
+def make_app(mode, trace_length=64, blowup=4):
+    class WarmupConfig(TestingConfig):
+        WARMUP = mode
+        TRACE_LENGTH = trace_length
+        BLOWUP = blowup
+    return create_app(WarmupConfig)
+
+
+def test_sync():
+    registry.clear()
+    warmup = Warmup(64, 4)
+    warmup.start('sync')
+    assert warmup.ready and warmup.error is None
+    assert ('domain', 256, FieldElement.generator().val) in registry.tables
+
+
+def test_off():
+    registry.clear()
+    warmup = Warmup(64, 4)
+    warmup.start('off')
+    assert warmup.ready
+    assert not registry.tables
+
+
+def test_sync_failure():
+    warmup = Warmup(48, 4)
+    with pytest.raises(ValueError):
+        warmup.start('sync')
+    assert not warmup.ready and 'power of two' in warmup.error
+
+
+def test_background(blocked_warm_up):
+    warmup = Warmup(64, 4)
+    warmup.start('background')
+    assert not warmup.ready
+    blocked_warm_up.set()
+    assert warmup.done.wait(10)
+    assert warmup.ready
+
+
+def test_health_while_warming_up(blocked_warm_up):
+    client = make_app('background').test_client()
+    response = client.get('/health')
+    assert response.status_code == 503
+    assert response.get_json() == {'status': 'warming up'}
+    blocked_warm_up.set()
+    assert client.application.extensions['warmup'].done.wait(10)
+    response = client.get('/health')
+    assert response.status_code == 200
+    assert response.get_json() == {'status': 'healthy'}
+
+
+@pytest.mark.parametrize('mode', ['sync', 'off'])
+def test_health_ready(mode):
+    response = make_app(mode).test_client().get('/health')
+    assert response.status_code == 200
+
+
+def test_health_after_failure():
+    app = make_app('background', trace_length=48)
+    assert app.extensions['warmup'].done.wait(10)
+    response = app.test_client().get('/health')
+    assert response.status_code == 503
+    assert response.get_json()['status'] == 'unhealthy'
+    assert 'Warm-up failed' in response.get_json()['error']